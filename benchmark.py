@@ -0,0 +1,53 @@
+import argparse
+import multiprocessing
+
+
+def number_list(value: str) -> list:
+    return [float(item) for item in value.split(",")]
+
+
+if __name__ == "__main__":
+    # Needed for the save worker processes in frozen builds
+    multiprocessing.freeze_support()
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the camera pipeline with synthetic sources."
+    )
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--resolution", default="640x360")
+    parser.add_argument("--format", default="gif")
+    parser.add_argument("--preset", default="balanced")
+    parser.add_argument(
+        "--mode", default="stream", choices=("stream", "spool")
+    )
+    parser.add_argument("--fps", type=number_list, default=[1, 12, 24])
+    parser.add_argument("--lengths", type=number_list, default=[1, 5])
+    parser.add_argument(
+        "--duration", type=float, default=3,
+        help="Seconds to measure capture and preview for"
+    )
+    parser.add_argument(
+        "--burst", type=int, default=5,
+        help="Photos per shutter press when measuring burst latency"
+    )
+    parser.add_argument("--no-audio", action="store_true")
+    args = parser.parse_args()
+
+    # Imported here so spawned worker processes never load pyglet
+    from source.benchmark import Benchmark
+
+    width, height = (int(size) for size in args.resolution.split("x"))
+    benchmark = Benchmark(
+        (width, height),
+        args.format,
+        args.preset,
+        args.mode,
+        not args.no_audio
+    )
+    benchmark.run(
+        args.output,
+        args.duration,
+        [int(fps) for fps in args.fps],
+        args.lengths,
+        args.burst
+    )
@@ -1,7 +1,9 @@
 #!/usr/bin/bash
 
 rm -rf dist
+python build_assets.py
 pyinstaller rotograph.py
 
 cp installer/install.sh dist/
 cp -r assets dist/rotograph/
+cp assets.bundle dist/rotograph/
@@ -0,0 +1,24 @@
+import argparse
+import os
+
+from source.asset_bundle import AssetBundle
+
+
+if __name__ == "__main__":
+    root = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(
+        description="Pack the assets folder into a pre-decoded asset bundle."
+    )
+    parser.add_argument("--assets", default=os.path.join(root, "assets"))
+    parser.add_argument(
+        "--output", default=os.path.join(root, AssetBundle.FILE_NAME)
+    )
+    args = parser.parse_args()
+
+    bundle = AssetBundle.build(args.assets)
+    bundle.save(args.output)
+    print(
+        f"Packed {len(bundle.images)} images and {len(bundle.sounds)} sounds "
+        f"into '{args.output}'."
+    )
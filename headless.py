@@ -0,0 +1,79 @@
+import argparse
+import multiprocessing
+import sys
+
+
+if __name__ == "__main__":
+    # Needed for the save worker processes in frozen builds
+    multiprocessing.freeze_support()
+
+    parser = argparse.ArgumentParser(
+        description="Run the Rotograph Camera without a window."
+    )
+    parser.add_argument(
+        "--output",
+        metavar="FOLDER",
+        help="Folder to save to, instead of the configured storage device"
+    )
+    parser.add_argument("--fps", type=int, default=24)
+    parser.add_argument(
+        "--format", help="Video format, gif, webp, apng or avi"
+    )
+    parser.add_argument("--preset", help="Encoder preset")
+    parser.add_argument("--mode", choices=("stream", "spool"))
+    parser.add_argument("--camera", type=int, default=0, help="Camera index")
+    parser.add_argument("--mute", action="store_true")
+    parser.add_argument("--monochrome", action="store_true")
+    parser.add_argument(
+        "--record",
+        type=float,
+        metavar="SECONDS",
+        help="Record once for SECONDS, then exit"
+    )
+    parser.add_argument(
+        "--photo", action="store_true", help="Take one photo, then exit"
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="PATH",
+        help="Write a Chrome trace-event file of pipeline timings to PATH"
+    )
+    args = parser.parse_args()
+
+    # Imported here so spawned worker processes never load pyglet
+    from source import config
+    from source.headless import Headless
+    from source.profiler import profiler
+
+    settings = config.load_config()
+    # Options apply to this run only, they aren't saved
+    if args.format is not None:
+        settings["video-format"] = args.format
+    if args.preset is not None:
+        settings["video-preset"] = args.preset
+    if args.mode is not None:
+        settings["recording-mode"] = args.mode
+    config.check_video_config(settings)
+
+    if args.output is None and (
+        "device-uuid" not in settings or "output-path" not in settings
+    ):
+        print(
+            "No storage device configured, run rotograph.py once to choose "
+            "one or pass --output."
+        )
+        sys.exit(1)
+
+    if args.trace is not None:
+        profiler.start_trace(args.trace)
+
+    headless = Headless(
+        settings,
+        args.output,
+        args.fps,
+        args.mute,
+        args.monochrome,
+        args.camera
+    )
+    headless.run(args.record, args.photo)
+    profiler.stop_trace()
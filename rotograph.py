@@ -1,6 +1,21 @@
-from source.application import Application
+import argparse
+import multiprocessing
 
 
 if __name__ == "__main__":
-    application = Application()
+    # Needed for the save worker processes in frozen builds
+    multiprocessing.freeze_support()
+
+    parser = argparse.ArgumentParser(description="Rotograph Camera")
+    parser.add_argument(
+        "--trace",
+        metavar="PATH",
+        help="Write a Chrome trace-event file of pipeline timings to PATH"
+    )
+    args = parser.parse_args()
+
+    # Imported here so spawned worker processes never load pyglet
+    from source.application import Application
+
+    application = Application(args.trace)
     application.run()
@@ -1,18 +1,28 @@
+from .assets import Assets
 from .audio_manager import AudioManager
 from .video_manager import VideoManager
 from .fixed_resolution import FixedResolution
-from .interface import Interface, Layers
+from .frame_spool import FrameSpool
+from .mounts import MountTable, StorageDevice
+from .pacing import MediaClock
+from .save_worker import SaveWorker
+from . import config
+from .preview_texture import PreviewTexture
+from .profiler import profiler
+from .redraw_loop import RedrawOnChangeLoop
+from .v4l2 import camera_backend
+from .interface import GROUPS, Interface, Layers
 
 import pyglet
 from pyglet.window import key
-from pyglet.graphics import OrderedGroup
 from pyglet.math import Vec2
 
 import datetime
-import json
-from json.decoder import JSONDecodeError
+from functools import partial
 import os
-from typing import Optional
+from threading import Thread
+import time
+from typing import Dict, List, Optional, Tuple
 
 
 pyglet.image.Texture.default_mag_filter = pyglet.gl.GL_NEAREST
@@ -21,23 +31,38 @@ pyglet.image.Texture.default_min_filter = pyglet.gl.GL_NEAREST
 
 class Application:
     TARGET_RESOLUTION = Vec2(640, 360)
-    CONFIG_FOLDER = os.path.join(os.environ["HOME"], ".config", "rotograph")
-    CONFIG_FILE = os.path.join(CONFIG_FOLDER, "config.json")
     EMPTY_IMAGE = pyglet.image.ImageData(1, 1, "RGBA", b"\x00\x00\x00\x00")
+    # Size of the other cameras' previews in picture-in-picture, relative to
+    # the first camera's
+    INSET_SCALE = 0.25
+    INSET_MARGIN = 8
 
     storage_device_available = property(
         lambda self: self.get_mount_path() != ""
     )
 
-    def __init__(self):
-        if not os.path.exists(self.CONFIG_FOLDER):
-            os.makedirs(self.CONFIG_FOLDER)
-
-        try:
-            with open(self.CONFIG_FILE, "r") as f:
-                self.config = json.load(f)
-        except (FileNotFoundError, JSONDecodeError):
-            self.config = {}
+    # Created once the window has shown its first frame. The first camera
+    # drives the interface, the others are recorded alongside it.
+    video_manager: Optional[VideoManager] = None
+    interface: Optional[Interface] = None
+    # Opening PortAudio is slow, so it is opened on a thread once the
+    # interface is up, or when audio is unmuted. The event loop never waits
+    # for it, a recording started before it is open begins once it is.
+    audio_manager: Optional[AudioManager] = None
+    audio_thread: Optional[Thread] = None
+    waiting_for_audio = False
+    first_frame_shown = False
+    # Recordings left behind by a crash, encoded once storage is available
+    unrecovered_spools: List[str] = []
+
+    def __init__(self, trace_path: Optional[str] = None):
+        self.started = time.perf_counter()
+        if trace_path is not None:
+            profiler.start_trace(trace_path)
+
+        self.config = config.load_config()
+
+        self.mounts = MountTable()
 
         if "device-uuid" not in self.config:
             print("No storage device found in config.")
@@ -54,7 +79,9 @@ class Application:
             vsync=True,
         )
         self.window.set_minimum_size(*self.TARGET_RESOLUTION)
-        self.window.set_icon(pyglet.resource.image("assets/Icon.png"))
+        # Read in one go, before anything else needs an image
+        self.assets = Assets()
+        self.window.set_icon(self.assets.image("assets/Icon.png"))
         self.window.push_handlers(self)
 
         self.viewport = FixedResolution(self.window, *self.TARGET_RESOLUTION)
@@ -62,39 +89,164 @@ class Application:
 
         self.fps = pyglet.window.FPSDisplay(self.window)
         self.fps.label.batch = self.batch
-        self.fps.label.group = Layers.MAIN_UI
+        self.fps.label.group = GROUPS[Layers.MAIN_UI]
         self.fps.label.visible = False
 
-        self.video_manager = VideoManager(24, self.TARGET_RESOLUTION)
-        self.video_manager.push_handlers(self)
-
-        self.audio_manager = AudioManager()
-
-        self.preview_sprite = pyglet.sprite.Sprite(
-            self.EMPTY_IMAGE,
-            self.TARGET_RESOLUTION.x // 2, self.TARGET_RESOLUTION.y // 2,
-            group=OrderedGroup(Layers.PREVIEW),
+        # Per stage timings, shown with the FPS display
+        self.profile_label = pyglet.text.Label(
+            "",
+            font_size=8,
+            x=4, y=self.TARGET_RESOLUTION.y - 4,
+            anchor_y="top",
+            width=self.TARGET_RESOLUTION.x // 2,
+            multiline=True,
             batch=self.batch,
+            group=GROUPS[Layers.WINDOW_UI],
         )
+        self.profile_label.visible = False
 
-        self.interface = Interface(
-            self.batch,
-            self.video_manager.fps,
-            self.TARGET_RESOLUTION
+        # Shown until the interface has loaded
+        self.startup_label = pyglet.text.Label(
+            "Starting...",
+            x=self.TARGET_RESOLUTION.x // 2, y=self.TARGET_RESOLUTION.y // 2,
+            anchor_x="center", anchor_y="center",
+            batch=self.batch,
+            group=GROUPS[Layers.MAIN_UI],
         )
-        self.interface.push_handlers(self)
+
+        self.video_managers: List[VideoManager] = []
+        self.save_jobs: Dict[int, float] = {}
+        self.recorded_audio = False
+
+        # One texture and sprite per camera, composited by drawing them all
+        self.previews: List[PreviewTexture] = []
+        self.preview_sprites: List[pyglet.sprite.Sprite] = []
+        for index in range(self.config["cameras"]):
+            self.previews.append(PreviewTexture())
+            self.preview_sprites.append(pyglet.sprite.Sprite(
+                self.EMPTY_IMAGE,
+                self.TARGET_RESOLUTION.x // 2, self.TARGET_RESOLUTION.y // 2,
+                # Insets are drawn over the first camera
+                group=pyglet.graphics.OrderedGroup(
+                    index, GROUPS[Layers.PREVIEW]
+                ),
+                batch=self.batch,
+            ))
+
+    def start(self, dt: float = None):
+        """
+        Second stage of startup, run once the window has drawn its
+        placeholder. The camera is opened on the capture thread, assets
+        that aren't visible yet are loaded between later frames.
+        """
+        with profiler.stage("startup.subsystems"):
+            for index in range(self.config["cameras"]):
+                video_manager = VideoManager(
+                    24, self.config["record-resolution"], capture_id=index,
+                    camera_source=camera_backend(
+                        self.config["camera-backend"]
+                    ),
+                    preview_resolution=self.config["preview-resolution"]
+                )
+                video_manager.video_format = self.config["video-format"]
+                video_manager.video_preset = self.config["video-preset"]
+                video_manager.push_handlers(
+                    on_frame_ready=partial(self.on_frame_ready, index),
+                    on_photo_saved=self.on_photo_saved
+                )
+                self.video_managers.append(video_manager)
+            self.video_manager = self.video_managers[0]
+            self.video_manager.push_handlers(
+                on_camera_unavailable=self.on_camera_unavailable
+            )
+
+            self.save_worker = SaveWorker()
+            self.save_worker.push_handlers(self)
+
+        with profiler.stage("startup.interface"):
+            self.interface = Interface(
+                self.batch,
+                self.video_manager.fps,
+                self.TARGET_RESOLUTION,
+                self.assets
+            )
+            self.interface.push_handlers(self)
+        self.startup_label.delete()
+        self.window.invalid = True
+        # Only spools from before this start, the spool folder also holds
+        # the recording in progress
+        self.unrecovered_spools = FrameSpool.find(config.SPOOL_FOLDER)
+        if (
+            len(self.unrecovered_spools) > 0
+            and not self.storage_device_available
+        ):
+            print(
+                "No storage device found, recordings will be recovered "
+                "once it is available."
+            )
         self.check_storage()
 
         pyglet.clock.schedule_interval_soft(self.check_storage, 1)
+        pyglet.clock.schedule_once(
+            self.preload_assets, 0, list(Interface.PRELOAD)
+        )
+        if not self.interface.mute:
+            self.load_audio_manager()
+
+    def preload_assets(self, dt: float, paths: List[str]):
+        # One asset per frame, so loading never stalls the preview
+        with profiler.stage("startup.preload"):
+            self.assets.image(paths.pop())
+        if len(paths) > 0:
+            pyglet.clock.schedule_once(self.preload_assets, 0, paths)
+
+    def load_audio_manager(self):
+        if self.audio_thread is None:
+            self.audio_thread = Thread(
+                target=self.create_audio_manager, daemon=True
+            )
+            self.audio_thread.start()
+
+    def create_audio_manager(self):
+        # PortAudio enumerates every ALSA device when it is opened
+        with profiler.stage("startup.audio"):
+            try:
+                self.audio_manager = AudioManager()
+            except Exception as e:
+                print("Audio unavailable, recording without sound:", e)
+
+    @property
+    def audio_loading(self) -> bool:
+        return self.audio_thread is not None and self.audio_thread.is_alive()
+
+    def wait_for_audio(self, dt: float = None):
+        if self.audio_loading:
+            return
+        pyglet.clock.unschedule(self.wait_for_audio)
+        self.waiting_for_audio = False
+        self.start_recording()
+
+    def cancel_waiting_for_audio(self):
+        pyglet.clock.unschedule(self.wait_for_audio)
+        self.waiting_for_audio = False
+        print("Recording cancelled.")
+
+    def save_config(self):
+        config.save_config(self.config)
 
     def check_storage(self, dt: float = None):
-        self.interface.storage_message = not self.storage_device_available
+        if self.interface is None:
+            return
+        storage_message = not self.storage_device_available
+        if self.interface.storage_message != storage_message:
+            self.interface.storage_message = storage_message
+        if not storage_message:
+            self.recover_recordings()
 
     def get_mount_path(self, uuid: Optional[str] = None) -> str:
         if uuid is None:
             uuid = self.config["device-uuid"]
-        with os.popen(f"findmnt -rn -S UUID={uuid} -o TARGET") as f:
-            return f.read().strip().replace("\\x20", " ")
+        return self.mounts.mount_path(uuid)
 
     def choose_output_path(self):
         while True:
@@ -112,25 +264,12 @@ class Application:
 
             if confirmation == "y":
                 self.config["output-path"] = path
-                with open(self.CONFIG_FILE, "w") as f:
-                    json.dump(self.config, f)
+                self.save_config()
                 break
         print("\n")
 
-    def get_storage_devices(self):
-        devices = []
-        with open("/proc/mounts", "r") as f:
-            mounts = f.readlines()
-
-        for info in mounts:
-            if info.startswith("/dev/sd"):
-                info = [chunk.strip() for chunk in info.split()]
-                with os.popen(f"lsblk {info[0]} -no UUID") as p:
-                    uuid = p.read().strip()
-                path = self.get_mount_path(uuid)
-                devices.append((info[0], path, uuid))
-
-        return devices
+    def get_storage_devices(self) -> List[StorageDevice]:
+        return self.mounts.storage_devices()
 
     def select_storage_device(self):
         print("\nPlease select a storage device to use:")
@@ -138,7 +277,8 @@ class Application:
 
         while True:
             for i, device in enumerate(devices):
-                print(f"{i+1}: {device[1]}\t({device[0]})")
+                path = device[1] if device[1] != "" else "not mounted"
+                print(f"{i+1}: {path}\t({device[0]})")
 
             choice = 0
             while choice <= 0 or choice > len(devices):
@@ -156,32 +296,73 @@ class Application:
 
             if confirmation == "y":
                 self.config["device-uuid"] = choice[2]
-                with open(self.CONFIG_FILE, "w") as f:
-                    json.dump(self.config, f)
+                self.save_config()
                 break
         print("\n")
 
-    def save(self, dt: float = None):
-        mount_path = self.get_mount_path()
-
+    def get_output_folder(self, *path: str) -> str:
         outdir = os.path.join(
-            mount_path,
-            self.config["output-path"]
+            self.get_mount_path(),
+            self.config["output-path"],
+            *path
         )
+        if not os.path.exists(outdir):
+            os.makedirs(outdir)
+        return outdir
+
+    def recover_recordings(self):
+        if (
+            len(self.unrecovered_spools) == 0
+            or not self.storage_device_available
+        ):
+            return
 
-        datestring = datetime.datetime.now().strftime("%Y-%m-%d %H-%M-%S %f")
-        if self.video_manager.fps != 0:
-            path = os.path.join(outdir, "Videos", datestring)
-            if not os.path.exists(path):
-                os.makedirs(path)
-            self.audio_manager.save(path)
-            self.video_manager.save(path)
-        else:
-            path = os.path.join(outdir, "Images")
-            if not os.path.exists(path):
-                os.makedirs(path)
-            self.video_manager.save(path, datestring)
-        self.interface.saving = False
+        spools = self.unrecovered_spools
+        self.unrecovered_spools = []
+        for spool_path in spools:
+            spool = FrameSpool.open(spool_path)
+            if spool is None:
+                print(f"Discarding unreadable recording '{spool_path}'.")
+                os.remove(spool_path)
+                continue
+
+            print(f"Recovering recording '{spool.name}'.")
+            path = self.get_output_folder("Videos", *spool.folders)
+            self.video_manager.encode(self.save_worker, spool, path)
+
+    def camera_name(self, index: int) -> Optional[str]:
+        # A single camera keeps the original layout of the output folder
+        if len(self.video_managers) == 1:
+            return None
+        return f"Camera {index + 1}"
+
+    def save(self, dt: float = None):
+        jobs = []
+        for index, video_manager in enumerate(self.video_managers):
+            name = self.camera_name(index)
+            path = self.get_output_folder(
+                "Videos", self.datestring, *([name] if name else [])
+            )
+            metadata = {}
+            if self.recorded_audio:
+                metadata["audio_overflows"] = self.audio_manager.overflows
+            if name is not None:
+                metadata["camera_index"] = index
+            jobs.append(video_manager.save(
+                self.save_worker, path, metadata=metadata
+            ))
+
+        for job_id in jobs:
+            if job_id is not None:
+                self.save_jobs[job_id] = 0
+        self.update_save_progress()
+
+    def update_save_progress(self):
+        if len(self.save_jobs) == 0:
+            self.interface.saving = False
+            return
+        progress = sum(self.save_jobs.values()) / len(self.save_jobs)
+        self.interface.save_progress = progress
 
     def start_recording(self):
         if not self.storage_device_available:
@@ -189,20 +370,103 @@ class Application:
             return
 
         if self.video_manager.fps != 0:
-            self.interface.recording = True
-            self.video_manager.start_recording()
             if not self.interface.mute:
-                self.audio_manager.start_recording()
+                self.load_audio_manager()
+                if self.audio_loading:
+                    # Checked between frames, so the preview keeps running
+                    if not self.waiting_for_audio:
+                        print("Waiting for audio to start recording.")
+                        self.waiting_for_audio = True
+                        pyglet.clock.schedule_interval_soft(
+                            self.wait_for_audio, 1/20
+                        )
+                    return
+                if self.audio_manager is None:
+                    # Opening failed, show that this recording is silent
+                    self.interface.mute = True
+
+            self.datestring = datetime.datetime.now().strftime(
+                config.DATE_FORMAT
+            )
+            self.interface.recording = True
+
+            video_format = self.config["video-format"]
+            self.recorded_audio = not self.interface.mute
+            streams_audio = video_format == "avi" and self.recorded_audio
+
+            path = self.get_output_folder("Videos", self.datestring)
+            # Shared timeline that every camera's frames and the audio are
+            # placed on
+            clock = MediaClock(time.monotonic())
+            for index, video_manager in enumerate(self.video_managers):
+                name = self.camera_name(index)
+                spool_path = None
+                if config.uses_spool(self.config):
+                    spool_name = self.datestring
+                    if name is not None:
+                        spool_name += " " + name
+                    spool_path = os.path.join(
+                        config.SPOOL_FOLDER,
+                        spool_name + FrameSpool.EXTENSION
+                    )
+                camera_path = path
+                if name is not None:
+                    camera_path = self.get_output_folder(
+                        "Videos", self.datestring, name
+                    )
+                # Audio is only muxed into the first camera's video
+                video_manager.start_recording(
+                    camera_path,
+                    clock,
+                    spool_path,
+                    self.audio_manager.format
+                    if streams_audio and index == 0 else None,
+                    name
+                )
+            if self.recorded_audio:
+                self.audio_manager.start_recording(
+                    path,
+                    clock,
+                    self.video_manager.writer if streams_audio else None
+                )
         else:
+            self.take_photos(time.monotonic())
+
+    def take_photos(self, shutter_time: float):
+        datestring = datetime.datetime.now().strftime(config.DATE_FORMAT)
+        path = self.get_output_folder("Images")
+        taken = False
+        for index, video_manager in enumerate(self.video_managers):
+            name = self.camera_name(index)
+            if video_manager.take_photos(
+                path,
+                f"{datestring} {name}" if name else datestring,
+                shutter_time,
+                self.config["photo-burst"]
+            ) is not None:
+                taken = True
+
+        if taken:
             self.interface.saving = True
-            pyglet.clock.schedule_once(self.save, 0.1)
+        else:
+            print("No frame to save yet.")
+
+    def on_photo_saved(self, path: str, saved: bool):
+        if not any(
+            video_manager.photos_pending
+            for video_manager in self.video_managers
+        ):
+            self.interface.saving = False
 
     def stop_recording(self):
         self.interface.recording = False
 
-        self.video_manager.stop_recording()
-        if self.video_manager.fps != 0:
+        # Audio stops first so the last chunks reach a streaming writer
+        # before it is closed
+        if self.video_manager.fps != 0 and self.recorded_audio:
             self.audio_manager.stop_recording()
+        for video_manager in self.video_managers:
+            video_manager.stop_recording()
 
         if not self.storage_device_available:
             print("No storage device found.")
@@ -212,6 +476,9 @@ class Application:
         pyglet.clock.schedule_once(self.save, 0.2)
 
     def on_mouse_release(self, x, y, button, modifiers):
+        if self.interface is None:
+            return
+
         x -= self.viewport._viewport[0]
         y -= self.viewport._viewport[1]
         x *= self.TARGET_RESOLUTION.x / (self.viewport._viewport[3])
@@ -222,15 +489,30 @@ class Application:
         if symbol == key.F11:
             self.window.set_fullscreen(not self.window.fullscreen)
         elif symbol == key.F3:
-            self.fps.label.visible = not self.fps.label.visible
+            visible = not self.fps.label.visible
+            self.fps.label.visible = visible
+            self.profile_label.visible = visible
+            self.window.invalid = True
+            if visible:
+                self.update_profile()
+                pyglet.clock.schedule_interval_soft(self.update_profile, 1/2)
+            else:
+                pyglet.clock.unschedule(self.update_profile)
+
+    def update_profile(self, dt: float = None):
+        self.profile_label.text = profiler.report()
+        self.window.invalid = True
 
     def on_fps_change(self, new_fps):
-        self.video_manager.fps = new_fps
+        for video_manager in self.video_managers:
+            video_manager.fps = new_fps
         self.interface.fps = self.video_manager.fps
 
     def on_rec_pressed(self):
         if self.video_manager.recording:
             self.stop_recording()
+        elif self.waiting_for_audio:
+            self.cancel_waiting_for_audio()
         elif self.interface.timer:
             if self.interface.timer_running:
                 self.interface.abort_timer()
@@ -240,7 +522,8 @@ class Application:
             self.start_recording()
 
     def on_monochrome_change(self, new_value: bool):
-        self.video_manager.monochrome = new_value
+        for video_manager in self.video_managers:
+            video_manager.monochrome = new_value
 
     def on_timer_complete(self):
         self.start_recording()
@@ -248,15 +531,90 @@ class Application:
     def on_draw(self):
         self.window.clear()
         with self.viewport:
-            self.batch.draw()
+            with profiler.stage("draw"):
+                self.batch.draw()
+
+        if self.video_manager is None and not self.first_frame_shown:
+            # Scheduled from here rather than __init__, so the window shows
+            # the placeholder before the slow startup work begins
+            self.first_frame_shown = True
+            now = time.perf_counter()
+            profiler.record("startup.window", self.started, now)
+            pyglet.clock.schedule_once(self.start, 0)
+
+    def preview_layout(self, index: int) -> Tuple[float, float, float]:
+        """
+        Position and scale of a camera's preview. Side by side, each camera
+        fills an equal column. Picture-in-picture, the first camera fills
+        the view and the others are insets along the bottom right.
+        """
+        image = self.previews[index].image
+        width, height = self.TARGET_RESOLUTION
+        fit = min(width / image.width, height / image.height)
+
+        if self.config["camera-layout"] == "picture-in-picture":
+            if index == 0:
+                return width / 2, height / 2, fit
+            scale = fit * self.INSET_SCALE
+            inset_width = image.width * scale
+            inset_height = image.height * scale
+            x = width - (inset_width + self.INSET_MARGIN) * index
+            return (
+                x + inset_width / 2,
+                self.INSET_MARGIN + inset_height / 2,
+                scale
+            )
+
+        column = width / len(self.previews)
+        scale = min(column / image.width, height / image.height)
+        return column * (index + 0.5), height / 2, scale
+
+    def on_frame_ready(self, index: int = 0):
+        video_manager = self.video_managers[index]
+        preview = self.previews[index]
+        with profiler.stage("upload"):
+            reallocated = preview.update(video_manager.image)
+        if reallocated:
+            sprite = self.preview_sprites[index]
+            sprite.image = preview.image
+            x, y, scale = self.preview_layout(index)
+            sprite.update(x=x, y=y, scale=scale)
+        if index != 0:
+            self.window.invalid = True
+            return
 
-    def on_frame_ready(self):
-        self.preview_sprite.image = self.video_manager.image
+        if "startup.first_frame" not in profiler.samples:
+            now = time.perf_counter()
+            profiler.record("startup.first_frame", self.started, now)
+            print(f"First preview frame after {now - self.started:.2f}s.")
         if self.interface.camera_message:
             self.interface.camera_message = False
+        self.window.invalid = True
+
+    def on_save_progress(self, job_id: int, progress: float):
+        if job_id in self.save_jobs:
+            self.save_jobs[job_id] = progress
+            self.update_save_progress()
+
+    def on_save_complete(self, job_id: int, success: bool):
+        if job_id in self.save_jobs:
+            del self.save_jobs[job_id]
+            self.update_save_progress()
+
+    def on_interface_change(self):
+        self.window.invalid = True
+
+    def on_resize(self, width, height):
+        self.window.invalid = True
+
+    def on_expose(self):
+        self.window.invalid = True
 
     def on_camera_unavailable(self):
         self.interface.camera_message = True
 
     def run(self):
+        if self.config["redraw-on-change"]:
+            pyglet.app.event_loop = RedrawOnChangeLoop()
         pyglet.app.run()
+        profiler.stop_trace()
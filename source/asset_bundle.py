@@ -0,0 +1,127 @@
+from PIL import Image
+
+import glob
+import json
+import os
+import struct
+from typing import Dict, Tuple
+
+
+# Width, height and bottom-up RGBA pixels, the layout pyglet's ImageData uses
+ImageAsset = Tuple[int, int, bytes]
+# Channels, bits per sample, sample rate and signed PCM samples
+SoundAsset = Tuple[int, int, int, bytes]
+
+
+class AssetBundle:
+    """
+    Every asset in one file, already decoded: images as raw RGBA and sounds
+    as PCM. Loading it is a single read, with no PNG or Ogg decoding at
+    startup.
+
+    The file is a header, a JSON index of each asset's kind, offset and size,
+    then the asset data. Built from the assets folder by build_assets.py.
+    This module must not import pyglet, so bundles can be built without a
+    display.
+    """
+
+    MAGIC = b"RBDL"
+    FILE_NAME = "assets.bundle"
+    HEADER = struct.Struct("<4sI")
+    SAMPLE_RATE = 44100
+
+    def __init__(
+            self,
+            images: Dict[str, ImageAsset],
+            sounds: Dict[str, SoundAsset]
+    ):
+        self.images = images
+        self.sounds = sounds
+
+    @classmethod
+    def load(cls, path: str) -> "AssetBundle":
+        with open(path, "rb") as f:
+            data = f.read()
+
+        magic, index_size = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC:
+            raise ValueError(f"'{path}' is not an asset bundle.")
+        start = cls.HEADER.size
+        index = json.loads(data[start:start + index_size])
+        start += index_size
+
+        images = {}
+        sounds = {}
+        for name, entry in index.items():
+            offset = start + entry["offset"]
+            content = data[offset:offset + entry["size"]]
+            if entry["kind"] == "image":
+                images[name] = (entry["width"], entry["height"], content)
+            else:
+                sounds[name] = (
+                    entry["channels"],
+                    entry["sample_size"],
+                    entry["sample_rate"],
+                    content
+                )
+        return cls(images, sounds)
+
+    @classmethod
+    def build(cls, folder: str) -> "AssetBundle":
+        images = {}
+        for path in sorted(glob.glob(os.path.join(folder, "*.png"))):
+            image = Image.open(path).convert("RGBA")
+            data = image.transpose(Image.FLIP_TOP_BOTTOM).tobytes()
+            images[cls.name(folder, path)] = (*image.size, data)
+
+        sounds = {}
+        paths = sorted(glob.glob(os.path.join(folder, "*.ogg")))
+        if len(paths) > 0:
+            # pygame is only needed to decode sounds when building
+            os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+            from pygame import mixer
+            mixer.init(cls.SAMPLE_RATE, -16, 2)
+            rate, sample_format, channels = mixer.get_init()
+            for path in paths:
+                data = mixer.Sound(path).get_raw()
+                sounds[cls.name(folder, path)] = (
+                    channels, abs(sample_format), rate, data
+                )
+            mixer.quit()
+
+        return cls(images, sounds)
+
+    @staticmethod
+    def name(folder: str, path: str) -> str:
+        # Assets are looked up by the same names pyglet.resource uses
+        folder_name = os.path.basename(os.path.normpath(folder))
+        return f"{folder_name}/{os.path.basename(path)}"
+
+    def save(self, path: str):
+        index = {}
+        blobs = []
+        offset = 0
+
+        for name, (width, height, data) in self.images.items():
+            index[name] = {
+                "kind": "image", "offset": offset, "size": len(data),
+                "width": width, "height": height,
+            }
+            blobs.append(data)
+            offset += len(data)
+
+        for name, (channels, sample_size, rate, data) in self.sounds.items():
+            index[name] = {
+                "kind": "sound", "offset": offset, "size": len(data),
+                "channels": channels, "sample_size": sample_size,
+                "sample_rate": rate,
+            }
+            blobs.append(data)
+            offset += len(data)
+
+        index_data = json.dumps(index).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, len(index_data)))
+            f.write(index_data)
+            for data in blobs:
+                f.write(data)
@@ -0,0 +1,76 @@
+from .asset_bundle import AssetBundle
+
+import pyglet
+import pyglet.image.atlas
+from pyglet.media.codecs.base import AudioFormat
+
+import os
+from typing import Dict, Optional
+
+
+class DecodedSound(pyglet.media.StaticSource):
+    """
+    A static source over PCM that is already decoded, which pyglet's
+    StaticSource can only make by reading another source.
+    """
+
+    def __init__(self, data: bytes, audio_format: AudioFormat):
+        self._data = data
+        self.audio_format = audio_format
+        self._duration = len(data) / audio_format.bytes_per_second
+
+
+class Assets:
+    """
+    Images and sounds for the interface, loaded from the pre-decoded asset
+    bundle when one has been built, otherwise from the assets folder.
+
+    Every image is packed into one texture atlas, so changing a sprite's
+    image only changes its texture coordinates. Bundled sounds are kept
+    decoded in memory and can be played again without decoding, others are
+    streamed from their file each time.
+    """
+
+    ATLAS_SIZE = 1024
+
+    def __init__(self, bundle_path: Optional[str] = None):
+        if bundle_path is None:
+            bundle_path = os.path.join(
+                pyglet.resource.get_script_home(), AssetBundle.FILE_NAME
+            )
+
+        self.bundle: Optional[AssetBundle] = None
+        try:
+            self.bundle = AssetBundle.load(bundle_path)
+        except FileNotFoundError:
+            print("No asset bundle found, loading assets individually.")
+
+        self.atlas = pyglet.image.atlas.TextureBin(
+            self.ATLAS_SIZE, self.ATLAS_SIZE
+        )
+        self.images: Dict[str, pyglet.image.TextureRegion] = {}
+        self.sounds: Dict[str, pyglet.media.StaticSource] = {}
+        if self.bundle is not None:
+            for name, sound in self.bundle.sounds.items():
+                channels, sample_size, rate, data = sound
+                self.sounds[name] = DecodedSound(
+                    data, AudioFormat(channels, sample_size, rate)
+                )
+
+    def image(self, name: str) -> pyglet.image.TextureRegion:
+        if name not in self.images:
+            if self.bundle is not None and name in self.bundle.images:
+                width, height, data = self.bundle.images[name]
+                image = pyglet.image.ImageData(width, height, "RGBA", data)
+            else:
+                with pyglet.resource.file(name) as f:
+                    image = pyglet.image.load(name, file=f)
+            # The border stops neighbouring images bleeding in when scaled
+            self.images[name] = self.atlas.add(image, border=1)
+        return self.images[name]
+
+    def sound(self, name: str) -> pyglet.media.Source:
+        if name in self.sounds:
+            return self.sounds[name]
+        # A streaming source can only be queued once
+        return pyglet.resource.media(name)
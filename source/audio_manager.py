@@ -1,67 +1,135 @@
-import pyaudio
-import pyglet
+from .audio_sources import AudioSource, PortAudioSource
+from .avi_writer import AudioFormat, AviWriter
+from .pacing import MediaClock
+from .ring_buffer import RingBuffer
 
 import os
+from threading import Thread
+import time
+from typing import Callable, Optional
 import wave
 
 
 class AudioManager:
-    SAMPLE_FORMAT = pyaudio.paInt16  # 16 bits per sample
+    SAMPLE_WIDTH = 2  # 16 bits per sample
     CHANNELS = 2
     FS = 44100  # Record at 44100 samples per second
     FRAME_TIME = 1/30
+    BUFFER_TIME = 2  # Seconds of audio the ring buffer can hold
 
     recording = False
-    frames = []
+    sink: Optional[AviWriter] = None
+    wave_file: Optional[wave.Wave_write] = None
+    clock: Optional[MediaClock] = None
+    # Seconds of silence before the first chunk, so audio starts at the same
+    # moment as the recording's clock
+    lead_in: Optional[float] = None
+    samples = 0
 
-    def __init__(self):
-        self.pyaudio = pyaudio.PyAudio()  # Create an interface to PortAudio
+    def __init__(
+            self,
+            audio_source: Callable[[int, int, int], AudioSource] = (
+                PortAudioSource
+            )
+    ):
+        self.sample_width = self.SAMPLE_WIDTH
+        self.source = audio_source(self.CHANNELS, self.sample_width, self.FS)
+        self.buffer = RingBuffer(
+            int(self.FS * self.BUFFER_TIME) * self.CHANNELS * self.sample_width
+        )
+        self.writer_thread: Optional[Thread] = None
+
+    @property
+    def format(self) -> AudioFormat:
+        return (self.CHANNELS, self.sample_width, self.FS)
 
-    def start_recording(self):
+    def start_recording(
+            self,
+            output_path: str,
+            clock: MediaClock,
+            sink: Optional[AviWriter] = None
+    ):
         if self.recording:
             print("Already recording!")
             return
 
-        self.stream = self.pyaudio.open(
-            frames_per_buffer=int(self.FS*self.FRAME_TIME)*2,
-            format=self.SAMPLE_FORMAT,
-            channels=self.CHANNELS,
-            rate=self.FS,
-            input=True
-        )
+        self.clock = clock
+        self.lead_in = None
+        self.samples = 0
+        self.sink = sink
+        if sink is None:
+            # Save the recorded data as a WAV file, written as it arrives
+            path = os.path.join(output_path, "audio.wav")
+            self.wave_file = wave.open(path, "wb")
+            self.wave_file.setnchannels(self.CHANNELS)
+            self.wave_file.setsampwidth(self.sample_width)
+            self.wave_file.setframerate(self.FS)
+
+        self.buffer.read()
+        self.buffer.overflows = 0
         self.recording = True
-        self.frames = []
 
-        pyglet.clock.schedule_interval(self.frame, self.FRAME_TIME)
+        self.writer_thread = Thread(target=self.write, daemon=True)
+        self.writer_thread.start()
 
-    def frame(self, dt: float):
-        if self.recording:
-            data = self.stream.read(self.stream.get_read_available())
-            self.frames.append(data)
+        self.source.start(self.callback, int(self.FS*self.FRAME_TIME))
+
+    def callback(self, in_data: bytes, frame_count: int, overflowed: bool):
+        # Runs on the source's thread, keep it to a single buffer copy and a
+        # little arithmetic
+        timestamp = time.monotonic() - frame_count / self.FS
+        if self.lead_in is None:
+            self.lead_in = max(self.clock(timestamp), 0)
+        self.clock.sync(timestamp, self.lead_in + self.samples / self.FS)
+        self.samples += frame_count
+
+        if overflowed:
+            self.buffer.overflows += 1
+        self.buffer.write(in_data)
+
+    def write_data(self, data: bytes):
+        if self.sink is not None:
+            self.sink.write_audio(data)
+        else:
+            self.wave_file.writeframesraw(data)
+
+    def write(self):
+        lead_in_written = False
+        while self.recording or len(self.buffer) > 0:
+            data = self.buffer.read()
+            if len(data) == 0:
+                time.sleep(self.FRAME_TIME)
+                continue
+
+            if not lead_in_written:
+                frames = round(self.lead_in * self.FS)
+                self.write_data(bytes(
+                    frames * self.CHANNELS * self.sample_width
+                ))
+                lead_in_written = True
+            self.write_data(data)
+
+        if self.wave_file is not None:
+            # Patches the header with the final length
+            self.wave_file.close()
+            self.wave_file = None
 
     def stop_recording(self):
         if not self.recording:
             print("Not currently recording.")
             return
-        self.stream.stop_stream()
+        self.source.stop()
         self.recording = False
 
-    def save(self, output_path: str):
-        if len(self.frames) == 0:
-            print("No audio to save!")
-            return
-
-        # Save the recorded data as a WAV file
-        path = os.path.join(output_path, "audio.wav")
-        wf = wave.open(path, "wb")
-        wf.setnchannels(self.CHANNELS)
-        wf.setsampwidth(self.pyaudio.get_sample_size(self.SAMPLE_FORMAT))
-        wf.setframerate(self.FS)
-        wf.writeframes(b"".join(self.frames))
-        wf.close()
+        self.writer_thread.join()
+        self.sink = None
+        self.clock = None
+        if self.buffer.overflows > 0:
+            print(f"Audio buffer overflowed {self.buffer.overflows} times.")
 
-        self.frames = []
+    @property
+    def overflows(self) -> int:
+        return self.buffer.overflows
 
     def __del__(self):
-        self.stream.close()
-        self.pyaudio.terminate()
+        self.source.close()
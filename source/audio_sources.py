@@ -0,0 +1,137 @@
+try:
+    import pyaudio
+except ImportError:
+    pyaudio = None
+
+import math
+import struct
+from threading import Event, Thread
+import time
+from typing import Callable, Optional
+
+
+# Called with a chunk of interleaved samples, the number of frames in it and
+# whether input was lost before it
+AudioCallback = Callable[[bytes, int, bool], None]
+
+
+class AudioSource:
+    """
+    A microphone delivering chunks of signed little endian PCM to a
+    callback, from a thread of its own.
+    """
+
+    def __init__(self, channels: int, sample_width: int, rate: int):
+        self.channels = channels
+        self.sample_width = sample_width
+        self.rate = rate
+
+    def start(self, callback: AudioCallback, frames_per_buffer: int):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class PortAudioSource(AudioSource):
+    def __init__(self, channels: int, sample_width: int, rate: int):
+        super().__init__(channels, sample_width, rate)
+        if pyaudio is None:
+            raise RuntimeError("PyAudio is needed to record from PortAudio.")
+
+        self.pyaudio = pyaudio.PyAudio()  # Create an interface to PortAudio
+        self.stream = None
+        self.callback: Optional[AudioCallback] = None
+
+    def start(self, callback: AudioCallback, frames_per_buffer: int):
+        self.callback = callback
+        self.stream = self.pyaudio.open(
+            frames_per_buffer=frames_per_buffer,
+            format=self.pyaudio.get_format_from_width(self.sample_width),
+            channels=self.channels,
+            rate=self.rate,
+            input=True,
+            stream_callback=self.stream_callback
+        )
+
+    def stream_callback(self, in_data, frame_count, time_info, status_flags):
+        # Runs on the PortAudio thread
+        overflowed = bool(status_flags & pyaudio.paInputOverflow)
+        self.callback(in_data, frame_count, overflowed)
+        return None, pyaudio.paContinue
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+
+    def close(self):
+        self.stop()
+        self.pyaudio.terminate()
+
+
+class SineSource(AudioSource):
+    """
+    A synthetic microphone playing a sine wave, delivered in real time in
+    chunks of `frames_per_buffer` frames. The signal is deterministic, it
+    depends only on the position in the stream.
+    """
+
+    FREQUENCY = 440
+    AMPLITUDE = 0.25
+
+    def __init__(self, channels: int, sample_width: int, rate: int):
+        super().__init__(channels, sample_width, rate)
+        self.stopped = Event()
+        self.thread: Optional[Thread] = None
+
+        # One second of signal, a whole number of periods so it loops
+        # without a click
+        peak = self.AMPLITUDE * (2 ** (8 * sample_width - 1) - 1)
+        fmt = {1: "b", 2: "h", 4: "i"}[sample_width]
+        samples = []
+        for i in range(rate):
+            phase = 2 * math.pi * self.FREQUENCY * i / rate
+            value = int(peak * math.sin(phase))
+            samples.extend([value] * channels)
+        self.signal = struct.pack(f"<{len(samples)}{fmt}", *samples)
+
+    def start(self, callback: AudioCallback, frames_per_buffer: int):
+        self.stopped.clear()
+        self.thread = Thread(
+            target=self.run,
+            args=(callback, frames_per_buffer),
+            daemon=True
+        )
+        self.thread.start()
+
+    def run(self, callback: AudioCallback, frames_per_buffer: int):
+        frame_size = self.channels * self.sample_width
+        chunk_size = frames_per_buffer * frame_size
+        started = time.monotonic()
+        position = 0
+        chunks = 0
+
+        while True:
+            # Chunks are delivered once they would have been recorded
+            chunks += 1
+            deadline = started + chunks * frames_per_buffer / self.rate
+            if self.stopped.wait(max(deadline - time.monotonic(), 0)):
+                break
+
+            end = position + chunk_size
+            data = self.signal[position:end]
+            if len(data) < chunk_size:
+                data += self.signal[:chunk_size - len(data)]
+            position = end % len(self.signal)
+            callback(data, frames_per_buffer, False)
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,245 @@
+from PIL import Image
+
+from .pacing import MediaClock
+from .stream_writer import StreamWriter
+
+import io
+import os
+import struct
+from typing import Dict, List, Optional, Tuple
+
+
+AudioFormat = Tuple[int, int, int]  # Channels, sample width, sample rate
+
+
+class AviWriter(StreamWriter):
+    """
+    Writes an AVI file with one JPEG per video frame (MJPEG) and,
+    optionally, interleaved PCM audio.
+
+    Chunks are appended to the file as they arrive, and the index and the
+    frame counts in the headers are written when the file is closed.
+
+    AVI 1.0 stores sizes in 32 bits, and many players can't read past 2 GiB,
+    so once a file would grow beyond `MAX_FILE_SIZE` it is finished and the
+    recording continues in "video-2.avi", "video-3.avi" and so on.
+    """
+
+    QUALITY = 85
+    MAX_FILE_SIZE = 2 ** 31 - 1
+    INDEX_ENTRY_SIZE = 16
+
+    AVIF_HASINDEX = 0x10
+    AVIIF_KEYFRAME = 0x10
+    VIDEO_CHUNK = b"00dc"
+    AUDIO_CHUNK = b"01wb"
+
+    def __init__(
+            self,
+            path: str,
+            mode: str,
+            size: Tuple[int, int],
+            fps: float,
+            clock: MediaClock,
+            audio: Optional[AudioFormat] = None,
+            preset: Optional[Dict] = None
+    ):
+        self.mode = mode
+        self.size = size
+        self.fps = fps
+        self.audio = audio
+        self.jpeg_options = preset or {"quality": self.QUALITY}
+
+        self.paths: List[str] = []
+        self.open_file(path)
+        super().__init__(path, fps, clock)
+
+    def open_file(self, path: str):
+        self.index: List[Tuple[bytes, int, int]] = []
+        self.video_frames = 0
+        self.audio_bytes = 0
+        self.max_chunk = 0
+
+        self.file = open(path, "wb")
+        self.paths.append(path)
+        self.file.write(self.header())
+        self.movi_start = self.file.tell() - 4
+
+    def next_path(self) -> str:
+        base, extension = os.path.splitext(self.paths[0])
+        return f"{base}-{len(self.paths) + 1}{extension}"
+
+    def header(self, riff_size: int = 0, movi_size: int = 4) -> bytes:
+        width, height = self.size
+        streams = 1 if self.audio is None else 2
+
+        avih = struct.pack(
+            "<14I",
+            int(1000000 / self.fps),    # Microseconds per frame
+            0,                          # Max bytes per second
+            0,                          # Padding granularity
+            self.AVIF_HASINDEX,         # Flags
+            self.video_frames,          # Total frames
+            0,                          # Initial frames
+            streams,                    # Streams
+            self.max_chunk,             # Suggested buffer size
+            width,
+            height,
+            0, 0, 0, 0                  # Reserved
+        )
+
+        video_strh = struct.pack(
+            "<4s4sIHHIIIIIIII4h",
+            b"vids",
+            b"MJPG",
+            0,                          # Flags
+            0,                          # Priority
+            0,                          # Language
+            0,                          # Initial frames
+            1,                          # Scale
+            int(self.fps),              # Rate
+            0,                          # Start
+            self.video_frames,          # Length
+            self.max_chunk,             # Suggested buffer size
+            0xFFFFFFFF,                 # Quality
+            0,                          # Sample size
+            0, 0, width, height         # Frame rectangle
+        )
+        # BITMAPINFOHEADER
+        video_strf = struct.pack(
+            "<IiiHH4sIiiII",
+            40,
+            width,
+            height,
+            1,                          # Planes
+            24,                         # Bits per pixel
+            b"MJPG",
+            width * height * 3,         # Image size
+            0, 0,                       # Pixels per metre
+            0, 0                        # Colours used, important
+        )
+        streams_list = self.list_chunk(
+            b"strl",
+            self.chunk(b"strh", video_strh) + self.chunk(b"strf", video_strf)
+        )
+
+        if self.audio is not None:
+            channels, sample_width, rate = self.audio
+            block_align = channels * sample_width
+            audio_strh = struct.pack(
+                "<4s4sIHHIIIIIIII4h",
+                b"auds",
+                b"\x00\x00\x00\x00",
+                0,                      # Flags
+                0,                      # Priority
+                0,                      # Language
+                0,                      # Initial frames
+                block_align,            # Scale
+                rate * block_align,     # Rate
+                0,                      # Start
+                self.audio_bytes // block_align,
+                0,                      # Suggested buffer size
+                0xFFFFFFFF,             # Quality
+                block_align,            # Sample size
+                0, 0, 0, 0              # Frame rectangle
+            )
+            # WAVEFORMATEX
+            audio_strf = struct.pack(
+                "<HHIIHHH",
+                1,                      # PCM
+                channels,
+                rate,
+                rate * block_align,
+                block_align,
+                sample_width * 8,
+                0
+            )
+            streams_list += self.list_chunk(
+                b"strl",
+                self.chunk(b"strh", audio_strh)
+                + self.chunk(b"strf", audio_strf)
+            )
+
+        hdrl = self.list_chunk(
+            b"hdrl",
+            self.chunk(b"avih", avih) + streams_list
+        )
+        return (
+            b"RIFF" + struct.pack("<I", riff_size) + b"AVI "
+            + hdrl
+            + b"LIST" + struct.pack("<I", movi_size) + b"movi"
+        )
+
+    @staticmethod
+    def chunk(fourcc: bytes, data: bytes) -> bytes:
+        padding = b"\x00" if len(data) % 2 else b""
+        return fourcc + struct.pack("<I", len(data)) + data + padding
+
+    @classmethod
+    def list_chunk(cls, fourcc: bytes, data: bytes) -> bytes:
+        return b"LIST" + struct.pack("<I", len(data) + 4) + fourcc + data
+
+    def write_chunk(self, fourcc: bytes, data: bytes):
+        # Room for the chunk, its padding and its entry in the index
+        size = (
+            self.file.tell() + 8 + len(data) + 1
+            + 8 + (len(self.index) + 1) * self.INDEX_ENTRY_SIZE
+        )
+        if size > self.MAX_FILE_SIZE and len(self.index) > 0:
+            self.finish()
+            self.open_file(self.next_path())
+
+        offset = self.file.tell() - self.movi_start
+        self.file.write(self.chunk(fourcc, data))
+        self.index.append((fourcc, offset, len(data)))
+        self.max_chunk = max(self.max_chunk, len(data))
+
+    def write_audio(self, data: bytes):
+        # Nothing reads the queue once writing has failed
+        if self.audio is None or self.failed:
+            return
+        self.queue.put((self.write_audio_chunk, (data,)))
+
+    def write_audio_chunk(self, data: bytes):
+        self.write_chunk(self.AUDIO_CHUNK, data)
+        self.audio_bytes += len(data)
+
+    def write_image(self, image: Image.Image, slots: int):
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", **self.jpeg_options)
+        data = buffer.getvalue()
+        # The frame rate is constant, so repeat the frame to fill its slots
+        for _ in range(slots):
+            self.write_chunk(self.VIDEO_CHUNK, data)
+        self.video_frames += slots
+
+    @property
+    def stats(self) -> dict:
+        stats = super().stats
+        stats["files"] = [os.path.basename(path) for path in self.paths]
+        return stats
+
+    def index_chunk(self) -> bytes:
+        return self.chunk(b"idx1", b"".join(
+            struct.pack("<4sIII", fourcc, self.AVIIF_KEYFRAME, offset, size)
+            for fourcc, offset, size in self.index
+        ))
+
+    def abort(self):
+        try:
+            self.file.close()
+        except OSError:
+            # Buffered data can't be flushed to a full or missing card
+            pass
+
+    def finish(self):
+        index = self.index_chunk()
+        self.file.write(index)
+        end = self.file.tell()
+
+        # Rewrite the headers now the frame counts and sizes are known, they
+        # are the same length as the placeholders written at the start
+        header = self.header(end - 8, end - len(index) - self.movi_start)
+        self.file.seek(0)
+        self.file.write(header)
+        self.file.close()
@@ -0,0 +1,333 @@
+from .audio_manager import AudioManager
+from .audio_sources import SineSource
+from .camera_sources import TestPattern
+from .frame_spool import FrameSpool
+from .pacing import MediaClock
+from .save_worker import SaveWorker
+from .video_manager import VideoManager
+
+import pyglet
+import PIL
+
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+def resident_memory() -> int:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize()
+    except FileNotFoundError:
+        # Peak rather than current usage, but still shows growth
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def summarise(samples: List[float]) -> Dict[str, float]:
+    if len(samples) == 0:
+        return {"count": 0}
+
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean": statistics.mean(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)],
+        "max": ordered[-1],
+    }
+
+
+class Benchmark:
+    """
+    Measures the capture, preview, recording and saving pipeline using a
+    synthetic test pattern camera and sine wave microphone, so it runs
+    without a camera, microphone or display. Results are written as JSON so
+    runs can be compared.
+    """
+
+    CAMERA_FPS = 30
+    CAMERA_TIMEOUT = 5
+    SHUTTER_PRESSES = 10
+    # Time between shutter presses, not a multiple of the frame interval so
+    # presses land at different points between frames
+    SHUTTER_INTERVAL = 0.27
+
+    def __init__(
+            self,
+            resolution: Tuple[int, int],
+            video_format: str = "gif",
+            video_preset: str = "balanced",
+            recording_mode: str = "stream",
+            audio: bool = True
+    ):
+        self.resolution = resolution
+        self.video_format = video_format
+        self.video_preset = video_preset
+        self.recording_mode = recording_mode
+        self.audio = audio
+        self.folder = tempfile.mkdtemp(prefix="rotograph-benchmark-")
+
+    def video_manager(self, camera_fps: float) -> VideoManager:
+        video_manager = VideoManager(
+            VideoManager.MAX_FPS,
+            self.resolution,
+            device_folder=None,
+            camera_source=lambda device, resolution: TestPattern(
+                device, resolution, camera_fps
+            )
+        )
+        video_manager.video_format = self.video_format
+        video_manager.video_preset = self.video_preset
+
+        deadline = time.monotonic() + self.CAMERA_TIMEOUT
+        while video_manager.buffer.peek() is None:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Test pattern camera did not start.")
+            time.sleep(0.01)
+        return video_manager
+
+    def close(self, video_manager: VideoManager):
+        pyglet.clock.unschedule(video_manager.frame)
+        video_manager.capturing = False
+        video_manager.capture_thread.join()
+
+    def run_clock(self, duration: float, until: Callable[[], bool] = None):
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            if until is not None and until():
+                break
+            pyglet.clock.tick()
+            sleep = pyglet.clock.get_sleep_time(True)
+            time.sleep(min(sleep or 0.001, 0.01, end - time.monotonic()))
+
+    def capture(self, duration: float) -> Dict:
+        # Unthrottled source, so capture runs as fast as it can convert and
+        # enhance frames
+        video_manager = self.video_manager(0)
+        pyglet.clock.unschedule(video_manager.frame)
+
+        get_image_times = []
+        frame_times = []
+        start_frames = video_manager.buffer.pushed_frames
+        start = time.monotonic()
+        while time.monotonic() - start < duration:
+            before = time.perf_counter()
+            video_manager.get_image()
+            after = time.perf_counter()
+            video_manager.frame()
+            get_image_times.append(after - before)
+            frame_times.append(time.perf_counter() - after)
+            time.sleep(0.001)
+
+        elapsed = time.monotonic() - start
+        captured = video_manager.buffer.pushed_frames - start_frames
+        self.close(video_manager)
+        return {
+            "duration": elapsed,
+            "captured_fps": captured / elapsed,
+            "get_image": summarise(get_image_times),
+            "frame": summarise(frame_times),
+        }
+
+    def preview(self, duration: float) -> Dict:
+        video_manager = self.video_manager(self.CAMERA_FPS)
+        latencies = []
+
+        def on_frame_ready():
+            timestamp, _ = video_manager.buffer.peek()
+            latencies.append(time.monotonic() - timestamp)
+
+        video_manager.push_handlers(on_frame_ready=on_frame_ready)
+        self.run_clock(duration)
+        self.close(video_manager)
+        return {
+            "camera_fps": self.CAMERA_FPS,
+            "preview_fps": len(latencies) / duration,
+            "latency": summarise(latencies),
+        }
+
+    def shutter(self, presses: int, burst: int) -> Dict:
+        video_manager = self.video_manager(self.CAMERA_FPS)
+        video_manager.fps = 0
+        path = os.path.join(self.folder, f"photos-{burst}")
+        os.makedirs(path)
+
+        saved_times = []
+        video_manager.push_handlers(
+            on_photo_saved=lambda saved_path, saved: saved_times.append(
+                time.monotonic()
+            )
+        )
+
+        def photos_saved() -> bool:
+            # Polled more often than frame() runs, for finer timing
+            video_manager.check_photos()
+            return not video_manager.photos_pending
+
+        lags = []
+        to_disk = []
+        for press in range(presses):
+            self.run_clock(self.SHUTTER_INTERVAL)
+            saved_times.clear()
+            shutter_time = time.monotonic()
+            frame_time = video_manager.take_photos(
+                path, f"{press:03}", shutter_time, burst
+            )
+            if frame_time is None:
+                continue
+            self.run_clock(float("inf"), photos_saved)
+            lags.append(frame_time - shutter_time)
+            to_disk.append(saved_times[-1] - shutter_time)
+
+        self.close(video_manager)
+        return {
+            "burst": burst,
+            # Negative when the closest frame was captured before the press
+            "shutter_lag": summarise(lags),
+            "shutter_to_disk": summarise(to_disk),
+        }
+
+    def record(
+            self,
+            video_manager: VideoManager,
+            audio_manager: Optional[AudioManager],
+            worker: SaveWorker,
+            fps: int,
+            length: float
+    ) -> Dict:
+        video_manager.fps = fps
+        name = f"{fps}fps-{length:g}s"
+        path = os.path.join(self.folder, name)
+        os.makedirs(path)
+
+        spool_path = None
+        if (
+            self.recording_mode == "spool"
+            or self.video_format in ("webp", "apng")
+        ):
+            spool_path = os.path.join(self.folder, name + FrameSpool.EXTENSION)
+        streams_audio = (
+            audio_manager is not None and self.video_format == "avi"
+        )
+
+        memory_before = resident_memory()
+        clock = MediaClock(time.monotonic())
+        video_manager.start_recording(
+            path,
+            clock,
+            spool_path,
+            audio_manager.format if streams_audio else None
+        )
+        if audio_manager is not None:
+            audio_manager.start_recording(
+                path,
+                clock,
+                video_manager.writer if streams_audio else None
+            )
+        self.run_clock(length)
+        memory_recording = resident_memory()
+
+        start = time.perf_counter()
+        if audio_manager is not None:
+            audio_manager.stop_recording()
+        video_manager.stop_recording()
+        stop_time = time.perf_counter() - start
+
+        completed = []
+        job_id = video_manager.save(worker, path)
+
+        def on_save_complete(completed_id: int, success: bool):
+            if completed_id == job_id:
+                completed.append(success)
+
+        if job_id is not None:
+            worker.push_handlers(on_save_complete=on_save_complete)
+            self.run_clock(float("inf"), lambda: len(completed) > 0)
+            worker.remove_handlers(on_save_complete=on_save_complete)
+        save_time = time.perf_counter() - start - stop_time
+
+        with open(os.path.join(path, "metadata.json"), "r") as f:
+            metadata = json.load(f)
+        files = {
+            file_name: os.path.getsize(os.path.join(path, file_name))
+            for file_name in sorted(os.listdir(path))
+        }
+        return {
+            "fps": fps,
+            "length": length,
+            "memory_growth": memory_recording - memory_before,
+            "stop_time": stop_time,
+            "save_time": save_time,
+            "saved": completed == [True] if job_id is not None else True,
+            "metadata": metadata,
+            "files": files,
+        }
+
+    def recordings(self, fps_values: List[int], lengths: List[float]) -> List:
+        video_manager = self.video_manager(self.CAMERA_FPS)
+        audio_manager = AudioManager(SineSource) if self.audio else None
+        worker = SaveWorker()
+
+        results = []
+        for fps in fps_values:
+            for length in lengths:
+                print(f"Recording {length:g}s at {fps} fps.")
+                results.append(self.record(
+                    video_manager, audio_manager, worker, fps, length
+                ))
+
+        worker.close()
+        self.close(video_manager)
+        return results
+
+    def run(
+            self,
+            output_path: str,
+            duration: float,
+            fps_values: List[int],
+            lengths: List[float],
+            burst: int = 5
+    ):
+        print("Measuring capture throughput.")
+        capture = self.capture(duration)
+        print("Measuring preview latency.")
+        preview = self.preview(duration)
+        print("Measuring shutter latency.")
+        shutter = [
+            self.shutter(self.SHUTTER_PRESSES, count)
+            for count in sorted({1, burst})
+        ]
+        recordings = self.recordings(fps_values, lengths)
+
+        results = {
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "machine": platform.machine(),
+                "cpus": os.cpu_count(),
+                "pillow": PIL.__version__,
+                "pyglet": pyglet.version,
+            },
+            "settings": {
+                "resolution": list(self.resolution),
+                "video_format": self.video_format,
+                "video_preset": self.video_preset,
+                "recording_mode": self.recording_mode,
+                "audio": self.audio,
+            },
+            "capture": capture,
+            "preview": preview,
+            "shutter": shutter,
+            "recordings": recordings,
+        }
+        with open(output_path, "w") as f:
+            json.dump(results, f, indent=4)
+        shutil.rmtree(self.folder)
+        print(f"Results written to '{output_path}'.")
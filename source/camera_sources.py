@@ -0,0 +1,110 @@
+from pygame import camera
+from pygame import image
+from PIL import Image, ImageDraw
+
+from .profiler import profiler
+
+import time
+from typing import Optional, Tuple
+
+
+class CameraSource:
+    """
+    A camera the capture thread reads RGB frames from. `get_image` blocks
+    until the next frame is available and raises SystemError if the device
+    fails.
+
+    While `monochrome` is set, sources that can read the luma alone may
+    return "L" frames instead.
+    """
+
+    monochrome = False
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def get_image(self) -> Image.Image:
+        raise NotImplementedError
+
+
+class PygameCamera(CameraSource):
+    FORMAT = "RGB"
+
+    def __init__(self, device: Optional[str], resolution: Tuple[int, int]):
+        camera.init()
+        self.camera = camera.Camera(device, resolution)
+
+    def start(self):
+        self.camera.start()
+
+    def stop(self):
+        self.camera.stop()
+
+    def get_image(self) -> Image.Image:
+        with profiler.stage("capture"):
+            surface = self.camera.get_image()
+        with profiler.stage("convert"):
+            data = image.tostring(surface, self.FORMAT)
+            return Image.frombytes("RGB", surface.get_size(), data)
+
+
+class TestPattern(CameraSource):
+    """
+    A synthetic camera producing colour bars with a box that moves one step
+    per frame, so frames are deterministic and consecutive frames differ.
+    Frames are delivered at `fps` like a real camera, or as fast as they are
+    read if `fps` is 0.
+    """
+
+    BARS = (
+        (192, 192, 192), (192, 192, 0), (0, 192, 192), (0, 192, 0),
+        (192, 0, 192), (192, 0, 0), (0, 0, 192),
+    )
+    BOX_SIZE = 32
+    BOX_STEP = 8
+
+    def __init__(
+            self,
+            device: Optional[str],
+            resolution: Tuple[int, int],
+            fps: float = 30
+    ):
+        self.size = tuple(resolution)
+        self.fps = fps
+        self.frame_count = 0
+        self.started = 0.0
+
+        self.background = Image.new("RGB", self.size)
+        draw = ImageDraw.Draw(self.background)
+        width, height = self.size
+        for i, color in enumerate(self.BARS):
+            left = i * width // len(self.BARS)
+            right = (i + 1) * width // len(self.BARS)
+            draw.rectangle((left, 0, right - 1, height - 1), fill=color)
+        self.box = Image.new("RGB", (self.BOX_SIZE, self.BOX_SIZE), "white")
+
+    def start(self):
+        self.frame_count = 0
+        self.started = time.monotonic()
+
+    def get_image(self) -> Image.Image:
+        if self.fps > 0:
+            deadline = self.started + self.frame_count / self.fps
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                with profiler.stage("capture"):
+                    time.sleep(delay)
+
+        width, height = self.size
+        span = max(width - self.BOX_SIZE, 1)
+        x = (self.frame_count * self.BOX_STEP) % span
+        y = (height - self.BOX_SIZE) // 2
+
+        with profiler.stage("convert"):
+            frame = self.background.copy()
+            frame.paste(self.box, (x, y))
+        self.frame_count += 1
+        return frame
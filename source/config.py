@@ -0,0 +1,139 @@
+# Settings shared by the windowed application and headless mode. This module
+# must not import pyglet's GL modules, headless mode runs without a display.
+from . import encoder
+
+import json
+from json.decoder import JSONDecodeError
+import os
+from typing import Dict
+
+
+CONFIG_FOLDER = os.path.join(os.environ["HOME"], ".config", "rotograph")
+CONFIG_FILE = os.path.join(CONFIG_FOLDER, "config.json")
+SPOOL_FOLDER = os.path.join(os.environ["HOME"], ".cache", "rotograph")
+DEFAULT_CONFIG = {
+    # Spooled recordings survive a crash and are recovered on the next
+    # start, streamed ones are written straight to the card and need no
+    # encoding afterwards but are lost if recording is interrupted. AVI is
+    # always streamed.
+    "recording-mode": "spool",
+    "video-format": "gif",
+    "video-preset": "balanced",
+    # Only redraw when the preview or interface changes
+    "redraw-on-change": True,
+    "cameras": 1,
+    "camera-layout": "side-by-side",
+    # Falls back to pygame when V4L2 can't be used
+    "camera-backend": "v4l2",
+    # Frames are scaled to these sizes before they are processed
+    "record-resolution": [640, 360],
+    "preview-resolution": [640, 360],
+    # Photos taken per shutter press, more than one takes a burst
+    "photo-burst": 1,
+}
+RECORDING_MODES = ("spool", "stream")
+VIDEO_FORMATS = ("gif", "webp", "apng", "avi")
+CAMERA_LAYOUTS = ("side-by-side", "picture-in-picture")
+CAMERA_BACKENDS = ("v4l2", "pygame")
+DATE_FORMAT = "%Y-%m-%d %H-%M-%S %f"
+
+
+def load_config() -> Dict:
+    if not os.path.exists(CONFIG_FOLDER):
+        os.makedirs(CONFIG_FOLDER)
+
+    try:
+        with open(CONFIG_FILE, "r") as f:
+            config = json.load(f)
+    except (FileNotFoundError, JSONDecodeError):
+        config = {}
+
+    for key, value in DEFAULT_CONFIG.items():
+        config.setdefault(key, value)
+    check_video_config(config)
+    check_camera_config(config)
+    save_config(config)
+    return config
+
+
+def save_config(config: Dict):
+    with open(CONFIG_FILE, "w") as f:
+        json.dump(config, f)
+
+
+def check_video_config(config: Dict):
+    if config["recording-mode"] not in RECORDING_MODES:
+        print(
+            f"Unknown recording mode '{config['recording-mode']}', "
+            "using spool."
+        )
+        config["recording-mode"] = "spool"
+
+    if config["video-format"] not in VIDEO_FORMATS:
+        print(
+            f"Unknown video format '{config['video-format']}', "
+            "using gif."
+        )
+        config["video-format"] = "gif"
+
+    if config["video-preset"] not in encoder.PRESETS[config["video-format"]]:
+        print(
+            f"Unknown video preset '{config['video-preset']}', "
+            "using balanced."
+        )
+        config["video-preset"] = "balanced"
+
+
+def check_camera_config(config: Dict):
+    if not isinstance(config["cameras"], int) or config["cameras"] < 1:
+        print(f"Invalid camera count '{config['cameras']}', using 1.")
+        config["cameras"] = 1
+
+    if config["camera-layout"] not in CAMERA_LAYOUTS:
+        print(
+            f"Unknown camera layout '{config['camera-layout']}', "
+            "using side-by-side."
+        )
+        config["camera-layout"] = "side-by-side"
+
+    if config["camera-backend"] not in CAMERA_BACKENDS:
+        print(
+            f"Unknown camera backend '{config['camera-backend']}', "
+            "using v4l2."
+        )
+        config["camera-backend"] = "v4l2"
+
+    burst = config["photo-burst"]
+    if not isinstance(burst, int) or burst < 1:
+        print(f"Invalid photo burst '{burst}', using 1.")
+        config["photo-burst"] = 1
+
+    for key in ("record-resolution", "preview-resolution"):
+        size = config[key]
+        if (
+            not isinstance(size, list)
+            or len(size) != 2
+            or not all(isinstance(n, int) and n > 0 for n in size)
+        ):
+            print(f"Invalid {key} '{size}', using 640x360.")
+            config[key] = [640, 360]
+
+    # Frames are scaled to the record resolution as they are captured, so a
+    # larger preview would only be those frames scaled up
+    record = config["record-resolution"]
+    preview = config["preview-resolution"]
+    if preview[0] > record[0] or preview[1] > record[1]:
+        clamped = [min(preview[0], record[0]), min(preview[1], record[1])]
+        print(
+            f"Preview resolution {preview[0]}x{preview[1]} is larger than "
+            f"the record resolution, using {clamped[0]}x{clamped[1]}."
+        )
+        config["preview-resolution"] = clamped
+
+
+def uses_spool(config: Dict) -> bool:
+    # WebP and APNG can't be written a frame at a time
+    return (
+        config["recording-mode"] == "spool"
+        or config["video-format"] in ("webp", "apng")
+    )
@@ -0,0 +1,192 @@
+# Encoding jobs run by the SaveWorker processes, and the entry points those
+# processes start from. This module must not import pyglet, so that worker
+# processes never open a display or GL context.
+from PIL import Image
+
+from .frame_spool import FrameSpool
+from .pacing import MediaClock, pace
+
+import json
+import os
+from typing import Callable, Dict, List, Optional
+
+
+Progress = Callable[[float], None]
+
+# Set in each worker process, progress of every job is reported through it
+_progress_queue = None
+
+
+# Encoder settings for each output format, from fastest to smallest. GIF has
+# no encoder setting that trades effort for size beyond optimize, so its
+# smallest preset reduces frames to fewer colours. "colors" is applied before
+# saving rather than passed to PIL. The streaming GifWriter and AviWriter
+# read the same settings, AVI's are JPEG options for each frame.
+PRESETS = {
+    "gif": {
+        "fast": {"optimize": False, "interlace": False},
+        "balanced": {"optimize": True, "interlace": False},
+        "small": {"optimize": True, "interlace": False, "colors": 128},
+    },
+    "webp": {
+        "fast": {"lossless": False, "quality": 75, "method": 0},
+        "balanced": {"lossless": False, "quality": 75, "method": 4},
+        "small": {"lossless": False, "quality": 60, "method": 5},
+    },
+    "apng": {
+        "fast": {"optimize": False, "compress_level": 1},
+        "balanced": {"optimize": False, "compress_level": 6},
+        "small": {"optimize": True, "compress_level": 9},
+    },
+    "avi": {
+        "fast": {"quality": 85, "optimize": False},
+        "balanced": {"quality": 85, "optimize": True},
+        "small": {"quality": 70, "optimize": True},
+    },
+}
+FILE_NAMES = {
+    "gif": ("frames.gif", "GIF"),
+    "webp": ("frames.webp", "WEBP"),
+    "apng": ("frames.png", "PNG"),
+}
+# Smallest frame delay each format can store, in milliseconds
+TIME_UNITS = {
+    "gif": 10,
+    "webp": 1,
+    "apng": 1,
+}
+
+
+class SpoolFrames:
+    """
+    The kept frames of a spool after the first, read lazily. Some PIL
+    encoders iterate `append_images` more than once, so this can be iterated
+    again.
+    """
+
+    def __init__(
+            self,
+            spool: FrameSpool,
+            kept: List[int],
+            progress: Progress,
+            colors: Optional[int] = None
+    ):
+        self.spool = spool
+        self.kept = set(kept[1:])
+        self.progress = progress
+        self.colors = colors
+
+    def __iter__(self):
+        count = len(self.spool)
+        for i, (_, frame) in enumerate(self.spool):
+            if i in self.kept:
+                self.progress(i / count)
+                yield reduce_colors(frame, self.colors)
+
+
+def reduce_colors(frame: Image.Image, colors: Optional[int]) -> Image.Image:
+    if colors is None:
+        return frame
+    # Fast octree only handles colour images
+    method = Image.FASTOCTREE if frame.mode == "RGB" else Image.MEDIANCUT
+    return frame.quantize(colors, method=method)
+
+
+def durations(slots: List[int], fps: float, unit: int) -> List[int]:
+    # Round the running total rather than each frame, so the clip length
+    # stays exact even when single frames can't be
+    result = []
+    total = 0
+    written = 0
+    for count in slots:
+        total += count
+        end = round(total * 1000 / fps / unit) * unit
+        result.append(end - written)
+        written = end
+    return result
+
+
+def init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def run_job(job_id: int, function: Callable, args: tuple):
+    # The worker entry points live here rather than in save_worker, so that
+    # unpickling them doesn't import pyglet
+    def progress(value: float):
+        _progress_queue.put((job_id, value))
+
+    function(progress, *args)
+
+
+def write_metadata(output_path: str, metadata: Dict):
+    path = os.path.join(output_path, "metadata.json")
+    with open(path, "w") as f:
+        json.dump(metadata, f, indent=4)
+
+
+def encode_animation(
+        progress: Progress,
+        spool_path: str,
+        output_path: str,
+        video_format: str = "gif",
+        preset: str = "balanced",
+        clock: Optional[MediaClock] = None,
+        end: Optional[float] = None,
+        metadata: Optional[Dict] = None
+):
+    spool = FrameSpool.open(spool_path)
+    if spool is None:
+        print(f"Discarding unreadable recording '{spool_path}'.")
+        os.remove(spool_path)
+        return
+
+    timestamps = spool.timestamps()
+    if len(timestamps) == 0:
+        print("No frames to save.")
+        spool.remove()
+        return
+
+    # Recovered spools have no clock, fall back to the frame timestamps
+    if clock is None:
+        clock = MediaClock(timestamps[0])
+    if end is None:
+        end = timestamps[-1] + 1 / spool.fps
+
+    frames, pacer = pace(timestamps, spool.fps, clock, end)
+    kept = [i for i, _ in frames]
+    options = dict(PRESETS[video_format][preset])
+    colors = options.pop("colors", None)
+    # The first frame is always kept
+    _, first = next(iter(spool))
+
+    name, file_format = FILE_NAMES[video_format]
+    path = os.path.join(output_path, name)
+    reduce_colors(first, colors).save(
+        path,
+        file_format,
+        save_all=True,
+        append_images=SpoolFrames(spool, kept, progress, colors),
+        duration=durations(
+            [slots for _, slots in frames],
+            spool.fps,
+            TIME_UNITS[video_format]
+        ),
+        **options
+    )
+
+    metadata = dict(metadata or {})
+    metadata.update({
+        "fps": spool.fps,
+        "captured_frames": len(timestamps),
+        "frames": pacer.next_slot,
+        "dropped_frames": (
+            metadata.get("dropped_frames", 0) + pacer.dropped_frames
+        ),
+        "duplicated_frames": pacer.duplicated_frames,
+        "duration": pacer.next_slot / spool.fps,
+    })
+    write_metadata(output_path, metadata)
+    spool.remove()
+    progress(1)
@@ -33,6 +33,8 @@
 # ----------------------------------------------------------------------------
 
 from pyglet.gl import *
+from ctypes import byref
+
 import pyglet
 
 
@@ -61,12 +63,38 @@ class FixedResolution:
                 GL_TEXTURE_MIN_FILTER, GL_NEAREST
             )
 
+        # Drawing goes straight into the texture when framebuffer objects are
+        # available, otherwise the back buffer is copied into it
+        self.framebuffer = self._create_framebuffer()
+
         def on_resize(w, h):
             self._calculate_viewport(w, h)
             self.window_w, self.window_h = w, h
 
         self.window.on_resize = on_resize
 
+    def _create_framebuffer(self):
+        info = self.window.context.get_info()
+        if not (info.have_version(3, 0)
+                or info.have_extension("GL_ARB_framebuffer_object")):
+            return None
+
+        framebuffer = GLuint()
+        glGenFramebuffers(1, byref(framebuffer))
+        glBindFramebuffer(GL_FRAMEBUFFER, framebuffer)
+        glFramebufferTexture2D(
+            GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0,
+            self.texture.target, self.texture.id, 0
+        )
+        status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+
+        if status != GL_FRAMEBUFFER_COMPLETE:
+            print("Framebuffer incomplete, copying the back buffer instead.")
+            glDeleteFramebuffers(1, byref(framebuffer))
+            return None
+        return framebuffer
+
     def _calculate_viewport(self, new_screen_width, new_screen_height):
         aspect_ratio = self.width / self.height
         aspect_width = new_screen_width
@@ -88,6 +116,11 @@ class FixedResolution:
         )
 
     def __enter__(self):
+        if self.framebuffer is not None:
+            glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer)
+            glClearColor(*self.clear_color)
+            glClear(GL_COLOR_BUFFER_BIT)
+
         glViewport(0, 0, self.width, self.height)
         glMatrixMode(GL_PROJECTION)
         glLoadIdentity()
@@ -96,8 +129,11 @@ class FixedResolution:
 
     def __exit__(self, *unused):
         win = self.window
-        buffer = pyglet.image.get_buffer_manager().get_color_buffer()
-        self.texture.blit_into(buffer, 0, 0, 0)
+        if self.framebuffer is not None:
+            glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        else:
+            buffer = pyglet.image.get_buffer_manager().get_color_buffer()
+            self.texture.blit_into(buffer, 0, 0, 0)
 
         glViewport(0, 0, win.width, win.height)
         glMatrixMode(GL_PROJECTION)
@@ -0,0 +1,92 @@
+from PIL import Image
+
+from collections import deque
+from threading import Lock
+from typing import List, Optional, Tuple
+import time
+
+
+class FrameBuffer:
+    """
+    A small ring buffer of timestamped frames, filled by a capture thread and
+    read from the main thread without blocking.
+
+    `skipped_frames` counts frames that were never read because a newer
+    frame arrived first, which is expected whenever the camera runs faster
+    than the reader. `stale_frames` counts reads where no new frame had
+    arrived since the previous read.
+    """
+
+    def __init__(self, size: int = 4):
+        self._frames = deque(maxlen=size)
+        self._lock = Lock()
+        self._pushed = 0
+        self._read = 0
+
+        self.skipped_frames = 0
+        self.stale_frames = 0
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    @property
+    def pushed_frames(self) -> int:
+        return self._pushed
+
+    @property
+    def fresh(self) -> bool:
+        return self._pushed != self._read
+
+    def push(self, image: Image.Image, timestamp: Optional[float] = None):
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        with self._lock:
+            self._frames.append((timestamp, image))
+            self._pushed += 1
+
+    def latest(self) -> Optional[Tuple[float, Image.Image]]:
+        with self._lock:
+            if len(self._frames) == 0:
+                return None
+
+            new_frames = self._pushed - self._read
+            if new_frames == 0:
+                self.stale_frames += 1
+            else:
+                self.skipped_frames += new_frames - 1
+            self._read = self._pushed
+
+            return self._frames[-1]
+
+    def peek(self) -> Optional[Tuple[float, Image.Image]]:
+        with self._lock:
+            if len(self._frames) == 0:
+                return None
+            return self._frames[-1]
+
+    def closest(
+            self,
+            timestamp: float
+    ) -> Optional[Tuple[float, Image.Image]]:
+        with self._lock:
+            if len(self._frames) == 0:
+                return None
+            return min(
+                self._frames, key=lambda frame: abs(frame[0] - timestamp)
+            )
+
+    def since(self, timestamp: float) -> List[Tuple[float, Image.Image]]:
+        with self._lock:
+            return [frame for frame in self._frames if frame[0] > timestamp]
+
+    def reset_stats(self):
+        with self._lock:
+            self._read = self._pushed
+            self.skipped_frames = 0
+            self.stale_frames = 0
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self._read = self._pushed
@@ -0,0 +1,208 @@
+from PIL import Image
+
+from queue import Queue
+from threading import Thread
+import glob
+import os
+import struct
+import time
+from typing import Iterator, List, Optional, Tuple
+
+
+class FrameSpool:
+    """
+    An append-only file of raw, timestamped frames.
+
+    Recording streams frames here instead of keeping them in memory, and the
+    encoder reads them back one at a time. A spool left behind by a crash can
+    be reopened and encoded on the next start, a partially written final
+    frame is ignored. The header records the format, preset and camera the
+    recording was started with, so a recovered spool is encoded the way it
+    would have been saved.
+
+    Like a StreamWriter, frames are written on a writer thread so slow
+    storage never blocks the pyglet event loop, and frames are dropped and
+    counted if it falls more than `QUEUE_SIZE` frames behind.
+    """
+
+    MAGIC = b"RSP2"
+    EXTENSION = ".spool"
+    HEADER = struct.Struct("<4s8sIIf8s8s32s")
+    # Spools written before the header held the recording settings
+    LEGACY_MAGIC = b"RSPL"
+    LEGACY_HEADER = struct.Struct("<4s8sIIf")
+    RECORD = struct.Struct("<d")
+    SYNC_INTERVAL = 1
+    QUEUE_SIZE = 48
+
+    def __init__(
+            self,
+            path: str,
+            mode: str,
+            size: Tuple[int, int],
+            fps: float,
+            video_format: Optional[str] = None,
+            preset: Optional[str] = None,
+            camera: Optional[str] = None,
+            writable: bool = True,
+            header_size: int = HEADER.size
+    ):
+        self.path = path
+        self.mode = mode
+        self.size = size
+        self.fps = fps
+        self.video_format = video_format
+        self.preset = preset
+        self.camera = camera
+        self.header_size = header_size
+        self.frame_size = len(mode) * size[0] * size[1]
+        self.record_size = self.RECORD.size + self.frame_size
+
+        self.file = None
+        self.thread = None
+        self.last_sync = time.monotonic()
+        self.dropped_frames = 0
+        self.pending_frames = 0
+
+        if writable:
+            folder = os.path.dirname(path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder)
+            self.file = open(path, "wb")
+            self.file.write(self.HEADER.pack(
+                self.MAGIC,
+                mode.encode("ascii"),
+                *size,
+                fps,
+                (video_format or "").encode("ascii"),
+                (preset or "").encode("ascii"),
+                (camera or "").encode("utf-8")
+            ))
+            self.queue = Queue()
+            self.thread = Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    @classmethod
+    def open(cls, path: str) -> Optional["FrameSpool"]:
+        with open(path, "rb") as f:
+            header = f.read(cls.HEADER.size)
+
+        if header[:4] == cls.MAGIC and len(header) == cls.HEADER.size:
+            magic, mode, width, height, fps, *settings = cls.HEADER.unpack(
+                header
+            )
+            video_format, preset, camera = (
+                value.rstrip(b"\x00").decode("utf-8") or None
+                for value in settings
+            )
+            header_size = cls.HEADER.size
+        elif (
+            header[:4] == cls.LEGACY_MAGIC
+            and len(header) >= cls.LEGACY_HEADER.size
+        ):
+            magic, mode, width, height, fps = cls.LEGACY_HEADER.unpack(
+                header[:cls.LEGACY_HEADER.size]
+            )
+            video_format = preset = camera = None
+            header_size = cls.LEGACY_HEADER.size
+        else:
+            return None
+
+        mode = mode.rstrip(b"\x00").decode("ascii")
+        return cls(
+            path, mode, (width, height), fps, video_format, preset, camera,
+            writable=False, header_size=header_size
+        )
+
+    @classmethod
+    def find(cls, folder: str) -> List[str]:
+        return sorted(glob.glob(os.path.join(folder, "*" + cls.EXTENSION)))
+
+    @property
+    def name(self) -> str:
+        return os.path.splitext(os.path.basename(self.path))[0]
+
+    @property
+    def folders(self) -> List[str]:
+        """
+        The folders below "Videos" the recording is saved in, one per
+        recording, with a subfolder for each camera when there are several.
+        """
+        suffix = " " + (self.camera or "")
+        if self.camera and self.name.endswith(suffix):
+            return [self.name[:-len(suffix)], self.camera]
+        return [self.name]
+
+    def __len__(self) -> int:
+        size = os.path.getsize(self.path) - self.header_size
+        return max(size, 0) // self.record_size
+
+    def write(self, image: Image.Image, timestamp: float):
+        if self.pending_frames >= self.QUEUE_SIZE:
+            self.dropped_frames += 1
+            return
+
+        self.pending_frames += 1
+        self.queue.put((image, timestamp))
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+
+            self.write_frame(*item)
+            self.pending_frames -= 1
+
+    def write_frame(self, image: Image.Image, timestamp: float):
+        if image.mode != self.mode:
+            image = image.convert(self.mode)
+
+        self.file.write(self.RECORD.pack(timestamp))
+        self.file.write(image.tobytes())
+        self.file.flush()
+
+        now = time.monotonic()
+        if now - self.last_sync >= self.SYNC_INTERVAL:
+            self.sync()
+            self.last_sync = now
+
+    def sync(self):
+        fd = self.file.fileno()
+        os.fsync(fd)
+        # Written frames are not read again until the encoder runs, don't let
+        # them crowd out the page cache on low memory devices
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+    def close(self):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+    def remove(self):
+        self.close()
+        os.remove(self.path)
+
+    def timestamps(self) -> List[float]:
+        timestamps = []
+        with open(self.path, "rb") as f:
+            for i in range(len(self)):
+                f.seek(self.header_size + i * self.record_size)
+                timestamp, = self.RECORD.unpack(f.read(self.RECORD.size))
+                timestamps.append(timestamp)
+        return timestamps
+
+    def __iter__(self) -> Iterator[Tuple[float, Image.Image]]:
+        count = len(self)
+        with open(self.path, "rb") as f:
+            f.seek(self.header_size)
+            for _ in range(count):
+                timestamp, = self.RECORD.unpack(f.read(self.RECORD.size))
+                data = f.read(self.frame_size)
+                yield timestamp, Image.frombytes(self.mode, self.size, data)
@@ -0,0 +1,119 @@
+from PIL import Image, GifImagePlugin
+
+from .pacing import MediaClock
+from .stream_writer import StreamWriter
+
+import os
+import struct
+from typing import Dict, Optional, Tuple
+
+
+class GifWriter(StreamWriter):
+    """
+    Writes an animated GIF one frame at a time while recording, so that
+    closing the file only has to write the trailer.
+
+    Every frame shares one global palette, built from the first frame. Later
+    frames are mapped onto it with PIL's palette conversion, which caches
+    colour to index lookups between pixels.
+
+    Takes the same preset settings as the spooled GIF encoder. "optimize"
+    builds the palette with median cut rather than the faster octree, and
+    "colors" limits its size, which makes frames smaller to compress.
+    """
+
+    PALETTE_SIZE = 256
+    # Centiseconds, the unit used by GIF frame delays
+    TIME_UNIT = 100
+
+    def __init__(
+            self,
+            path: str,
+            mode: str,
+            size: Tuple[int, int],
+            fps: float,
+            clock: MediaClock,
+            preset: Optional[Dict] = None
+    ):
+        self.mode = mode
+        self.size = size
+        preset = preset or {}
+        self.colors = preset.get("colors", self.PALETTE_SIZE)
+        self.method = (
+            Image.MEDIANCUT if preset.get("optimize") else Image.FASTOCTREE
+        )
+        # Greyscale frames are reduced to evenly spaced levels
+        step = self.PALETTE_SIZE // self.colors
+        self.grey_levels = [v - v % step for v in range(256)]
+
+        self.palette = None
+        self.header_written = False
+        self.elapsed = 0.0
+        self.written_time = 0
+
+        self.file = open(path, "wb")
+        super().__init__(path, fps, clock)
+
+    def write_header(self, image: Image.Image):
+        if self.mode == "L":
+            palette = bytes(i for i in range(256) for _ in range(3))
+        else:
+            self.palette = image.quantize(self.colors, method=self.method)
+            palette = bytes(self.palette.getpalette()[:768])
+            palette += bytes(768 - len(palette))
+
+        width, height = self.size
+        self.file.write(b"GIF89a")
+        # Logical screen with a 256 colour global palette
+        self.file.write(struct.pack("<HHBBB", width, height, 0xF7, 0, 0))
+        self.file.write(palette)
+        self.header_written = True
+
+    def palettize(self, image: Image.Image) -> Image.Image:
+        if self.mode == "L":
+            # Greyscale values are already indices into the grey palette
+            image = image.convert("L")
+            if self.colors < self.PALETTE_SIZE:
+                image = image.point(self.grey_levels)
+            return image
+
+        return image.convert("RGB").quantize(
+            palette=self.palette,
+            dither=Image.NONE
+        )
+
+    def delay(self, slots: int) -> int:
+        # Accumulate the exact time so rounding to whole centiseconds doesn't
+        # drift over long recordings
+        self.elapsed += slots * self.TIME_UNIT / self.fps
+        delay = round(self.elapsed) - self.written_time
+        self.written_time += delay
+        return delay
+
+    def write_image(self, image: Image.Image, slots: int):
+        if not self.header_written:
+            self.write_header(image)
+
+        frame = self.palettize(image)
+        # Graphic control extension holding the frame delay
+        self.file.write(b"!\xf9\x04\x00")
+        self.file.write(struct.pack("<HBB", self.delay(slots), 0, 0))
+        for chunk in GifImagePlugin.getdata(frame):
+            self.file.write(chunk)
+        self.file.flush()
+
+    def abort(self):
+        try:
+            self.file.close()
+        except OSError:
+            # Buffered data can't be flushed to a full or missing card
+            pass
+
+    def finish(self):
+        if self.header_written:
+            self.file.write(b";")
+        self.file.close()
+
+        if not self.header_written:
+            print("No frames to save.")
+            os.remove(self.path)
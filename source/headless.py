@@ -0,0 +1,247 @@
+from .audio_manager import AudioManager
+from .video_manager import VideoManager
+from .frame_spool import FrameSpool
+from .mounts import MountTable
+from .pacing import MediaClock
+from .save_worker import SaveWorker
+from .v4l2 import camera_backend
+from . import config
+
+import pyglet
+
+import datetime
+import os
+import signal
+import time
+from typing import Dict, List, Optional
+
+
+class Headless:
+    """
+    Runs the camera without a window, GL context or interface, for devices
+    with no display. The pyglet clock is ticked by hand, so only the capture,
+    recording and save schedules run.
+
+    While running, recording is controlled with signals:
+
+        SIGUSR1          start or stop recording
+        SIGUSR2          save a photo of the current frame
+        SIGINT, SIGTERM  stop recording, finish saving and exit
+    """
+
+    # Longest time to wait for the camera's first frame when taking a
+    # single photo
+    CAMERA_TIMEOUT = 10
+
+    recording = False
+    recorded_audio = False
+    datestring = ""
+
+    def __init__(
+            self,
+            settings: Dict,
+            output_folder: Optional[str] = None,
+            fps: int = 24,
+            mute: bool = False,
+            monochrome: bool = False,
+            capture_id: int = 0
+    ):
+        self.config = settings
+        self.output_folder = output_folder
+        self.mounts = MountTable() if output_folder is None else None
+        self.mute = mute
+
+        self.video_manager = VideoManager(
+            fps, settings["record-resolution"], capture_id,
+            camera_source=camera_backend(settings["camera-backend"])
+        )
+        self.video_manager.video_format = settings["video-format"]
+        self.video_manager.video_preset = settings["video-preset"]
+        self.video_manager.monochrome = monochrome
+
+        # PortAudio is only opened when audio will be recorded
+        self.audio_manager = None
+        if not mute:
+            try:
+                self.audio_manager = AudioManager()
+            except Exception as e:
+                print("Audio unavailable, recording without sound:", e)
+                self.mute = True
+
+        self.save_worker = SaveWorker()
+        self.commands: List[str] = []
+        self.running = False
+
+        signal.signal(signal.SIGUSR1, self.on_signal)
+        signal.signal(signal.SIGUSR2, self.on_signal)
+        signal.signal(signal.SIGINT, self.on_signal)
+        signal.signal(signal.SIGTERM, self.on_signal)
+
+    def on_signal(self, signum, frame):
+        # Commands are run from the main loop, not inside the handler
+        if signum == signal.SIGUSR1:
+            self.commands.append("record")
+        elif signum == signal.SIGUSR2:
+            self.commands.append("snapshot")
+        else:
+            self.commands.append("quit")
+
+    def get_output_folder(self, *path: str) -> Optional[str]:
+        folder = self.output_folder
+        if folder is None:
+            mount_path = self.mounts.mount_path(self.config["device-uuid"])
+            if mount_path == "":
+                print("No storage device found.")
+                return None
+            folder = os.path.join(mount_path, self.config["output-path"])
+
+        outdir = os.path.join(folder, *path)
+        if not os.path.exists(outdir):
+            os.makedirs(outdir)
+        return outdir
+
+    def recover_recordings(self):
+        for spool_path in FrameSpool.find(config.SPOOL_FOLDER):
+            spool = FrameSpool.open(spool_path)
+            if spool is None:
+                print(f"Discarding unreadable recording '{spool_path}'.")
+                os.remove(spool_path)
+                continue
+
+            path = self.get_output_folder("Videos", *spool.folders)
+            if path is None:
+                return
+            print(f"Recovering recording '{spool.name}'.")
+            self.video_manager.encode(self.save_worker, spool, path)
+
+    def start_recording(self):
+        if self.recording:
+            return
+        if self.video_manager.fps == 0:
+            self.snapshot()
+            return
+
+        self.datestring = datetime.datetime.now().strftime(config.DATE_FORMAT)
+        path = self.get_output_folder("Videos", self.datestring)
+        if path is None:
+            return
+
+        streams_audio = (
+            self.config["video-format"] == "avi" and not self.mute
+        )
+        spool_path = None
+        if config.uses_spool(self.config):
+            spool_path = os.path.join(
+                config.SPOOL_FOLDER,
+                self.datestring + FrameSpool.EXTENSION
+            )
+
+        clock = MediaClock(time.monotonic())
+        self.video_manager.start_recording(
+            path,
+            clock,
+            spool_path,
+            self.audio_manager.format if streams_audio else None
+        )
+        self.recorded_audio = not self.mute
+        if self.recorded_audio:
+            self.audio_manager.start_recording(
+                path,
+                clock,
+                self.video_manager.writer if streams_audio else None
+            )
+        self.recording = True
+        print(f"Recording '{self.datestring}'.")
+
+    def stop_recording(self):
+        if not self.recording:
+            return
+
+        self.recording = False
+        if self.recorded_audio:
+            self.audio_manager.stop_recording()
+        self.video_manager.stop_recording()
+
+        path = self.get_output_folder("Videos", self.datestring)
+        if path is None:
+            return
+        metadata = {}
+        if self.recorded_audio:
+            metadata["audio_overflows"] = self.audio_manager.overflows
+        self.video_manager.save(self.save_worker, path, metadata=metadata)
+
+    def snapshot(self):
+        path = self.get_output_folder("Images")
+        if path is None:
+            return
+
+        datestring = datetime.datetime.now().strftime(config.DATE_FORMAT)
+        path = self.video_manager.snapshot(path, datestring)
+        if path is None:
+            print("No frame to save yet.")
+        else:
+            print(f"Saved '{path}'.")
+
+    def run_command(self, command: str):
+        if command == "record":
+            if self.recording:
+                self.stop_recording()
+            else:
+                self.start_recording()
+        elif command == "snapshot":
+            self.snapshot()
+        elif command == "quit":
+            self.running = False
+
+    def tick(self):
+        pyglet.clock.tick()
+        sleep = pyglet.clock.get_sleep_time(True)
+        time.sleep(SaveWorker.POLL_INTERVAL if sleep is None else sleep)
+
+    def wait_for_frame(self) -> bool:
+        deadline = time.monotonic() + self.CAMERA_TIMEOUT
+        while self.video_manager.get_image() is None:
+            if time.monotonic() > deadline or len(self.commands) > 0:
+                return False
+            self.tick()
+        return True
+
+    def run(self, record_time: Optional[float] = None, photo: bool = False):
+        print(
+            f"Running headless as process {os.getpid()}. Send SIGUSR1 to "
+            "start or stop recording, SIGUSR2 to take a photo."
+        )
+        self.running = True
+        self.recover_recordings()
+
+        stop_time = None
+        if photo:
+            if self.wait_for_frame():
+                self.snapshot()
+            else:
+                print("Camera did not deliver a frame.")
+            self.running = False
+        elif record_time is not None:
+            self.start_recording()
+            stop_time = time.monotonic() + record_time
+
+        while self.running:
+            while len(self.commands) > 0:
+                self.run_command(self.commands.pop(0))
+            if stop_time is not None and time.monotonic() >= stop_time:
+                self.running = False
+            if self.running:
+                self.tick()
+
+        self.close()
+
+    def close(self):
+        self.stop_recording()
+        if self.save_worker.busy:
+            print("Waiting for saving to finish.")
+        while self.save_worker.busy:
+            self.tick()
+        self.save_worker.close()
+
+        pyglet.clock.unschedule(self.video_manager.frame)
+        self.video_manager.capturing = False
@@ -0,0 +1,149 @@
+import ctypes
+import ctypes.util
+import fnmatch
+import glob
+import os
+import select
+import struct
+from threading import Event, Thread
+from typing import Callable, List, Optional, Set
+
+
+# inotify(7) constants, not exposed by the standard library
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+
+ADDED = IN_CREATE | IN_MOVED_TO | IN_ATTRIB
+REMOVED = IN_DELETE | IN_MOVED_FROM
+
+
+def _load_inotify() -> Optional[ctypes.CDLL]:
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class HotplugWatcher:
+    """
+    Watches a device folder for nodes matching `pattern` being added or
+    removed, and calls `callback(path, added)` from its own thread.
+
+    inotify is used where available, so a plugged in device is reported as
+    soon as its node appears. Attribute changes count as additions, udev
+    only makes a new node readable after it has been created. Without
+    inotify the folder is polled every `POLL_INTERVAL` seconds instead.
+
+    `accept`, if given, picks which matching nodes `devices()` lists, so
+    nodes that match the pattern but aren't cameras don't take up an index.
+    """
+
+    POLL_INTERVAL = 1
+    EVENT = struct.Struct("iIII")
+
+    def __init__(
+            self,
+            callback: Callable[[str, bool], None],
+            folder: str = "/dev",
+            pattern: str = "video*",
+            accept: Optional[Callable[[str], bool]] = None
+    ):
+        self.callback = callback
+        self.folder = folder
+        self.pattern = pattern
+        self.accept = accept
+        self.stopped = Event()
+
+        self.fd = -1
+        libc = _load_inotify()
+        if libc is not None:
+            self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            mask = ADDED | REMOVED
+            if (
+                self.fd >= 0
+                and libc.inotify_add_watch(
+                    self.fd, os.fsencode(folder), mask
+                ) < 0
+            ):
+                os.close(self.fd)
+                self.fd = -1
+        if self.fd < 0:
+            print(
+                f"Cannot watch '{folder}' for devices, "
+                f"polling every {self.POLL_INTERVAL}s instead."
+            )
+
+        # Devices present when polling started
+        self.known: Set[str] = set(self.devices())
+
+        # Written to on close to wake the inotify thread
+        self.wake_read, self.wake_write = os.pipe()
+        target = self.watch if self.fd >= 0 else self.poll
+        self.thread = Thread(target=target, daemon=True)
+        self.thread.start()
+
+    def devices(self) -> List[str]:
+        paths = glob.glob(os.path.join(self.folder, self.pattern))
+        if self.accept is not None:
+            paths = [path for path in paths if self.accept(path)]
+        # Natural order, so video10 comes after video2
+        return sorted(paths, key=lambda path: (len(path), path))
+
+    def watch(self):
+        poll = select.poll()
+        poll.register(self.fd, select.POLLIN)
+        poll.register(self.wake_read, select.POLLIN)
+
+        while not self.stopped.is_set():
+            poll.poll()
+            try:
+                data = os.read(self.fd, 4096)
+            except BlockingIOError:
+                continue
+
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = self.EVENT.unpack_from(data, offset)
+                offset += self.EVENT.size
+                name = data[offset:offset + length].rstrip(b"\x00")
+                offset += length
+
+                if mask & IN_Q_OVERFLOW:
+                    # Events were lost, report every device as new
+                    for path in self.devices():
+                        self.callback(path, True)
+                    continue
+
+                name = os.fsdecode(name)
+                if not fnmatch.fnmatch(name, self.pattern):
+                    continue
+                path = os.path.join(self.folder, name)
+                self.callback(path, bool(mask & ADDED))
+
+    def poll(self):
+        while not self.stopped.wait(self.POLL_INTERVAL):
+            current = set(self.devices())
+            for path in sorted(self.known - current):
+                self.callback(path, False)
+            for path in sorted(current - self.known):
+                self.callback(path, True)
+            self.known = current
+
+    def close(self):
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        os.write(self.wake_write, b"\x00")
+        self.thread.join()
+
+        if self.fd >= 0:
+            os.close(self.fd)
+        os.close(self.wake_read)
+        os.close(self.wake_write)
@@ -1,3 +1,5 @@
+from .assets import Assets
+
 import pyglet
 from pyglet.math import Vec2
 from pyglet.graphics import OrderedGroup
@@ -13,11 +15,25 @@ class Layers(IntEnum):
     WINDOW_UI = 4
 
 
+# One group per layer, shared by everything drawn on it. Sprites only batch
+# together when their parent group is the same object, not an equal one.
+GROUPS = {layer: OrderedGroup(layer) for layer in Layers}
+
+
 class Interface(pyglet.event.EventDispatcher):
+    # Images only shown after a toggle, loaded after startup
+    PRELOAD = (
+        "assets/On.png",
+        "assets/Rec Recording.png",
+        *(f"assets/Countdown {i}.png" for i in range(1, 11)),
+        *(f"assets/{fps:02}.png" for fps in range(25)),
+    )
+
     _grid = False
     _crosshair = False
     _recording = False
     _saving = False
+    _save_progress = 0.0
     _storage_message = False
     _camera_message = False
     _about = False
@@ -33,10 +49,12 @@ class Interface(pyglet.event.EventDispatcher):
             self,
             batch: pyglet.graphics.Batch,
             fps: int,
-            target_resolution: Vec2
+            target_resolution: Vec2,
+            assets: Assets
     ):
         self.batch = batch
         self.target_resolution = target_resolution
+        self.assets = assets
 
         self.init_main_ui()
         self.init_about_window()
@@ -46,103 +64,114 @@ class Interface(pyglet.event.EventDispatcher):
 
         self.player = pyglet.media.Player()
 
+    def image(self, name: str) -> pyglet.image.TextureRegion:
+        return self.assets.image(name)
+
     def init_main_ui(self):
         self.main_ui = pyglet.sprite.Sprite(
-            pyglet.resource.image("assets/Main UI.png"),
+            self.image("assets/Main UI.png"),
             0, 0,
             batch=self.batch,
-            group=OrderedGroup(Layers.MAIN_UI)
+            group=GROUPS[Layers.MAIN_UI]
         )
         self.main_ui.scale = 2
 
         self.rec_button = pyglet.sprite.Sprite(
-            pyglet.resource.image("assets/Rec Idle.png"),
+            self.image("assets/Rec Idle.png"),
             6, self.target_resolution.y-24,
             batch=self.batch,
-            group=OrderedGroup(Layers.BUTTONS)
+            group=GROUPS[Layers.BUTTONS]
         )
         self.rec_button.scale = 2
 
         self.timer_text = pyglet.sprite.Sprite(
-            pyglet.resource.image("assets/Countdown 9.png"),
+            self.image("assets/Countdown 9.png"),
             self.target_resolution.x//2-13, self.target_resolution.y//2+10,
             batch=self.batch,
-            group=OrderedGroup(Layers.MAIN_UI)
+            group=GROUPS[Layers.MAIN_UI]
         )
         self.timer_text.scale = 2
         self.timer_text.visible = False
 
         self.grid_sprite = pyglet.sprite.Sprite(
-            pyglet.resource.image("assets/Grid.png"),
+            self.image("assets/Grid.png"),
             0, 0,
             batch=self.batch,
-            group=OrderedGroup(Layers.MAIN_UI)
+            group=GROUPS[Layers.MAIN_UI]
         )
         self.grid_sprite.scale = 2
         self.grid_sprite.visible = self.grid
 
         self.crosshair_sprite = pyglet.sprite.Sprite(
-            pyglet.resource.image("assets/Crosshair.png"),
+            self.image("assets/Crosshair.png"),
             0, 0,
             batch=self.batch,
-            group=OrderedGroup(Layers.MAIN_UI)
+            group=GROUPS[Layers.MAIN_UI]
         )
         self.crosshair_sprite.scale = 2
         self.crosshair_sprite.visible = self.crosshair
 
         self.fps_display = pyglet.sprite.Sprite(
-            pyglet.resource.image(f"assets/{self.fps:02}.png"),
+            self.image(f"assets/{self.fps:02}.png"),
             self.target_resolution.x-32,
             self.target_resolution.y-24,
             batch=self.batch,
-            group=OrderedGroup(Layers.BUTTONS)
+            group=GROUPS[Layers.BUTTONS]
         )
         self.fps_display.scale = 2
 
         self.saving_text = pyglet.sprite.Sprite(
-            pyglet.resource.image("assets/Saving.png"),
+            self.image("assets/Saving.png"),
             self.target_resolution.x//2 - 43,
             self.target_resolution.y-24,
             batch=self.batch,
-            group=OrderedGroup(Layers.BUTTONS)
+            group=GROUPS[Layers.BUTTONS]
         )
         self.saving_text.scale = 2
         self.saving_text.visible = self.saving
 
+        self.save_progress_bar = pyglet.shapes.Rectangle(
+            self.saving_text.x, self.saving_text.y - 4,
+            0, 2,
+            batch=self.batch,
+            group=GROUPS[Layers.BUTTONS]
+        )
+        self.save_progress_bar.visible = self.saving
+
         self.settings_button = pyglet.sprite.Sprite(
-            pyglet.resource.image("assets/SettingsIcon.png"),
+            self.image("assets/SettingsIcon.png"),
             self.target_resolution.x-124,
             self.target_resolution.y-26,
             batch=self.batch,
-            group=OrderedGroup(Layers.BUTTONS)
+            group=GROUPS[Layers.BUTTONS]
         )
         self.settings_button.scale = 2
 
         self.about_button = pyglet.sprite.Sprite(
-            pyglet.resource.image("assets/AboutIcon.png"),
+            self.image("assets/AboutIcon.png"),
             self.target_resolution.x-100,
             self.target_resolution.y-26,
             batch=self.batch,
-            group=OrderedGroup(Layers.BUTTONS)
+            group=GROUPS[Layers.BUTTONS]
         )
         self.about_button.scale = 2
 
         self.camera_message_text = pyglet.sprite.Sprite(
-            pyglet.resource.image("assets/No Camera Found.png"),
+            self.image("assets/No Camera Found.png"),
             self.target_resolution.x//2 - 128,
             self.target_resolution.y-24,
             batch=self.batch,
-            group=OrderedGroup(Layers.BUTTONS)
+            group=GROUPS[Layers.BUTTONS]
         )
         self.camera_message_text.scale = 2
         self.camera_message_text.visible = self.camera_message
 
         self.storage_message_text = pyglet.sprite.Sprite(
-            pyglet.resource.image("assets/No Storage Found.png"),
+            self.image("assets/No Storage Found.png"),
             self.target_resolution.x//2 - 128,
             self.target_resolution.y-24,
             batch=self.batch,
-            group=OrderedGroup(Layers.BUTTONS)
+            group=GROUPS[Layers.BUTTONS]
         )
         self.storage_message_text.scale = 2
         self.storage_message_text.visible = (
@@ -152,110 +181,110 @@ class Interface(pyglet.event.EventDispatcher):
 
     def init_about_window(self):
         self.about_window = pyglet.sprite.Sprite(
-            pyglet.resource.image("assets/About.png"),
+            self.image("assets/About.png"),
             0, 0,
             batch=self.batch,
-            group=OrderedGroup(Layers.WINDOW)
+            group=GROUPS[Layers.WINDOW]
         )
         self.about_window.scale = 2
         self.about_window.visible = self.about
 
         self.about_quit_sprite = pyglet.sprite.Sprite(
-            pyglet.resource.image("assets/Quit.png"),
+            self.image("assets/Quit.png"),
             20, self.target_resolution.y-58,
             batch=self.batch,
-            group=OrderedGroup(Layers.WINDOW_UI)
+            group=GROUPS[Layers.WINDOW_UI]
         )
         self.about_quit_sprite.scale = 2
         self.about_quit_sprite.visible = self.about
 
     def init_settings_window(self):
         self.settings_window = pyglet.sprite.Sprite(
-            pyglet.resource.image("assets/Settings.png"),
+            self.image("assets/Settings.png"),
             0, 0,
             batch=self.batch,
-            group=OrderedGroup(Layers.WINDOW)
+            group=GROUPS[Layers.WINDOW]
         )
         self.settings_window.scale = 2
         self.settings_window.visible = self.settings
 
         self.settings_quit_sprite = pyglet.sprite.Sprite(
-            pyglet.resource.image("assets/Quit.png"),
+            self.image("assets/Quit.png"),
             20, self.target_resolution.y-58,
             batch=self.batch,
-            group=OrderedGroup(Layers.WINDOW_UI)
+            group=GROUPS[Layers.WINDOW_UI]
         )
         self.settings_quit_sprite.scale = 2
         self.settings_quit_sprite.visible = self.settings
 
         self.settings_grid_toggle = pyglet.sprite.Sprite(
-            pyglet.resource.image("assets/Off.png"),
+            self.image("assets/Off.png"),
             76, self.target_resolution.y-92,
             batch=self.batch,
-            group=OrderedGroup(Layers.WINDOW_UI)
+            group=GROUPS[Layers.WINDOW_UI]
         )
         self.settings_grid_toggle.scale = 2
         self.settings_grid_toggle.visible = self.settings
 
         self.settings_centre_toggle = pyglet.sprite.Sprite(
-            pyglet.resource.image("assets/Off.png"),
+            self.image("assets/Off.png"),
             164, self.target_resolution.y-116,
             batch=self.batch,
-            group=OrderedGroup(Layers.WINDOW_UI)
+            group=GROUPS[Layers.WINDOW_UI]
         )
         self.settings_centre_toggle.scale = 2
         self.settings_centre_toggle.visible = self.settings
 
         self.settings_timer_toggle = pyglet.sprite.Sprite(
-            pyglet.resource.image("assets/Off.png"),
+            self.image("assets/Off.png"),
             148, self.target_resolution.y-140,
             batch=self.batch,
-            group=OrderedGroup(Layers.WINDOW_UI)
+            group=GROUPS[Layers.WINDOW_UI]
         )
         self.settings_timer_toggle.scale = 2
         self.settings_timer_toggle.visible = self.settings
 
         self.settings_monochrome_toggle = pyglet.sprite.Sprite(
-            pyglet.resource.image("assets/Off.png"),
+            self.image("assets/Off.png"),
             148, self.target_resolution.y-164,
             batch=self.batch,
-            group=OrderedGroup(Layers.WINDOW_UI)
+            group=GROUPS[Layers.WINDOW_UI]
         )
         self.settings_monochrome_toggle.scale = 2
         self.settings_monochrome_toggle.visible = self.settings
 
         self.settings_fps_more = pyglet.sprite.Sprite(
-            pyglet.resource.image("assets/More.png"),
+            self.image("assets/More.png"),
             214, self.target_resolution.y-186,
             batch=self.batch,
-            group=OrderedGroup(Layers.WINDOW_UI)
+            group=GROUPS[Layers.WINDOW_UI]
         )
         self.settings_fps_more.scale = 2
         self.settings_fps_more.visible = self.settings
 
         self.settings_fps_less = pyglet.sprite.Sprite(
-            pyglet.resource.image("assets/Less.png"),
+            self.image("assets/Less.png"),
             230, self.target_resolution.y-186,
             batch=self.batch,
-            group=OrderedGroup(Layers.WINDOW_UI)
+            group=GROUPS[Layers.WINDOW_UI]
         )
         self.settings_fps_less.scale = 2
         self.settings_fps_less.visible = self.settings
 
         self.settings_fps_text = pyglet.sprite.Sprite(
-            pyglet.resource.image(f"assets/{self.fps:02}.png"),
+            self.image(f"assets/{self.fps:02}.png"),
             246, self.target_resolution.y-188,
             batch=self.batch,
-            group=OrderedGroup(Layers.WINDOW_UI)
+            group=GROUPS[Layers.WINDOW_UI]
         )
         self.settings_fps_text.scale = 2
         self.settings_fps_text.visible = self.settings
 
         self.settings_mute_toggle = pyglet.sprite.Sprite(
-            pyglet.resource.image("assets/Off.png"),
+            self.image("assets/Off.png"),
             76, self.target_resolution.y-212,
             batch=self.batch,
-            group=OrderedGroup(Layers.WINDOW_UI)
+            group=GROUPS[Layers.WINDOW_UI]
         )
         self.settings_mute_toggle.scale = 2
         self.settings_mute_toggle.visible = self.settings
@@ -269,10 +298,11 @@ class Interface(pyglet.event.EventDispatcher):
         self._grid = value
         self.grid_sprite.visible = value
         if value:
-            image = pyglet.resource.image("assets/On.png")
+            image = self.image("assets/On.png")
         else:
-            image = pyglet.resource.image("assets/Off.png")
+            image = self.image("assets/Off.png")
         self.settings_grid_toggle.image = image
+        self.dispatch_event("on_interface_change")
 
     @property
     def crosshair(self) -> bool:
@@ -283,10 +313,11 @@ class Interface(pyglet.event.EventDispatcher):
         self._crosshair = value
         self.crosshair_sprite.visible = value
         if value:
-            image = pyglet.resource.image("assets/On.png")
+            image = self.image("assets/On.png")
         else:
-            image = pyglet.resource.image("assets/Off.png")
+            image = self.image("assets/Off.png")
         self.settings_centre_toggle.image = image
+        self.dispatch_event("on_interface_change")
 
     @property
     def mute(self) -> bool:
@@ -296,10 +327,11 @@ class Interface(pyglet.event.EventDispatcher):
     def mute(self, value: bool):
         self._mute = value
         if value:
-            image = pyglet.resource.image("assets/On.png")
+            image = self.image("assets/On.png")
         else:
-            image = pyglet.resource.image("assets/Off.png")
+            image = self.image("assets/Off.png")
         self.settings_mute_toggle.image = image
+        self.dispatch_event("on_interface_change")
 
     @property
     def timer(self) -> bool:
@@ -309,10 +341,11 @@ class Interface(pyglet.event.EventDispatcher):
     def timer(self, value: bool):
         self._timer = value
         if value:
-            image = pyglet.resource.image("assets/On.png")
+            image = self.image("assets/On.png")
         else:
-            image = pyglet.resource.image("assets/Off.png")
+            image = self.image("assets/Off.png")
         self.settings_timer_toggle.image = image
+        self.dispatch_event("on_interface_change")
 
     @property
     def monochrome(self) -> bool:
@@ -322,10 +355,11 @@ class Interface(pyglet.event.EventDispatcher):
     def monochrome(self, value: bool):
         self._monochrome = value
         if value:
-            image = pyglet.resource.image("assets/On.png")
+            image = self.image("assets/On.png")
         else:
-            image = pyglet.resource.image("assets/Off.png")
+            image = self.image("assets/Off.png")
         self.settings_monochrome_toggle.image = image
+        self.dispatch_event("on_interface_change")
 
     @property
     def recording(self) -> bool:
@@ -335,10 +369,11 @@ class Interface(pyglet.event.EventDispatcher):
     def recording(self, value: bool):
         self._recording = value
         if value:
-            image = pyglet.resource.image("assets/Rec Recording.png")
+            image = self.image("assets/Rec Recording.png")
         else:
-            image = pyglet.resource.image("assets/Rec Idle.png")
+            image = self.image("assets/Rec Idle.png")
         self.rec_button.image = image
+        self.dispatch_event("on_interface_change")
 
     @property
     def about(self) -> bool:
@@ -351,6 +386,7 @@ class Interface(pyglet.event.EventDispatcher):
         self._about = value
         self.about_window.visible = value
         self.about_quit_sprite.visible = value
+        self.dispatch_event("on_interface_change")
 
     @property
     def settings(self) -> bool:
@@ -371,6 +407,7 @@ class Interface(pyglet.event.EventDispatcher):
         self.settings_fps_less.visible = value
         self.settings_fps_text.visible = value
         self.settings_mute_toggle.visible = value
+        self.dispatch_event("on_interface_change")
 
     @property
     def fps(self) -> int:
@@ -379,9 +416,10 @@ class Interface(pyglet.event.EventDispatcher):
     @fps.setter
     def fps(self, value: int):
         self._fps = value
-        image = pyglet.resource.image(f"assets/{value:02}.png")
+        image = self.image(f"assets/{value:02}.png")
         self.fps_display.image = image
         self.settings_fps_text.image = image
+        self.dispatch_event("on_interface_change")
 
     @property
     def saving(self) -> bool:
@@ -391,6 +429,19 @@ class Interface(pyglet.event.EventDispatcher):
     def saving(self, value: bool):
         self._saving = value
         self.saving_text.visible = value
+        self.save_progress = 0
+        self.dispatch_event("on_interface_change")
+
+    @property
+    def save_progress(self) -> float:
+        return self._save_progress
+
+    @save_progress.setter
+    def save_progress(self, value: float):
+        self._save_progress = value
+        self.save_progress_bar.width = self.saving_text.width * value
+        self.save_progress_bar.visible = self.saving and value > 0
+        self.dispatch_event("on_interface_change")
 
     @property
     def storage_message(self) -> bool:
@@ -400,6 +451,7 @@ class Interface(pyglet.event.EventDispatcher):
     def storage_message(self, value: bool):
         self._storage_message = value
         self.storage_message_text.visible = value and not self.camera_message
+        self.dispatch_event("on_interface_change")
 
     @property
     def camera_message(self) -> bool:
@@ -411,6 +463,7 @@ class Interface(pyglet.event.EventDispatcher):
         self.camera_message_text.visible = value
         if not value and self.storage_message:
             self.storage_message_text.visible = True
+        self.dispatch_event("on_interface_change")
 
     def start_timer(self):
         self.timer_running = True
@@ -419,7 +472,7 @@ class Interface(pyglet.event.EventDispatcher):
     def update_timer(self, dt: float, time_remaining: int):
         if time_remaining > 0:
             image = f"assets/Countdown {time_remaining}.png"
-            self.timer_text.image = pyglet.resource.image(image)
+            self.timer_text.image = self.image(image)
             self.timer_text.visible = True
 
             if time_remaining >= 4:
@@ -432,14 +485,16 @@ class Interface(pyglet.event.EventDispatcher):
             path = "assets/0.ogg"
             self.abort_timer()
             self.dispatch_event("on_timer_complete")
+        self.dispatch_event("on_interface_change")
 
-        self.player.queue(pyglet.resource.media(path))
+        self.player.queue(self.assets.sound(path))
         self.player.play()
 
     def abort_timer(self):
         self.timer_running = False
         self.timer_text.visible = False
         pyglet.clock.unschedule(self.update_timer)
+        self.dispatch_event("on_interface_change")
 
     def check_click(self, x, y, item: pyglet.sprite.Sprite):
         return (
@@ -482,3 +537,5 @@ Interface.register_event_type("on_fps_change")
 Interface.register_event_type("on_rec_pressed")
 Interface.register_event_type("on_timer_complete")
 Interface.register_event_type("on_monochrome_change")
+# Dispatched whenever what the interface shows changes
+Interface.register_event_type("on_interface_change")
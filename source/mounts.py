@@ -0,0 +1,147 @@
+import os
+import re
+import select
+from typing import Dict, List, Optional, Tuple
+
+
+# Device node, mount point (empty if not mounted) and filesystem UUID
+StorageDevice = Tuple[str, str, str]
+
+
+class MountTable:
+    """
+    An in-process cache of where each filesystem UUID is mounted.
+
+    The table is parsed from /proc/self/mountinfo and only parsed again when
+    the kernel reports a change to the mount table, which it signals by
+    making /proc/self/mounts pollable with POLLPRI. Looking up a mount point
+    is otherwise a dictionary lookup.
+
+    Storage devices to choose from are found through the same UUID links and
+    sysfs, without running lsblk or findmnt.
+    """
+
+    MOUNTINFO = "/proc/self/mountinfo"
+    MOUNTS = "/proc/self/mounts"
+    UUID_FOLDER = "/dev/disk/by-uuid"
+    SYS_BLOCK = "/sys/dev/block"
+    ESCAPE = re.compile(r"\\([0-7]{3})")
+
+    def __init__(self):
+        # Mount point of each device, keyed by "major:minor"
+        self.devices: Dict[str, str] = {}
+        self.uuids: Dict[str, str] = {}
+
+        self.mounts_file = open(self.MOUNTS, "r")
+        self.poll = select.poll()
+        self.poll.register(self.mounts_file, select.POLLPRI | select.POLLERR)
+        self.refresh()
+
+    @classmethod
+    def unescape(cls, path: str) -> str:
+        # Spaces, tabs and backslashes in paths are written as octal escapes
+        return cls.ESCAPE.sub(lambda match: chr(int(match[1], 8)), path)
+
+    @property
+    def changed(self) -> bool:
+        return len(self.poll.poll(0)) > 0
+
+    def refresh(self):
+        # The change event stays raised until the mounts file is read again
+        self.mounts_file.seek(0)
+        self.mounts_file.read()
+
+        self.devices = {}
+        with open(self.MOUNTINFO, "r") as f:
+            for line in f:
+                fields = line.split()
+                device, root, mount_point = fields[2:5]
+                # Bind mounts of a subfolder don't expose the whole device
+                if root == "/":
+                    self.devices.setdefault(device, self.unescape(mount_point))
+
+        self.uuids = {}
+        for uuid, device in self.uuid_devices().items():
+            if device in self.devices:
+                self.uuids[uuid] = self.devices[device]
+
+    def uuid_devices(self) -> Dict[str, str]:
+        """
+        Returns the "major:minor" number of the device holding each
+        filesystem UUID.
+        """
+        try:
+            names = os.listdir(self.UUID_FOLDER)
+        except FileNotFoundError:
+            return {}
+
+        devices = {}
+        for uuid in names:
+            try:
+                rdev = os.stat(os.path.join(self.UUID_FOLDER, uuid)).st_rdev
+            except FileNotFoundError:
+                continue
+            devices[uuid] = f"{os.major(rdev)}:{os.minor(rdev)}"
+        return devices
+
+    def disk_path(self, device: str) -> Optional[str]:
+        # The sysfs folder of the whole disk a device belongs to, partitions
+        # are nested inside their disk's folder
+        path = os.path.realpath(os.path.join(self.SYS_BLOCK, device))
+        if not os.path.exists(path):
+            return None
+        if os.path.exists(os.path.join(path, "partition")):
+            path = os.path.dirname(path)
+        return path
+
+    def storage_devices(self) -> List[StorageDevice]:
+        """
+        Lists every filesystem on a physical disk other than the one the
+        system runs from, removable disks first. Only sysfs and device
+        links are read, so this stays fast with many cards attached.
+        """
+        if self.changed:
+            self.refresh()
+
+        system_disks = {
+            self.disk_path(device)
+            for device, mount_point in self.devices.items()
+            if mount_point == "/"
+        }
+
+        devices = []
+        for uuid, device in self.uuid_devices().items():
+            disk = self.disk_path(device)
+            # Loop, RAM and device mapper disks live under /virtual/
+            if (
+                disk is None
+                or disk in system_disks
+                or "/virtual/" in disk
+            ):
+                continue
+
+            try:
+                with open(os.path.join(disk, "removable"), "r") as f:
+                    removable = f.read().strip() == "1"
+            except FileNotFoundError:
+                removable = False
+            # USB card readers and SD slots don't always set the flag
+            removable = removable or "/usb" in disk or "/mmc" in disk
+
+            path = os.path.realpath(os.path.join(self.UUID_FOLDER, uuid))
+            devices.append((
+                not removable,
+                path,
+                (path, self.devices.get(device, ""), uuid)
+            ))
+
+        return [device for *_, device in sorted(devices)]
+
+    def mount_path(self, uuid: str) -> str:
+        if self.changed:
+            self.refresh()
+        return self.uuids.get(uuid, "")
+
+    def close(self):
+        self.poll.unregister(self.mounts_file)
+        self.mounts_file.close()
@@ -0,0 +1,113 @@
+from typing import List, Optional, Tuple
+
+
+class MediaClock:
+    """
+    Maps monotonic capture timestamps onto a recording's timeline, in seconds
+    from the moment recording started.
+
+    While audio is recorded, `sync` is fed the position of each audio chunk
+    in the audio stream and the timeline follows the audio device's sample
+    clock, so video stays locked to the audio even if the two clocks drift
+    apart.
+    """
+
+    # Minimum time between the first and latest audio chunk before the
+    # clock rate is estimated, shorter spans are dominated by callback jitter
+    MIN_SYNC_TIME = 1
+
+    def __init__(self, start: float):
+        self.start = start
+        self.reference: Optional[Tuple[float, float]] = None
+        self.rate = 1.0
+
+    def sync(self, timestamp: float, audio_time: float):
+        if self.reference is None:
+            self.reference = (timestamp, audio_time)
+            return
+
+        elapsed = timestamp - self.reference[0]
+        if elapsed >= self.MIN_SYNC_TIME:
+            self.rate = (audio_time - self.reference[1]) / elapsed
+
+    def __call__(self, timestamp: float) -> float:
+        if self.reference is None:
+            return timestamp - self.start
+
+        reference_timestamp, reference_time = self.reference
+        return reference_time + (timestamp - reference_timestamp) * self.rate
+
+
+class FramePacer:
+    """
+    Places frames onto a constant frame rate grid of slots on a MediaClock
+    timeline.
+
+    Frames arrive with jitter and at an unrelated phase to the grid, so a
+    frame within one slot of the next free slot takes it, even if another
+    slot is nearer. Frames are only dropped when they have fallen a whole
+    slot behind, and slots are only filled by repeating the previous frame
+    when the next frame is a whole slot ahead.
+    """
+
+    def __init__(self, fps: float, clock: MediaClock):
+        self.fps = fps
+        self.clock = clock
+        self.next_slot = 0
+        self.dropped_frames = 0
+        self.duplicated_frames = 0
+
+    def position(self, timestamp: float) -> float:
+        return self.clock(timestamp) * self.fps
+
+    def slot(self, timestamp: float) -> int:
+        return max(round(self.position(timestamp)), 0)
+
+    def place(self, timestamp: float) -> Optional[int]:
+        position = self.position(timestamp)
+        if position <= self.next_slot - 1:
+            self.dropped_frames += 1
+            return None
+
+        slot = self.next_slot
+        if position >= self.next_slot + 1:
+            slot = round(position)
+            self.duplicated_frames += slot - self.next_slot
+        self.next_slot = slot + 1
+        return slot
+
+    def end(self, timestamp: float) -> int:
+        end = max(self.slot(timestamp), self.next_slot)
+        self.duplicated_frames += end - self.next_slot
+        self.next_slot = end
+        return end
+
+
+def pace(
+        timestamps: List[float],
+        fps: float,
+        clock: MediaClock,
+        end: float
+) -> Tuple[List[Tuple[int, int]], FramePacer]:
+    """
+    Paces a whole recording at once, returning the index of each frame that
+    is kept and the number of slots it fills.
+    """
+    pacer = FramePacer(fps, clock)
+    frames: List[Tuple[int, int]] = []
+    start_slot = 0
+
+    for i, timestamp in enumerate(timestamps):
+        slot = pacer.place(timestamp)
+        if slot is None:
+            continue
+        if len(frames) > 0:
+            frames[-1] = (frames[-1][0], slot - start_slot)
+            start_slot = slot
+        frames.append((i, 1))
+
+    if len(frames) > 0:
+        end_slot = pacer.end(end)
+        frames[-1] = (frames[-1][0], max(end_slot - start_slot, 1))
+
+    return frames, pacer
@@ -0,0 +1,102 @@
+from pyglet.gl import *
+import pyglet
+from PIL import Image
+
+from typing import Optional
+
+
+class PreviewTexture:
+    """
+    A persistent texture for the camera preview, updated in place every frame.
+
+    Frames are streamed through a pair of pixel buffer objects used
+    alternately, so writing the next frame never waits on the GPU still
+    reading the previous one. Drivers without pixel buffer objects fall back
+    to uploading straight from client memory.
+    """
+
+    BUFFER_COUNT = 2
+    FORMATS = {
+        "RGB": GL_RGB,
+        "L": GL_LUMINANCE,
+    }
+
+    texture: Optional[pyglet.image.Texture] = None
+    image: Optional[pyglet.image.Texture] = None
+
+    def __init__(self):
+        self.use_buffers = (
+            gl_info.have_version(2, 1)
+            or gl_info.have_extension("GL_ARB_pixel_buffer_object")
+        )
+        self.buffers = (GLuint * self.BUFFER_COUNT)()
+        self.buffer_index = 0
+        self.buffer_size = 0
+
+        if self.use_buffers:
+            glGenBuffers(self.BUFFER_COUNT, self.buffers)
+
+    def allocate(self, width: int, height: int):
+        self.texture = pyglet.image.Texture.create(
+            width, height, rectangle=True
+        )
+        # PIL rows run top to bottom, so flip with texture coordinates
+        # instead of reordering the data
+        self.image = self.texture.get_transform(flip_y=True)
+        self.image.anchor_x = width // 2
+        self.image.anchor_y = height // 2
+
+    def update(self, pil_image: Image.Image) -> bool:
+        """
+        Upload a frame, returning True if the texture had to be reallocated
+        and sprites need to be pointed at the new `image`.
+        """
+        reallocated = (
+            self.texture is None
+            or (self.texture.width, self.texture.height) != pil_image.size
+        )
+        if reallocated:
+            self.allocate(*pil_image.size)
+
+        data = pil_image.tobytes()
+        width, height = pil_image.size
+        fmt = self.FORMATS[pil_image.mode]
+
+        glBindTexture(self.texture.target, self.texture.id)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+
+        if self.use_buffers:
+            buffer = self.buffers[self.buffer_index]
+            glBindBuffer(GL_PIXEL_UNPACK_BUFFER, buffer)
+            if reallocated or len(data) > self.buffer_size:
+                for i in range(self.BUFFER_COUNT):
+                    glBindBuffer(GL_PIXEL_UNPACK_BUFFER, self.buffers[i])
+                    glBufferData(
+                        GL_PIXEL_UNPACK_BUFFER, len(data), None,
+                        GL_STREAM_DRAW
+                    )
+                self.buffer_size = len(data)
+                glBindBuffer(GL_PIXEL_UNPACK_BUFFER, buffer)
+
+            glBufferSubData(GL_PIXEL_UNPACK_BUFFER, 0, len(data), data)
+            glTexSubImage2D(
+                self.texture.target, 0, 0, 0, width, height,
+                fmt, GL_UNSIGNED_BYTE, None
+            )
+            glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+            self.buffer_index = (self.buffer_index + 1) % self.BUFFER_COUNT
+        else:
+            glTexSubImage2D(
+                self.texture.target, 0, 0, 0, width, height,
+                fmt, GL_UNSIGNED_BYTE, data
+            )
+
+        glBindTexture(self.texture.target, 0)
+        return reallocated
+
+    def __del__(self):
+        if self.use_buffers:
+            try:
+                glDeleteBuffers(self.BUFFER_COUNT, self.buffers)
+            except Exception:
+                pass
@@ -0,0 +1,123 @@
+from collections import deque
+from contextlib import contextmanager
+import json
+import os
+from threading import Lock, current_thread, get_ident
+import time
+from typing import Deque, Dict, Iterator, List
+
+
+class Profiler:
+    """
+    Rolling timings of each stage of the capture, preview and save
+    pipeline, cheap enough to leave enabled.
+
+    Stages are timed with `with profiler.stage(name):` from any thread. The
+    last `WINDOW` samples of each are kept for the p50/p95/max overlay, and
+    while a trace is running every sample is also written to a Chrome
+    trace-event file that can be opened in chrome://tracing or Perfetto.
+    """
+
+    WINDOW = 240
+    # Trace events are written in batches to keep file I/O off most frames
+    TRACE_BATCH = 256
+
+    def __init__(self):
+        self.samples: Dict[str, Deque[float]] = {}
+        self.lock = Lock()
+        self.trace_file = None
+        self.trace_events: List[dict] = []
+        self.trace_threads = set()
+        self.start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+    def record(self, name: str, start: float, end: float):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples.setdefault(name, deque(maxlen=self.WINDOW))
+        samples.append(end - start)
+
+        if self.trace_file is not None:
+            self.trace(name, start, end)
+
+    def trace(self, name: str, start: float, end: float):
+        pid = os.getpid()
+        tid = get_ident()
+        with self.lock:
+            if self.trace_file is None:
+                return
+
+            if tid not in self.trace_threads:
+                self.trace_threads.add(tid)
+                self.trace_events.append({
+                    "name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                    "args": {"name": current_thread().name},
+                })
+            self.trace_events.append({
+                "name": name, "ph": "X", "pid": pid, "tid": tid,
+                "ts": (start - self.start) * 1e6,
+                "dur": (end - start) * 1e6,
+            })
+            if len(self.trace_events) >= self.TRACE_BATCH:
+                self.flush_trace()
+
+    def flush_trace(self):
+        # The trace format allows the closing bracket to be missing, so a
+        # trace cut short by a crash can still be loaded
+        for event in self.trace_events:
+            self.trace_file.write(json.dumps(event) + ",\n")
+        self.trace_file.flush()
+        self.trace_events = []
+
+    def start_trace(self, path: str):
+        with self.lock:
+            self.trace_file = open(path, "w")
+            self.trace_file.write("[\n")
+            self.trace_threads = set()
+
+    def stop_trace(self):
+        with self.lock:
+            if self.trace_file is None:
+                return
+            self.flush_trace()
+            # Drop the trailing comma of the last event
+            if self.trace_file.tell() > 2:
+                self.trace_file.seek(self.trace_file.tell() - 2)
+            self.trace_file.write("\n]\n")
+            self.trace_file.truncate()
+            self.trace_file.close()
+            self.trace_file = None
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        stats = {}
+        for name, samples in sorted(list(self.samples.items())):
+            ordered = sorted(list(samples))
+            if len(ordered) == 0:
+                continue
+            stats[name] = {
+                "p50": ordered[len(ordered) // 2],
+                "p95": ordered[
+                    min(int(len(ordered) * 0.95), len(ordered) - 1)
+                ],
+                "max": ordered[-1],
+            }
+        return stats
+
+    def report(self) -> str:
+        lines = ["stage  p50 / p95 / max ms"]
+        for name, stats in self.stats().items():
+            lines.append(
+                f"{name}  {stats['p50'] * 1000:.1f} / "
+                f"{stats['p95'] * 1000:.1f} / {stats['max'] * 1000:.1f}"
+            )
+        return "\n".join(lines)
+
+
+profiler = Profiler()
@@ -0,0 +1,22 @@
+import pyglet
+
+
+class RedrawOnChangeLoop(pyglet.app.EventLoop):
+    """
+    An event loop that only redraws windows with `invalid` set, instead of
+    after every scheduled function and input event. Whatever changes what a
+    window shows sets its flag, so an idle window isn't redrawn at all.
+    """
+
+    def idle(self):
+        dt = self.clock.update_time()
+        self.clock.call_scheduled_functions(dt)
+
+        for window in pyglet.app.windows:
+            if window.invalid:
+                window.switch_to()
+                window.dispatch_event("on_draw")
+                window.flip()
+                window.invalid = False
+
+        return self.clock.get_sleep_time(True)
@@ -0,0 +1,50 @@
+class RingBuffer:
+    """
+    A fixed size byte ring buffer for exactly one writer thread and one
+    reader thread.
+
+    Each side only advances its own index, after copying the data, so no lock
+    is needed. Writes that don't fit are dropped and counted in `overflows`.
+    """
+
+    def __init__(self, size: int):
+        self.buffer = bytearray(size)
+        self.size = size
+        # Total bytes ever written and read, positions are taken modulo size
+        self.write_index = 0
+        self.read_index = 0
+        self.overflows = 0
+
+    def __len__(self) -> int:
+        return self.write_index - self.read_index
+
+    def write(self, data: bytes) -> bool:
+        if len(data) > self.size - len(self):
+            self.overflows += 1
+            return False
+
+        start = self.write_index % self.size
+        end = start + len(data)
+        if end <= self.size:
+            self.buffer[start:end] = data
+        else:
+            split = self.size - start
+            self.buffer[start:] = data[:split]
+            self.buffer[:end - self.size] = data[split:]
+
+        self.write_index += len(data)
+        return True
+
+    def read(self) -> bytes:
+        count = len(self)
+        start = self.read_index % self.size
+        end = start + count
+        if end <= self.size:
+            data = bytes(self.buffer[start:end])
+        else:
+            data = bytes(self.buffer[start:]) + bytes(
+                self.buffer[:end - self.size]
+            )
+
+        self.read_index += count
+        return data
@@ -0,0 +1,81 @@
+import pyglet
+
+from .encoder import init_worker, run_job
+from .profiler import profiler
+
+from concurrent.futures import Future, ProcessPoolExecutor
+import multiprocessing
+import queue
+import time
+from typing import Callable, Dict
+
+
+class SaveWorker(pyglet.event.EventDispatcher):
+    """
+    Runs encoding jobs in a pool of worker processes, so saving never blocks
+    the pyglet event loop. Job functions take a progress callback as their
+    first argument and must be importable without pyglet.
+    """
+
+    POLL_INTERVAL = 1/10
+
+    def __init__(self, workers: int = 1):
+        # Workers are spawned rather than forked so they don't inherit the
+        # window, GL context or camera
+        context = multiprocessing.get_context("spawn")
+        self.progress_queue = context.Queue()
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=init_worker,
+            initargs=(self.progress_queue,),
+        )
+
+        self.jobs: Dict[int, Future] = {}
+        self.next_job_id = 0
+
+        pyglet.clock.schedule_interval_soft(self.poll, self.POLL_INTERVAL)
+
+    @property
+    def busy(self) -> bool:
+        return len(self.jobs) > 0
+
+    def submit(self, function: Callable, *args) -> int:
+        job_id = self.next_job_id
+        self.next_job_id += 1
+        future = self.executor.submit(run_job, job_id, function, args)
+        self.jobs[job_id] = future
+
+        # Timed from the executor's thread, so the time isn't rounded up to
+        # the next poll
+        start = time.perf_counter()
+        future.add_done_callback(lambda _: profiler.record(
+            "save." + function.__name__, start, time.perf_counter()
+        ))
+        return job_id
+
+    def poll(self, dt: float = None):
+        while True:
+            try:
+                job_id, value = self.progress_queue.get_nowait()
+            except queue.Empty:
+                break
+            if job_id in self.jobs:
+                self.dispatch_event("on_save_progress", job_id, value)
+
+        for job_id, future in list(self.jobs.items()):
+            if not future.done():
+                continue
+
+            del self.jobs[job_id]
+            error = future.exception()
+            if error is not None:
+                print("Saving failed:", error)
+            self.dispatch_event("on_save_complete", job_id, error is None)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+SaveWorker.register_event_type("on_save_progress")
+SaveWorker.register_event_type("on_save_complete")
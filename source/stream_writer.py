@@ -0,0 +1,123 @@
+from PIL import Image
+
+from .pacing import FramePacer, MediaClock
+
+from queue import Queue
+from threading import Lock, Thread
+import time
+from typing import Optional
+
+
+class StreamWriter:
+    """
+    Base class for writers that encode frames to disk while recording.
+
+    Frames are handed to a writer thread through a queue so encoding never
+    runs on the pyglet event loop. If the encoder falls behind by more than
+    `QUEUE_SIZE` frames, new frames are dropped and counted rather than
+    blocking capture.
+
+    Frames are paced onto the recording's MediaClock, subclasses are given
+    each kept frame together with the number of frame slots it fills.
+
+    If writing fails, for example because the card is full or was removed,
+    the error is kept in `error`, `abort` releases the file and anything
+    written afterwards is discarded.
+    """
+
+    QUEUE_SIZE = 48
+
+    def __init__(self, path: str, fps: float, clock: MediaClock):
+        self.path = path
+        self.fps = fps
+        self.pacer = FramePacer(fps, clock)
+        self.dropped_frames = 0
+        self.frame_count = 0
+        self.pending_frames = 0
+        self.pending_lock = Lock()
+        self.error: Optional[Exception] = None
+
+        self.last_image: Optional[Image.Image] = None
+        self.last_slot = 0
+        self.end_time: Optional[float] = None
+
+        self.queue = Queue()
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+    def write(self, image: Image.Image, timestamp: float):
+        with self.pending_lock:
+            if self.failed or self.pending_frames >= self.QUEUE_SIZE:
+                self.dropped_frames += 1
+                return
+            self.pending_frames += 1
+        self.queue.put((self.write_frame, (image, timestamp)))
+
+    def write_frame(self, image: Image.Image, timestamp: float):
+        slot = self.pacer.place(timestamp)
+        if slot is None:
+            return
+
+        if self.last_image is not None:
+            self.write_image(self.last_image, slot - self.last_slot)
+            self.last_slot = slot
+        self.last_image = image
+
+    def run(self):
+        try:
+            self.write_queued()
+            if self.last_image is not None:
+                end = self.pacer.end(self.end_time)
+                self.write_image(
+                    self.last_image, max(end - self.last_slot, 1)
+                )
+            self.finish()
+        except Exception as e:
+            print("Recording could not be written:", e)
+            self.error = e
+            self.abort()
+
+    def write_queued(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+
+            function, args = item
+            try:
+                function(*args)
+            finally:
+                if function == self.write_frame:
+                    with self.pending_lock:
+                        self.pending_frames -= 1
+            if function == self.write_frame:
+                self.frame_count += 1
+
+    def close(self, end_time: Optional[float] = None):
+        if self.thread.is_alive():
+            self.end_time = time.monotonic() if end_time is None else end_time
+            self.queue.put(None)
+            self.thread.join()
+
+    def __len__(self) -> int:
+        return self.frame_count + self.pending_frames
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "dropped_frames": self.dropped_frames + self.pacer.dropped_frames,
+            "duplicated_frames": self.pacer.duplicated_frames,
+        }
+
+    def write_image(self, image: Image.Image, slots: int):
+        raise NotImplementedError
+
+    def finish(self):
+        raise NotImplementedError
+
+    def abort(self):
+        raise NotImplementedError
@@ -0,0 +1,454 @@
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+from PIL import Image
+
+from .camera_sources import CameraSource, PygameCamera
+from .profiler import profiler
+
+import ctypes
+import io
+import mmap
+import os
+import select
+from typing import Callable, List, Optional, Tuple
+
+
+# The parts of linux/videodev2.h needed for streaming capture into mmap
+# buffers. ctypes lays the structures out like the compiler would, so the
+# ioctl numbers are right on both 32 and 64-bit systems.
+
+CAP_VIDEO_CAPTURE = 0x00000001
+CAP_STREAMING = 0x04000000
+CAP_DEVICE_CAPS = 0x80000000
+BUF_TYPE_VIDEO_CAPTURE = 1
+MEMORY_MMAP = 1
+FIELD_ANY = 0
+
+
+def fourcc(code: str) -> int:
+    return int.from_bytes(code.encode("ascii"), "little")
+
+
+PIX_FMT_YUYV = fourcc("YUYV")
+PIX_FMT_MJPEG = fourcc("MJPG")
+
+
+class Capability(ctypes.Structure):
+    _fields_ = [
+        ("driver", ctypes.c_char * 16),
+        ("card", ctypes.c_char * 32),
+        ("bus_info", ctypes.c_char * 32),
+        ("version", ctypes.c_uint32),
+        ("capabilities", ctypes.c_uint32),
+        ("device_caps", ctypes.c_uint32),
+        ("reserved", ctypes.c_uint32 * 3),
+    ]
+
+
+class FormatDescription(ctypes.Structure):
+    _fields_ = [
+        ("index", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("description", ctypes.c_char * 32),
+        ("pixelformat", ctypes.c_uint32),
+        ("mbus_code", ctypes.c_uint32),
+        ("reserved", ctypes.c_uint32 * 3),
+    ]
+
+
+class PixFormat(ctypes.Structure):
+    _fields_ = [
+        ("width", ctypes.c_uint32),
+        ("height", ctypes.c_uint32),
+        ("pixelformat", ctypes.c_uint32),
+        ("field", ctypes.c_uint32),
+        ("bytesperline", ctypes.c_uint32),
+        ("sizeimage", ctypes.c_uint32),
+        ("colorspace", ctypes.c_uint32),
+        ("priv", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("ycbcr_enc", ctypes.c_uint32),
+        ("quantization", ctypes.c_uint32),
+        ("xfer_func", ctypes.c_uint32),
+    ]
+
+
+class FormatUnion(ctypes.Union):
+    _fields_ = [
+        ("pix", PixFormat),
+        ("raw_data", ctypes.c_uint8 * 200),
+        # Other members hold pointers, which sets the union's alignment
+        ("align", ctypes.c_void_p),
+    ]
+
+
+class Format(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("fmt", FormatUnion),
+    ]
+
+
+class RequestBuffers(ctypes.Structure):
+    _fields_ = [
+        ("count", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("memory", ctypes.c_uint32),
+        ("capabilities", ctypes.c_uint32),
+        ("reserved", ctypes.c_uint32),
+    ]
+
+
+class TimeVal(ctypes.Structure):
+    _fields_ = [
+        ("tv_sec", ctypes.c_long),
+        ("tv_usec", ctypes.c_long),
+    ]
+
+
+class TimeCode(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("frames", ctypes.c_uint8),
+        ("seconds", ctypes.c_uint8),
+        ("minutes", ctypes.c_uint8),
+        ("hours", ctypes.c_uint8),
+        ("userbits", ctypes.c_uint8 * 4),
+    ]
+
+
+class BufferMemory(ctypes.Union):
+    _fields_ = [
+        ("offset", ctypes.c_uint32),
+        ("userptr", ctypes.c_ulong),
+        ("planes", ctypes.c_void_p),
+        ("fd", ctypes.c_int32),
+    ]
+
+
+class Buffer(ctypes.Structure):
+    _fields_ = [
+        ("index", ctypes.c_uint32),
+        ("type", ctypes.c_uint32),
+        ("bytesused", ctypes.c_uint32),
+        ("flags", ctypes.c_uint32),
+        ("field", ctypes.c_uint32),
+        ("timestamp", TimeVal),
+        ("timecode", TimeCode),
+        ("sequence", ctypes.c_uint32),
+        ("memory", ctypes.c_uint32),
+        ("m", BufferMemory),
+        ("length", ctypes.c_uint32),
+        ("reserved2", ctypes.c_uint32),
+        ("request_fd", ctypes.c_int32),
+    ]
+
+
+def ioc(direction: int, number: int, size: int) -> int:
+    return direction << 30 | size << 16 | ord("V") << 8 | number
+
+
+IOC_WRITE = 1
+IOC_READ = 2
+VIDIOC_QUERYCAP = ioc(IOC_READ, 0, ctypes.sizeof(Capability))
+VIDIOC_ENUM_FMT = ioc(
+    IOC_READ | IOC_WRITE, 2, ctypes.sizeof(FormatDescription)
+)
+VIDIOC_S_FMT = ioc(IOC_READ | IOC_WRITE, 5, ctypes.sizeof(Format))
+VIDIOC_REQBUFS = ioc(IOC_READ | IOC_WRITE, 8, ctypes.sizeof(RequestBuffers))
+VIDIOC_QUERYBUF = ioc(IOC_READ | IOC_WRITE, 9, ctypes.sizeof(Buffer))
+VIDIOC_QBUF = ioc(IOC_READ | IOC_WRITE, 15, ctypes.sizeof(Buffer))
+VIDIOC_DQBUF = ioc(IOC_READ | IOC_WRITE, 17, ctypes.sizeof(Buffer))
+VIDIOC_STREAMON = ioc(IOC_WRITE, 18, ctypes.sizeof(ctypes.c_int))
+VIDIOC_STREAMOFF = ioc(IOC_WRITE, 19, ctypes.sizeof(ctypes.c_int))
+
+
+def yuyv_to_image(
+        data: bytes,
+        size: Tuple[int, int],
+        bytes_per_line: int,
+        monochrome: bool
+) -> Image.Image:
+    """
+    Convert a packed YUYV 4:2:2 frame, deinterleaving it with strided
+    slices. Monochrome frames are the Y samples as they are, with no colour
+    conversion at all.
+    """
+    width, height = size
+    stride = bytes_per_line // 2
+    end = bytes_per_line * height
+    luma = Image.frombytes("L", (stride, height), data[0:end:2])
+    if monochrome:
+        image = luma
+    else:
+        # Each chroma sample covers two pixels
+        half = (stride // 2, height)
+        cb = Image.frombytes("L", half, data[1:end:4])
+        cr = Image.frombytes("L", half, data[3:end:4])
+        image = Image.merge("YCbCr", (
+            luma,
+            cb.resize((stride, height), Image.NEAREST),
+            cr.resize((stride, height), Image.NEAREST),
+        )).convert("RGB")
+
+    if stride != width:
+        image = image.crop((0, 0, width, height))
+    return image
+
+
+def mjpeg_to_image(data: bytes, monochrome: bool) -> Image.Image:
+    image = Image.open(io.BytesIO(data))
+    # In draft mode the decoder only produces the luma channel for "L"
+    image.draft("L" if monochrome else "RGB", image.size)
+    return image.convert("L" if monochrome else "RGB")
+
+
+class V4L2Camera(CameraSource):
+    """
+    Captures straight from a Video4Linux2 device, streaming into buffers
+    mmapped from the driver, without pygame's RGB conversion.
+
+    YUYV is preferred, as converting it is cheaper than decoding JPEG.
+    MJPEG is used when the camera doesn't offer YUYV, or only offers it at
+    a smaller size than requested, which USB cameras often do to save
+    bandwidth. In monochrome mode only the luma is used, taken straight
+    from the Y samples or decoded alone from the JPEG.
+    """
+
+    BUFFER_COUNT = 4
+    DEFAULT_DEVICE = "/dev/video0"
+    # Longest wait for a frame before the device is treated as failed
+    TIMEOUT = 2
+
+    def __init__(self, device: Optional[str], resolution: Tuple[int, int]):
+        if fcntl is None:
+            raise SystemError("V4L2 is only available on Linux.")
+
+        self.path = device or self.DEFAULT_DEVICE
+        self.resolution = tuple(resolution)
+        self.buffers: List[mmap.mmap] = []
+        self.streaming = False
+
+        self.fd = None
+        try:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_NONBLOCK)
+        except OSError as e:
+            raise SystemError(f"Cannot open '{self.path}': {e}")
+
+        try:
+            capability = Capability()
+            self.ioctl(VIDIOC_QUERYCAP, capability)
+            caps = capability.capabilities
+            if caps & CAP_DEVICE_CAPS:
+                caps = capability.device_caps
+            if not caps & CAP_VIDEO_CAPTURE or not caps & CAP_STREAMING:
+                raise SystemError(
+                    f"'{self.path}' does not support streaming capture."
+                )
+            self.formats = self.pixel_formats()
+            if (
+                PIX_FMT_YUYV not in self.formats
+                and PIX_FMT_MJPEG not in self.formats
+            ):
+                raise SystemError(
+                    f"'{self.path}' offers neither YUYV nor MJPEG."
+                )
+        except SystemError:
+            os.close(self.fd)
+            self.fd = None
+            raise
+
+    def ioctl(self, request: int, arg):
+        try:
+            fcntl.ioctl(self.fd, request, arg)
+        except OSError as e:
+            raise SystemError(f"V4L2 request failed on '{self.path}': {e}")
+
+    def pixel_formats(self) -> List[int]:
+        formats = []
+        description = FormatDescription()
+        description.type = BUF_TYPE_VIDEO_CAPTURE
+        while True:
+            description.index = len(formats)
+            try:
+                fcntl.ioctl(self.fd, VIDIOC_ENUM_FMT, description)
+            except OSError:
+                # EINVAL past the last format
+                return formats
+            formats.append(description.pixelformat)
+
+    def set_format(self, pixel_format: int) -> PixFormat:
+        fmt = Format()
+        fmt.type = BUF_TYPE_VIDEO_CAPTURE
+        fmt.fmt.pix.width, fmt.fmt.pix.height = self.resolution
+        fmt.fmt.pix.pixelformat = pixel_format
+        fmt.fmt.pix.field = FIELD_ANY
+        self.ioctl(VIDIOC_S_FMT, fmt)
+        # The driver replaces the request with the closest it supports
+        return fmt.fmt.pix
+
+    def negotiate(self) -> PixFormat:
+        if PIX_FMT_YUYV in self.formats:
+            pix = self.set_format(PIX_FMT_YUYV)
+            full_size = (
+                pix.width >= self.resolution[0]
+                and pix.height >= self.resolution[1]
+            )
+            if (
+                pix.pixelformat == PIX_FMT_YUYV
+                and (full_size or PIX_FMT_MJPEG not in self.formats)
+            ):
+                return pix
+
+        pix = self.set_format(PIX_FMT_MJPEG)
+        if pix.pixelformat != PIX_FMT_MJPEG:
+            raise SystemError(f"'{self.path}' rejected YUYV and MJPEG.")
+        return pix
+
+    def start(self):
+        if self.streaming:
+            return
+
+        # Anything opened or mapped so far is released if the device can't
+        # stream after all
+        try:
+            self.start_streaming()
+        except SystemError:
+            self.stop()
+            raise
+        except (OSError, ValueError) as e:
+            self.stop()
+            raise SystemError(f"Cannot map buffers on '{self.path}': {e}")
+
+    def start_streaming(self):
+        pix = self.negotiate()
+        self.pixel_format = pix.pixelformat
+        self.size = (pix.width, pix.height)
+        self.bytes_per_line = pix.bytesperline or pix.width * 2
+
+        request = RequestBuffers()
+        request.count = self.BUFFER_COUNT
+        request.type = BUF_TYPE_VIDEO_CAPTURE
+        request.memory = MEMORY_MMAP
+        self.ioctl(VIDIOC_REQBUFS, request)
+        if request.count < 2:
+            raise SystemError(f"Not enough buffers on '{self.path}'.")
+
+        for index in range(request.count):
+            buffer = self.buffer(index)
+            self.ioctl(VIDIOC_QUERYBUF, buffer)
+            self.buffers.append(mmap.mmap(
+                self.fd, buffer.length, mmap.MAP_SHARED,
+                mmap.PROT_READ | mmap.PROT_WRITE, offset=buffer.m.offset
+            ))
+            self.ioctl(VIDIOC_QBUF, buffer)
+
+        self.ioctl(VIDIOC_STREAMON, ctypes.c_int(BUF_TYPE_VIDEO_CAPTURE))
+        self.streaming = True
+
+    def buffer(self, index: int = 0) -> Buffer:
+        buffer = Buffer()
+        buffer.index = index
+        buffer.type = BUF_TYPE_VIDEO_CAPTURE
+        buffer.memory = MEMORY_MMAP
+        return buffer
+
+    def stop(self):
+        if self.fd is None:
+            return
+        if self.streaming:
+            self.streaming = False
+            try:
+                fcntl.ioctl(
+                    self.fd, VIDIOC_STREAMOFF,
+                    ctypes.c_int(BUF_TYPE_VIDEO_CAPTURE)
+                )
+            except OSError:
+                pass
+        for mapping in self.buffers:
+            mapping.close()
+        self.buffers = []
+        os.close(self.fd)
+        self.fd = None
+
+    def get_image(self) -> Image.Image:
+        if not self.streaming:
+            raise SystemError(f"'{self.path}' is not streaming.")
+
+        with profiler.stage("capture"):
+            readable, _, _ = select.select([self.fd], [], [], self.TIMEOUT)
+            if len(readable) == 0:
+                raise SystemError(f"Timed out waiting for '{self.path}'.")
+            buffer = self.buffer()
+            self.ioctl(VIDIOC_DQBUF, buffer)
+
+        # Converted straight from the mapped buffer, which goes back to the
+        # driver afterwards
+        try:
+            with profiler.stage("convert"):
+                data = self.buffers[buffer.index]
+                if self.pixel_format == PIX_FMT_YUYV:
+                    return yuyv_to_image(
+                        data, self.size, self.bytes_per_line, self.monochrome
+                    )
+                return mjpeg_to_image(
+                    data[:buffer.bytesused], self.monochrome
+                )
+        except OSError as e:
+            raise SystemError(f"Corrupt frame from '{self.path}': {e}")
+        finally:
+            self.ioctl(VIDIOC_QBUF, buffer)
+
+
+def is_capture_device(path: str) -> bool:
+    """
+    Whether a device node captures video. UVC cameras also create a
+    metadata node for each camera, which can't be opened as a camera and
+    would otherwise shift the index of every camera after it.
+    """
+    if fcntl is None:
+        return True
+    try:
+        fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+    except OSError:
+        return False
+
+    capability = Capability()
+    try:
+        fcntl.ioctl(fd, VIDIOC_QUERYCAP, capability)
+    except OSError:
+        return False
+    finally:
+        os.close(fd)
+
+    caps = capability.capabilities
+    if caps & CAP_DEVICE_CAPS:
+        caps = capability.device_caps
+    return bool(caps & CAP_VIDEO_CAPTURE)
+
+
+def open_camera(
+        device: Optional[str],
+        resolution: Tuple[int, int]
+) -> CameraSource:
+    # Started here so that devices which open but can't stream fall back
+    # too, starting it again is a no-op
+    try:
+        camera = V4L2Camera(device, resolution)
+        camera.start()
+        return camera
+    except SystemError as e:
+        print(f"{e} Using pygame instead.")
+        return PygameCamera(device, resolution)
+
+
+def camera_backend(
+        name: str
+) -> Callable[[Optional[str], Tuple[int, int]], CameraSource]:
+    if name == "v4l2":
+        return open_camera
+    return PygameCamera
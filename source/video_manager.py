@@ -1,64 +1,181 @@
-import pygame
-from pygame import camera
-from pygame import image
-from PIL import Image, ImageEnhance
+from PIL import Image
 import pyglet
 
-from typing import Tuple, Optional, List
-from threading import Thread
+from .camera_sources import CameraSource, PygameCamera
+from .frame_buffer import FrameBuffer
+from .avi_writer import AviWriter, AudioFormat
+from .frame_spool import FrameSpool
+from .hotplug import HotplugWatcher
+from .gif_writer import GifWriter
+from .pacing import MediaClock
+from .profiler import profiler
+from .stream_writer import StreamWriter
+from .v4l2 import is_capture_device
+from .save_worker import SaveWorker
+from . import encoder
+from . import color
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Tuple, Optional, Union
+from threading import Event, Lock, Thread
 import os
+import time
+
+
+def save_photo(pil_image: Image.Image, path: str) -> str:
+    # PIL releases the GIL while encoding, so photos save in parallel
+    with profiler.stage("save.photo"):
+        pil_image.save(path)
+    return path
 
 
 class VideoManager(pyglet.event.EventDispatcher):
+    """
+    Captures from one camera. Each frame is cut to the recorded aspect
+    ratio and scaled to `resolution` before anything else touches it, so
+    enhancing and recording cost the same whatever size the camera
+    delivers. The preview is scaled down further when `preview_resolution`
+    is smaller.
+    """
+
     MAX_FPS = 24
-    FORMAT = "RGB"
+    SATURATION = 0.8
+    CONTRAST = 0.8
+    # Also the history searched for the frame closest to a shutter press
+    BUFFER_SIZE = 8
+    PHOTO_WORKERS = 4
+    FRAME_TIMEOUT = 1
+    RETRY_INTERVAL = 1
 
     camera_available = False
-    camera = None
-
-    image: pyglet.image.ImageData
-
-    frames: List[Image.Image] = []
-    frame_count = -1
+    camera: Optional[CameraSource] = None
+    device: Optional[str] = None
+    camera_started = 0.0
+    capturing = False
+    # Set by the capture thread, the event loop dispatches
+    # on_camera_unavailable and clears it
+    report_unavailable = False
+    # Bumped whenever a new capture thread replaces the old one
+    generation = 0
+
+    image: Image.Image
+
+    writer: Optional[Union[FrameSpool, StreamWriter]] = None
+    clock: Optional[MediaClock] = None
+    end_time: Optional[float] = None
     recording = False
 
+    # Burst photos still to be written, taken from frames captured after
+    # `burst_after`
+    burst_remaining = 0
+    burst_after = 0.0
+    photo_folder = ""
+    photo_name = ""
+    photo_index = 0
+
     monochrome = False
+    video_format = "gif"
+    video_preset = "balanced"
 
     _fps: int
 
-    def __init__(self, fps: int, resolution: Tuple[int, int], capture_id=0):
-        camera.init()
-
-        self.resolution = resolution
+    def __init__(
+            self,
+            fps: int,
+            resolution: Tuple[int, int],
+            capture_id=0,
+            device_folder: Optional[str] = "/dev",
+            camera_source: Callable[
+                [Optional[str], Tuple[int, int]], CameraSource
+            ] = PygameCamera,
+            preview_resolution: Optional[Tuple[int, int]] = None
+    ):
+        self.resolution = tuple(resolution)
+        self.preview_resolution = tuple(preview_resolution or resolution)
         self.fps = fps
 
         self.capture_id = capture_id
-
-        pyglet.clock.schedule_interval_soft(self.check_camera, 1)
-
-    def check_camera(self, dt: float):
-        if self.camera_available:
-            return
-
-        if self.camera is None:
-            cameras = camera.list_cameras()
-            if len(cameras) == 0:
-                print("No cameras found.")
-                self.dispatch_event("on_camera_unavailable")
-                return
-            self.camera = camera.Camera(
-                cameras[self.capture_id],
-                self.resolution
+        self.camera_source = camera_source
+
+        self.buffer = FrameBuffer(self.BUFFER_SIZE)
+        self.photo_pool: Optional[ThreadPoolExecutor] = None
+        # Paths of the photos being written, by job
+        self.photo_jobs: Dict[Future, str] = {}
+        self.devices_changed = Event()
+        # Held while replacing the capture thread and while a capture thread
+        # takes over a newly opened camera, as both the hotplug thread and
+        # the event loop can start a new capture thread
+        self.capture_lock = Lock()
+        # Sources that aren't device nodes, like test patterns, have nothing
+        # to watch
+        self.hotplug = None
+        if device_folder is not None:
+            self.hotplug = HotplugWatcher(
+                self.on_device_change, device_folder,
+                accept=is_capture_device
+            )
+        self.capturing = True
+        self.start_capture()
+
+    def start_capture(self):
+        # A capture thread stuck on a dead device can't be interrupted, so it
+        # is left behind and exits once it sees its generation is outdated
+        with self.capture_lock:
+            self.generation += 1
+            self.camera = None
+            self.camera_available = False
+            self.capture_thread = Thread(
+                target=self.capture,
+                args=(self.generation,),
+                daemon=True
             )
+            self.capture_thread.start()
+
+    def on_device_change(self, path: str, added: bool):
+        # Called from the hotplug thread
+        if not added and path == self.device and self.camera_available:
+            print("Camera disconnected.")
+            self.report_unavailable = True
+            self.start_capture()
+        self.devices_changed.set()
+
+    def open_camera(self, generation: int) -> bool:
+        device = None
+        if self.hotplug is not None:
+            devices = self.hotplug.devices()
+            if len(devices) <= self.capture_id:
+                print("No cameras found.")
+                return False
+            device = devices[self.capture_id]
 
-        self.surface = pygame.Surface(self.camera.get_size())
+        new_camera = None
         try:
-            self.camera.start()
-            self.camera_available = True
+            new_camera = self.camera_source(device, self.resolution)
+            new_camera.start()
         except SystemError as e:
             print("Camera unavailable:", e)
-            self.dispatch_event("on_camera_unavailable")
-            return
+            if new_camera is not None:
+                self.release(new_camera)
+            return False
+
+        with self.capture_lock:
+            if generation == self.generation:
+                self.camera = new_camera
+                self.device = device
+                self.buffer.clear()
+                self.camera_started = time.monotonic()
+                self.camera_available = True
+                return True
+
+        self.release(new_camera)
+        return False
+
+    @staticmethod
+    def release(camera: CameraSource):
+        try:
+            camera.stop()
+        except SystemError:
+            pass
 
     @property
     def fps(self) -> int:
@@ -83,13 +200,40 @@ class VideoManager(pyglet.event.EventDispatcher):
         pyglet.clock.schedule_interval(self.frame, 1/preview_fps)
         self._fps = new_fps
 
-    def start_recording(self):
+    def start_recording(
+            self,
+            output_path: str,
+            clock: MediaClock,
+            spool_path: Optional[str] = None,
+            audio_format: Optional[AudioFormat] = None,
+            camera: Optional[str] = None
+    ):
         if self.recording:
             print("Already recording.")
             return
 
+        mode = "L" if self.monochrome else "RGB"
+        size = tuple(self.resolution)
+        if self.video_format == "avi":
+            path = os.path.join(output_path, "video.avi")
+            self.writer = AviWriter(
+                path, mode, size, self.fps, clock, audio_format,
+                encoder.PRESETS["avi"][self.video_preset]
+            )
+        elif spool_path is not None:
+            self.writer = FrameSpool(
+                spool_path, mode, size, self.fps,
+                self.video_format, self.video_preset, camera
+            )
+        else:
+            path = os.path.join(output_path, "frames.gif")
+            self.writer = GifWriter(
+                path, mode, size, self.fps, clock,
+                encoder.PRESETS["gif"][self.video_preset]
+            )
+        self.clock = clock
         self.recording = True
-        self.frames = []
+        self.buffer.reset_stats()
 
     def stop_recording(self):
         if not self.recording:
@@ -97,91 +241,289 @@ class VideoManager(pyglet.event.EventDispatcher):
             return
 
         self.recording = False
+        self.end_time = time.monotonic()
+        with profiler.stage("save.stop"):
+            if isinstance(self.writer, StreamWriter):
+                self.writer.close(self.end_time)
+            else:
+                self.writer.close()
+        print(
+            f"Captured {len(self.writer)} frames "
+            f"({self.buffer.skipped_frames} skipped, "
+            f"{self.buffer.stale_frames} stale)."
+        )
 
     def crop_frame(self, image: Image.Image) -> Image.Image:
         width, height = image.size
+        if (width, height) == self.resolution:
+            return image
+
+        # The largest centred box with the recorded aspect ratio
+        scale = min(width / self.resolution[0], height / self.resolution[1])
+        crop_width = self.resolution[0] * scale
+        crop_height = self.resolution[1] * scale
+        left = (width - crop_width) / 2
+        top = (height - crop_height) / 2
+        box = (left, top, left + crop_width, top + crop_height)
+
+        if scale == 1:
+            return image.crop(tuple(int(edge) for edge in box))
+        # Cropping and scaling in one pass only reads the pixels in the box
+        return image.resize(
+            self.resolution, Image.BILINEAR, box=box, reducing_gap=2.0
+        )
 
-        left = (width - self.resolution[0])//2
-        top = (height - self.resolution[1])//2
-        right = (width + self.resolution[0])//2
-        bottom = (height + self.resolution[1])//2
-
-        # Crop the center of the image
-        return image.crop((left, top, right, bottom))
+    def preview_frame(self, image: Image.Image) -> Image.Image:
+        # The config keeps the preview no larger than the record resolution,
+        # the GPU scales it to the screen
+        width, height = image.size
+        scale = min(
+            self.preview_resolution[0] / width,
+            self.preview_resolution[1] / height
+        )
+        if scale >= 1:
+            return image
+        size = (max(int(width * scale), 1), max(int(height * scale), 1))
+        return image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+
+    def capture(self, generation: int):
+        while self.capturing and generation == self.generation:
+            if not self.camera_available:
+                self.devices_changed.clear()
+                if not self.open_camera(generation):
+                    self.report_unavailable = True
+                    # Woken early by the hotplug watcher
+                    self.devices_changed.wait(self.RETRY_INTERVAL)
+                continue
+
+            current = self.camera
+            if current is None:
+                # Replaced since the loop condition was checked
+                continue
+            current.monochrome = self.monochrome
+            try:
+                pil_image = current.get_image()
+            except SystemError as e:
+                print("Frame capture failed:", e)
+                if generation == self.generation:
+                    self.camera_available = False
+                self.release(current)
+                continue
+
+            if generation != self.generation:
+                # Replaced while waiting for the frame, release the device so
+                # the new capture thread can open it
+                self.release(current)
+                break
+            with profiler.stage("crop"):
+                pil_image = self.crop_frame(pil_image)
+            with profiler.stage("enhance"):
+                pil_image = self.process(pil_image)
+            self.buffer.push(pil_image, time.monotonic())
+
+    def process(self, pil_image: Image.Image) -> Image.Image:
+        if self.monochrome:
+            return color.enhance_monochrome(pil_image, self.CONTRAST)
+        if pil_image.mode == "L":
+            # Captured just before monochrome was turned off
+            pil_image = pil_image.convert("RGB")
+        return color.enhance(pil_image, self.SATURATION, self.CONTRAST)
 
     def get_image(self) -> Optional[Image.Image]:
-        def get_image():
-            self.camera_available = False
-            self.surface = self.camera.get_image()
-            self.camera_available = True
-
-        thread = Thread(target=get_image, daemon=True)
-        thread.start()
-        thread.join(1)
+        latest = self.buffer.peek()
+        if latest is None:
+            return
+        return latest[1]
 
-        if not self.camera_available:
+    def frame(self, dt: float = None):
+        if self.report_unavailable:
+            self.report_unavailable = False
             self.dispatch_event("on_camera_unavailable")
+        if len(self.photo_jobs) > 0:
+            self.check_photos()
+        if self.burst_remaining > 0:
+            self.continue_burst()
+        if not self.camera_available:
+            return
+
+        fresh = self.buffer.fresh
+        latest = self.buffer.latest()
+        timestamp = self.camera_started if latest is None else latest[0]
+        if time.monotonic() - timestamp > self.FRAME_TIMEOUT:
             print("Frame timed out.")
+            self.report_unavailable = True
+            self.start_capture()
+            return
+        if latest is None:
             return
 
-        data = image.tostring(self.surface, self.FORMAT)
-        pil_image = Image.frombytes("RGB", self.surface.get_size(), data)
-        # Saturation
-        pil_image = ImageEnhance.Color(pil_image)
-        pil_image = pil_image.enhance(0 if self.monochrome else 0.8)
-        # Contrast
-        pil_image = ImageEnhance.Contrast(pil_image).enhance(0.8)
-        return pil_image
+        pil_image = latest[1]
 
-    def frame(self, dt: float = None):
-        if self.camera_available:
-            pil_image = self.get_image()
-            if pil_image is None:
-                return
-
-            data = pil_image.tobytes()
-
-            self.image = pyglet.image.ImageData(
-                *self.camera.get_size(),
-                self.FORMAT,
-                data,
-                pitch=-pil_image.width*len(self.FORMAT)
-            )
-            self.image.anchor_x = self.image.width // 2
-            self.image.anchor_y = self.image.height // 2
+        if fresh:
+            with profiler.stage("preview"):
+                self.image = self.preview_frame(pil_image)
             self.dispatch_event("on_frame_ready")
 
-            if self.recording:
-                self.frames.append(self.crop_frame(pil_image))
-
-    def save(self, output_path: str, datestring: Optional[str] = None):
-        if self.fps == 0:
-            pil_image = self.get_image()
-            if pil_image is None:
-                return
-
-            path = os.path.join(output_path, "frame-" + datestring + ".jpg")
-            self.crop_frame(pil_image).save(path)
+        # Only new frames are recorded, the pacer repeats frames to fill
+        # any gaps
+        if self.recording and fresh:
+            with profiler.stage("write"):
+                self.writer.write(pil_image, latest[0])
+
+    def save(
+            self,
+            worker: SaveWorker,
+            output_path: str,
+            metadata: Optional[Dict] = None
+    ) -> Optional[int]:
+        if self.writer is None:
+            print("No frames to save.")
             return
 
-        if len(self.frames) == 0:
-            print("No frames to save.")
+        metadata = dict(metadata or {})
+        metadata["camera"] = {
+            "skipped_frames": self.buffer.skipped_frames,
+            "stale_frames": self.buffer.stale_frames,
+        }
+
+        job_id = None
+        if isinstance(self.writer, FrameSpool):
+            metadata["dropped_frames"] = self.writer.dropped_frames
+            with profiler.stage("save.submit"):
+                job_id = self.encode(
+                    worker, self.writer, output_path,
+                    self.clock, self.end_time, metadata
+                )
+        elif self.writer.failed:
+            print("Recording was not saved:", self.writer.error)
+        else:
+            # Streamed recordings are already complete once the writer is
+            # closed
+            metadata.update({
+                "fps": self.writer.fps,
+                "captured_frames": self.writer.frame_count,
+                "frames": self.writer.pacer.next_slot,
+                "duration": self.writer.pacer.next_slot / self.writer.fps,
+            })
+            metadata.update(self.writer.stats)
+            with profiler.stage("save.metadata"):
+                encoder.write_metadata(output_path, metadata)
+        self.writer = None
+        return job_id
+
+    def snapshot(self, output_path: str, datestring: str) -> Optional[str]:
+        pil_image = self.get_image()
+        if pil_image is None:
             return
 
-        path = os.path.join(output_path, "frames.gif")
-        self.frames[0].save(
-            path,
-            save_all=True,
-            append_images=self.frames[1:],
-            optimize=True,
-            interlace=False,
-            duration=1000/self.fps,
+        path = os.path.join(output_path, "frame-" + datestring + ".jpg")
+        with profiler.stage("save.photo"):
+            pil_image.save(path)
+        return path
+
+    @property
+    def photos_pending(self) -> bool:
+        return len(self.photo_jobs) > 0 or self.burst_remaining > 0
+
+    def take_photos(
+            self,
+            output_path: str,
+            datestring: str,
+            shutter_time: float,
+            count: int = 1
+    ) -> Optional[float]:
+        """
+        Save the buffered frame closest to `shutter_time`, so there is no
+        wait for a new capture, followed by the next `count - 1` frames as a
+        burst. Photos are written on a thread pool and on_photo_saved is
+        dispatched for each, with whether it could be written. Returns the
+        capture time of the first frame.
+        """
+        closest = self.buffer.closest(shutter_time)
+        if closest is None:
+            return None
+
+        if self.photo_pool is None:
+            self.photo_pool = ThreadPoolExecutor(
+                self.PHOTO_WORKERS, "photo"
+            )
+        self.photo_folder = output_path
+        self.photo_name = datestring
+        self.photo_index = 0
+        self.burst_remaining = count
+        self.write_photo(*closest)
+        return closest[0]
+
+    def write_photo(self, timestamp: float, pil_image: Image.Image):
+        name = "frame-" + self.photo_name
+        if self.burst_remaining > 1 or self.photo_index > 0:
+            name += f"-{self.photo_index + 1:02}"
+        path = os.path.join(self.photo_folder, name + ".jpg")
+
+        job = self.photo_pool.submit(save_photo, pil_image, path)
+        self.photo_jobs[job] = path
+        self.photo_index += 1
+        self.burst_remaining -= 1
+        self.burst_after = timestamp
+
+    def continue_burst(self):
+        for frame in self.buffer.since(self.burst_after):
+            if self.burst_remaining == 0:
+                break
+            self.write_photo(*frame)
+
+    def check_photos(self):
+        for job in [job for job in self.photo_jobs if job.done()]:
+            path = self.photo_jobs.pop(job)
+            # Reported either way, so the interface stops waiting for it
+            saved = True
+            try:
+                job.result()
+            except Exception as e:
+                print(f"Photo '{path}' could not be saved:", e)
+                saved = False
+            self.dispatch_event("on_photo_saved", path, saved)
+
+    def encode(
+            self,
+            worker: SaveWorker,
+            spool: FrameSpool,
+            output_path: str,
+            clock: Optional[MediaClock] = None,
+            end_time: Optional[float] = None,
+            metadata: Optional[Dict] = None
+    ) -> int:
+        spool.close()
+
+        # A recovered spool is encoded with the settings it was recorded
+        # with, not whatever is configured now
+        video_format = spool.video_format or self.video_format
+        if video_format not in encoder.FILE_NAMES:
+            video_format = "gif"
+        preset = spool.preset or self.video_preset
+        if preset not in encoder.PRESETS[video_format]:
+            preset = "balanced"
+        return worker.submit(
+            encoder.encode_animation,
+            spool.path,
+            output_path,
+            video_format,
+            preset,
+            clock,
+            end_time,
+            metadata
         )
-        self.frames = []
 
     def __del__(self):
-        self.camera.stop()
+        self.capturing = False
+        if self.hotplug is not None:
+            self.hotplug.close()
+        if self.camera is not None:
+            self.camera.stop()
+        if self.photo_pool is not None:
+            self.photo_pool.shutdown(wait=False)
 
 
 VideoManager.register_event_type("on_frame_ready")
 VideoManager.register_event_type("on_camera_unavailable")
+VideoManager.register_event_type("on_photo_saved")
@@ -0,0 +1,109 @@
+from source.avi_writer import AviWriter
+from source.pacing import MediaClock
+
+from PIL import Image
+import io
+import os
+import struct
+
+
+def read_chunks(data, start, end):
+    """
+    Yields the fourcc, data offset and size of each chunk between `start`
+    and `end`, checking that chunks are contiguous and padded to even sizes.
+    """
+    offset = start
+    while offset < end:
+        fourcc, size = struct.unpack_from("<4sI", data, offset)
+        yield fourcc, offset + 8, size
+        offset += 8 + size + size % 2
+    assert offset == end
+
+
+def parse_avi(path):
+    with open(path, "rb") as f:
+        data = f.read()
+
+    riff, riff_size, form = struct.unpack_from("<4sI4s", data, 0)
+    assert (riff, form) == (b"RIFF", b"AVI ")
+    assert riff_size == len(data) - 8
+
+    chunks = {}
+    for fourcc, offset, size in read_chunks(data, 12, len(data)):
+        if fourcc == b"LIST":
+            fourcc = data[offset:offset + 4]
+        chunks[fourcc] = (offset, size)
+    assert list(chunks) == [b"hdrl", b"movi", b"idx1"]
+
+    avih_offset = chunks[b"hdrl"][0] + 4 + 8
+    total_frames = struct.unpack_from("<I", data, avih_offset + 16)[0]
+
+    movi_offset, movi_size = chunks[b"movi"]
+    movi = list(read_chunks(data, movi_offset + 4, movi_offset + movi_size))
+
+    index_offset, index_size = chunks[b"idx1"]
+    index = [
+        struct.unpack_from("<4sIII", data, index_offset + i)
+        for i in range(0, index_size, 16)
+    ]
+    # Index offsets are relative to the "movi" fourcc and point at each
+    # chunk's header
+    assert len(index) == len(movi)
+    for (fourcc, _, offset, size), (chunk, data_offset, chunk_size) in zip(
+            index, movi
+    ):
+        assert (fourcc, size) == (chunk, chunk_size)
+        assert movi_offset + offset + 8 == data_offset
+
+    return data, total_frames, movi
+
+
+def frame(i):
+    return Image.new("RGB", (32, 16), (i * 30 % 256, 80, 160))
+
+
+def test_avi_structure(tmp_path):
+    path = str(tmp_path / "video.avi")
+    writer = AviWriter(
+        path, "RGB", (32, 16), 10, MediaClock(0), (1, 2, 8000)
+    )
+    for i in range(5):
+        writer.write(frame(i), i / 10)
+        # Odd sized chunks need padding
+        writer.write_audio(bytes(161))
+    writer.close(0.5)
+    assert not writer.failed
+
+    data, total_frames, movi = parse_avi(path)
+    video = [chunk for chunk in movi if chunk[0] == b"00dc"]
+    audio = [chunk for chunk in movi if chunk[0] == b"01wb"]
+    assert total_frames == len(video) == 5
+    assert len(audio) == 5
+
+    _, offset, size = video[2]
+    image = Image.open(io.BytesIO(data[offset:offset + size]))
+    assert image.format == "JPEG"
+    assert image.size == (32, 16)
+
+
+def test_large_recordings_are_split(tmp_path):
+    path = str(tmp_path / "video.avi")
+    writer = AviWriter(path, "RGB", (32, 16), 10, MediaClock(0))
+    writer.MAX_FILE_SIZE = 4096
+    for i in range(40):
+        writer.write(frame(i), i / 10)
+    writer.close(4)
+    assert not writer.failed
+
+    names = writer.stats["files"]
+    assert len(names) > 1
+    assert names[:2] == ["video.avi", "video-2.avi"]
+
+    frames = 0
+    for name in names:
+        file_path = str(tmp_path / name)
+        assert os.path.getsize(file_path) <= writer.MAX_FILE_SIZE
+        _, total_frames, movi = parse_avi(file_path)
+        assert total_frames == len(movi)
+        frames += total_frames
+    assert frames == 40
@@ -0,0 +1,228 @@
+from source import camera_sources, hotplug, v4l2
+from source.video_manager import VideoManager
+
+from queue import Queue, Empty
+import os
+import tempfile
+import threading
+import time
+import types
+
+
+class StallingCamera(camera_sources.TestPattern):
+    """
+    A test pattern whose first camera stalls once, like a device that stops
+    responding, and which counts how often cameras are opened and stopped.
+    """
+
+    STALL = 0.5
+
+    opened = 0
+    stopped = 0
+    lock = threading.Lock()
+
+    def __init__(self, device, resolution):
+        super().__init__(device, resolution, fps=30)
+        with self.lock:
+            StallingCamera.opened += 1
+            self.stalls = StallingCamera.opened == 1
+
+    def stop(self):
+        with self.lock:
+            StallingCamera.stopped += 1
+
+    def get_image(self):
+        if self.stalls and self.frame_count == 5:
+            time.sleep(self.STALL)
+        return super().get_image()
+
+
+def wait_for(condition, timeout=3):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_stalled_camera_is_released():
+    manager = VideoManager(
+        12, (64, 36), device_folder=None, camera_source=StallingCamera
+    )
+    manager.FRAME_TIMEOUT = 0.2
+    try:
+        # Tick until the stall is noticed and a second camera is opened
+        assert wait_for(lambda: (
+            manager.frame() or StallingCamera.opened == 2
+        ))
+        # The stalled thread stops its camera once get_image returns
+        assert wait_for(lambda: StallingCamera.stopped == 1)
+        assert wait_for(lambda: manager.camera_available)
+        assert manager.buffer.pushed_frames > 0
+    finally:
+        manager.capturing = False
+
+
+def test_capture_threads_get_distinct_generations():
+    manager = VideoManager(
+        12, (64, 36),
+        device_folder=None,
+        camera_source=camera_sources.TestPattern
+    )
+    try:
+        start = manager.generation
+        threads = [
+            threading.Thread(target=manager.start_capture) for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert manager.generation == start + 8
+        assert wait_for(lambda: manager.camera_available)
+    finally:
+        manager.capturing = False
+
+
+def watch(folder):
+    events = Queue()
+    watcher = hotplug.HotplugWatcher(
+        lambda path, added: events.put((path, added)), folder
+    )
+    return watcher, events
+
+
+def next_event(events, timeout=2):
+    try:
+        return events.get(timeout=timeout)
+    except Empty:
+        return None
+
+
+def check_hotplug():
+    with tempfile.TemporaryDirectory() as folder:
+        open(os.path.join(folder, "video2"), "w").close()
+        watcher, events = watch(folder)
+        try:
+            assert watcher.devices() == [os.path.join(folder, "video2")]
+
+            path = os.path.join(folder, "video10")
+            open(path, "w").close()
+            assert next_event(events) == (path, True)
+            # Drain attribute events from creating the file
+            while next_event(events, 0.2) is not None:
+                pass
+            assert watcher.devices()[-1] == path
+
+            os.remove(path)
+            assert next_event(events) == (path, False)
+
+            # Other nodes are ignored
+            open(os.path.join(folder, "audio0"), "w").close()
+            assert next_event(events, 0.3) is None
+        finally:
+            watcher.close()
+
+
+def test_hotplug_inotify():
+    check_hotplug()
+
+
+def test_hotplug_polling(monkeypatch):
+    monkeypatch.setattr(hotplug, "_load_inotify", lambda: None)
+    monkeypatch.setattr(hotplug.HotplugWatcher, "POLL_INTERVAL", 0.05)
+    check_hotplug()
+
+
+CAP_META_CAPTURE = 0x00800000
+
+
+def fake_querycap(fd, request, arg):
+    # Like a UVC driver, every camera node is followed by a metadata node
+    assert request == v4l2.VIDIOC_QUERYCAP
+    number = int(os.readlink(f"/proc/self/fd/{fd}").rsplit("video", 1)[1])
+    arg.capabilities = (
+        v4l2.CAP_VIDEO_CAPTURE | CAP_META_CAPTURE | v4l2.CAP_DEVICE_CAPS
+    )
+    if number % 2 == 0:
+        arg.device_caps = v4l2.CAP_VIDEO_CAPTURE | v4l2.CAP_STREAMING
+    else:
+        arg.device_caps = CAP_META_CAPTURE | v4l2.CAP_STREAMING
+
+
+def test_metadata_nodes_are_not_cameras(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        v4l2, "fcntl", types.SimpleNamespace(ioctl=fake_querycap)
+    )
+    for number in range(4):
+        open(tmp_path / f"video{number}", "w").close()
+    opened = []
+
+    class RecordingCamera(camera_sources.TestPattern):
+        def __init__(self, device, resolution):
+            super().__init__(device, resolution)
+            opened.append(device)
+
+    manager = VideoManager(
+        12, (64, 36),
+        capture_id=1,
+        device_folder=str(tmp_path),
+        camera_source=RecordingCamera
+    )
+    try:
+        assert manager.hotplug.devices() == [
+            str(tmp_path / "video0"), str(tmp_path / "video2")
+        ]
+        assert wait_for(lambda: manager.camera_available)
+        assert opened == [str(tmp_path / "video2")]
+    finally:
+        manager.capturing = False
+        manager.hotplug.close()
+
+
+def test_camera_that_fails_to_start_is_released():
+    stopped = []
+
+    class FailingCamera(camera_sources.CameraSource):
+        def __init__(self, device, resolution):
+            pass
+
+        def start(self):
+            raise SystemError("Cannot stream.")
+
+        def stop(self):
+            stopped.append(self)
+
+    manager = VideoManager(
+        12, (64, 36), device_folder=None, camera_source=FailingCamera
+    )
+    try:
+        assert wait_for(lambda: len(stopped) > 0)
+        assert not manager.camera_available
+    finally:
+        manager.capturing = False
+        manager.devices_changed.set()
+
+
+def test_failed_photo_is_reported(tmp_path):
+    manager = VideoManager(
+        12, (64, 36),
+        device_folder=None,
+        camera_source=camera_sources.TestPattern
+    )
+    results = []
+    manager.push_handlers(
+        on_photo_saved=lambda path, saved: results.append(saved)
+    )
+    try:
+        assert wait_for(lambda: len(manager.buffer) > 0)
+        for folder in (str(tmp_path), str(tmp_path / "missing")):
+            assert manager.take_photos(folder, "photo", time.monotonic())
+            assert wait_for(lambda: (
+                manager.frame() or not manager.photos_pending
+            ))
+        assert results == [True, False]
+        assert os.path.exists(tmp_path / "frame-photo.jpg")
+    finally:
+        manager.capturing = False
@@ -0,0 +1,61 @@
+from source import color
+
+from PIL import Image, ImageChops, ImageDraw, ImageEnhance
+import pytest
+
+
+# Largest difference from the ImageEnhance chain in any channel
+TOLERANCE = 2
+
+
+def frame(mode="RGB"):
+    """
+    A frame with gradients, saturated colours and hard edges, so every part
+    of the colour matrix is exercised.
+    """
+    image = Image.linear_gradient("L").resize((160, 90))
+    image = Image.merge("RGB", (
+        image,
+        image.transpose(Image.ROTATE_90).resize((160, 90)),
+        image.transpose(Image.FLIP_LEFT_RIGHT),
+    ))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((10, 10, 50, 40), fill=(255, 20, 20))
+    draw.rectangle((60, 50, 120, 80), fill=(10, 240, 60))
+    draw.ellipse((100, 5, 150, 45), fill=(250, 250, 250))
+    return image.convert(mode)
+
+
+def max_difference(a: Image.Image, b: Image.Image) -> int:
+    assert a.mode == b.mode and a.size == b.size
+    extrema = ImageChops.difference(a, b).getextrema()
+    if a.mode == "L":
+        extrema = (extrema,)
+    return max(high for _, high in extrema)
+
+
+@pytest.mark.parametrize("saturation, contrast", [
+    (0.8, 0.8),
+    (1.0, 1.0),
+    (0.5, 1.2),
+    (0.0, 0.6),
+])
+def test_enhance_matches_image_enhance(saturation, contrast):
+    image = frame()
+    expected = ImageEnhance.Color(image).enhance(saturation)
+    expected = ImageEnhance.Contrast(expected).enhance(contrast)
+
+    assert max_difference(
+        color.enhance(image, saturation, contrast), expected
+    ) <= TOLERANCE
+
+
+@pytest.mark.parametrize("mode", ["RGB", "L"])
+def test_enhance_monochrome_matches_image_enhance(mode):
+    image = frame(mode)
+    expected = ImageEnhance.Color(image.convert("RGB")).enhance(0)
+    expected = ImageEnhance.Contrast(expected).enhance(0.8).convert("L")
+
+    result = color.enhance_monochrome(image, 0.8)
+    assert result.mode == "L"
+    assert max_difference(result, expected) <= TOLERANCE
@@ -0,0 +1,90 @@
+from source import config
+
+import json
+
+import pytest
+
+
+def camera_config(**settings):
+    settings = dict(config.DEFAULT_CONFIG, **settings)
+    config.check_camera_config(settings)
+    return settings
+
+
+def test_defaults_are_valid():
+    settings = dict(config.DEFAULT_CONFIG)
+    config.check_video_config(settings)
+    config.check_camera_config(settings)
+    assert settings == config.DEFAULT_CONFIG
+
+
+@pytest.mark.parametrize("key, value, fallback", [
+    ("cameras", 0, 1),
+    ("cameras", "2", 1),
+    ("camera-layout", "grid", "side-by-side"),
+    ("camera-backend", "gstreamer", "v4l2"),
+    ("photo-burst", 0, 1),
+    ("photo-burst", 2.5, 1),
+    ("record-resolution", [640], [640, 360]),
+    ("record-resolution", [640, -360], [640, 360]),
+    ("preview-resolution", "320x180", [640, 360]),
+])
+def test_invalid_camera_settings_fall_back(key, value, fallback):
+    assert camera_config(**{key: value})[key] == fallback
+
+
+def test_valid_camera_settings_are_kept():
+    settings = {
+        "cameras": 2,
+        "camera-layout": "picture-in-picture",
+        "camera-backend": "pygame",
+        "photo-burst": 5,
+        "record-resolution": [1280, 720],
+        "preview-resolution": [320, 180],
+    }
+    checked = camera_config(**settings)
+    assert {key: checked[key] for key in settings} == settings
+
+
+def test_uses_spool():
+    settings = dict(config.DEFAULT_CONFIG)
+    assert config.uses_spool(settings)
+    settings["recording-mode"] = "stream"
+    assert not config.uses_spool(settings)
+    # Formats that can't be written a frame at a time always spool
+    settings["video-format"] = "webp"
+    assert config.uses_spool(settings)
+
+
+def test_load_config(tmp_path, monkeypatch):
+    path = tmp_path / "rotograph" / "config.json"
+    monkeypatch.setattr(config, "CONFIG_FOLDER", str(path.parent))
+    monkeypatch.setattr(config, "CONFIG_FILE", str(path))
+
+    # A missing file gives the defaults, which are saved
+    assert config.load_config() == config.DEFAULT_CONFIG
+    assert json.loads(path.read_text()) == config.DEFAULT_CONFIG
+
+    # Saved settings are kept, checked, and missing ones filled in
+    path.write_text(json.dumps({"video-format": "webp", "cameras": -1}))
+    loaded = config.load_config()
+    assert loaded["video-format"] == "webp"
+    assert loaded["cameras"] == 1
+    assert loaded["photo-burst"] == 1
+
+    path.write_text("{not json")
+    assert config.load_config() == config.DEFAULT_CONFIG
+
+
+def test_preview_is_no_larger_than_recording():
+    settings = camera_config(**{
+        "record-resolution": [640, 360],
+        "preview-resolution": [1280, 300],
+    })
+    assert settings["preview-resolution"] == [640, 300]
+
+    settings = camera_config(**{
+        "record-resolution": [1280, 720],
+        "preview-resolution": [480, 270],
+    })
+    assert settings["preview-resolution"] == [480, 270]
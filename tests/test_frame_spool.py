@@ -0,0 +1,101 @@
+from source import camera_sources, encoder
+from source.frame_spool import FrameSpool
+from source.video_manager import VideoManager
+
+from PIL import Image
+import struct
+
+
+def test_spool_round_trip(tmp_path):
+    path = str(tmp_path / "recording" / ("clip" + FrameSpool.EXTENSION))
+    frames = [
+        (i / 24, Image.new("RGB", (16, 8), (i * 40, 0, 255 - i * 40)))
+        for i in range(5)
+    ]
+
+    spool = FrameSpool(path, "RGB", (16, 8), 24)
+    for timestamp, image in frames:
+        spool.write(image, timestamp)
+    # Monochrome frames are converted to the spool's mode
+    spool.write(Image.new("L", (16, 8), 128), 5 / 24)
+    spool.close()
+    assert spool.dropped_frames == 0
+
+    reopened = FrameSpool.open(path)
+    assert reopened.name == "clip"
+    assert (reopened.mode, reopened.size, reopened.fps) == ("RGB", (16, 8), 24)
+    assert len(reopened) == 6
+    assert reopened.timestamps() == [i / 24 for i in range(6)]
+
+    read = list(reopened)
+    for (_, expected), (_, image) in zip(frames, read):
+        assert image.tobytes() == expected.tobytes()
+    assert read[-1][1].getpixel((0, 0)) == (128, 128, 128)
+
+
+def test_partial_frame_is_ignored(tmp_path):
+    path = str(tmp_path / ("clip" + FrameSpool.EXTENSION))
+    spool = FrameSpool(path, "L", (4, 4), 12)
+    spool.write(Image.new("L", (4, 4), 1), 0.0)
+    spool.close()
+    with open(path, "ab") as f:
+        f.write(bytes(FrameSpool.RECORD.size + 3))
+
+    assert len(FrameSpool.open(path)) == 1
+
+
+def test_header_records_recording_settings(tmp_path):
+    path = str(tmp_path / ("2021-01-01 Camera 2" + FrameSpool.EXTENSION))
+    FrameSpool(path, "L", (4, 4), 12, "webp", "small", "Camera 2").close()
+
+    reopened = FrameSpool.open(path)
+    assert (reopened.video_format, reopened.preset, reopened.camera) == (
+        "webp", "small", "Camera 2"
+    )
+    assert reopened.folders == ["2021-01-01", "Camera 2"]
+
+    path = str(tmp_path / ("2021-01-02" + FrameSpool.EXTENSION))
+    FrameSpool(path, "L", (4, 4), 12, "gif", "fast").close()
+    assert FrameSpool.open(path).folders == ["2021-01-02"]
+
+
+def test_legacy_spool_is_readable(tmp_path):
+    path = str(tmp_path / ("old" + FrameSpool.EXTENSION))
+    with open(path, "wb") as f:
+        f.write(struct.pack("<4s8sIIf", b"RSPL", b"L", 4, 4, 12))
+        f.write(FrameSpool.RECORD.pack(0.5))
+        f.write(bytes(range(16)))
+
+    spool = FrameSpool.open(path)
+    assert (spool.video_format, spool.preset, spool.camera) == (
+        None, None, None
+    )
+    assert spool.folders == ["old"]
+    assert [timestamp for timestamp, _ in spool] == [0.5]
+    assert list(spool)[0][1].tobytes() == bytes(range(16))
+
+
+class RecordingWorker:
+    def submit(self, function, *args):
+        self.job = (function, args)
+        return 1
+
+
+def test_recovery_uses_recorded_settings(tmp_path):
+    path = str(tmp_path / ("clip" + FrameSpool.EXTENSION))
+    FrameSpool(path, "L", (4, 4), 12, "webp", "small").close()
+
+    manager = VideoManager(
+        12, (64, 36), device_folder=None,
+        camera_source=camera_sources.TestPattern
+    )
+    try:
+        manager.video_format = "gif"
+        manager.video_preset = "fast"
+        worker = RecordingWorker()
+        manager.encode(worker, FrameSpool.open(path), str(tmp_path))
+        function, args = worker.job
+        assert function is encoder.encode_animation
+        assert args[:4] == (path, str(tmp_path), "webp", "small")
+    finally:
+        manager.capturing = False
@@ -0,0 +1,117 @@
+from source.mounts import MountTable
+
+import pytest
+
+
+MOUNTINFO = """\
+22 1 179:2 / / rw,relatime - ext4 /dev/root rw
+25 22 0:5 / /dev rw,relatime - devtmpfs udev rw
+31 22 8:1 / /media/pi/My\\040Card rw,nosuid - vfat /dev/sda1 rw
+32 22 8:1 /DCIM /home/pi/DCIM rw,nosuid - vfat /dev/sda1 rw
+33 22 8:17 /photos /srv/photos rw - ext4 /dev/sdb1 rw
+"""
+
+
+@pytest.fixture
+def mount_table(tmp_path, monkeypatch):
+    """
+    A MountTable reading a fake mountinfo, with filesystem UUIDs mapped to
+    device numbers as /dev/disk/by-uuid would.
+    """
+    mountinfo = tmp_path / "mountinfo"
+    mountinfo.write_text(MOUNTINFO)
+    monkeypatch.setattr(MountTable, "MOUNTINFO", str(mountinfo))
+    uuids = {"ROOT": "179:2", "CARD": "8:1", "DATA": "8:17"}
+    monkeypatch.setattr(MountTable, "uuid_devices", lambda self: uuids)
+
+    table = MountTable()
+    yield table, mountinfo, uuids
+    table.close()
+
+
+def test_unescape():
+    assert MountTable.unescape(r"/media/My\040Card\011\134") == (
+        "/media/My Card\t\\"
+    )
+
+
+def test_mount_points_by_uuid(mount_table):
+    table, _, _ = mount_table
+    assert table.devices["179:2"] == "/"
+    # The whole filesystem is mounted before the bind mount of a subfolder
+    assert table.mount_path("CARD") == "/media/pi/My Card"
+    # Only a subfolder is mounted
+    assert table.mount_path("DATA") == ""
+    assert table.mount_path("MISSING") == ""
+
+
+def test_refresh_reads_changes(mount_table):
+    table, mountinfo, uuids = mount_table
+    mountinfo.write_text(MOUNTINFO.replace("/media/pi/My\\040Card", "/mnt"))
+    uuids["NEW"] = "0:5"
+    table.refresh()
+    assert table.mount_path("CARD") == "/mnt"
+    assert table.mount_path("NEW") == "/dev"
+
+
+def make_disks(tmp_path, monkeypatch, uuids):
+    """
+    Lays out sysfs and /dev/disk/by-uuid like a Pi booting from its SD card
+    with a USB card reader, an internal disk, a disk flagged as removable
+    and a loop device attached.
+    """
+    disks = {
+        "179:2": ("platform/mmc/block/mmcblk0", "mmcblk0p2", "0"),
+        "8:1": ("pci/usb1/block/sda", "sda1", "0"),
+        "8:17": ("pci/ata1/block/sdb", "sdb1", "0"),
+        "8:18": ("pci/ata1/block/sdb", "sdb2", "0"),
+        "8:33": ("pci/ata2/block/sdc", "sdc1", "1"),
+        "7:0": ("virtual/block", "loop0", None),
+    }
+    sys_block = tmp_path / "sys" / "dev" / "block"
+    sys_block.mkdir(parents=True)
+    nodes = tmp_path / "dev"
+    nodes.mkdir()
+    by_uuid = tmp_path / "by-uuid"
+    by_uuid.mkdir()
+
+    for device, (disk, name, removable) in disks.items():
+        path = tmp_path / "sys" / "devices" / disk / name
+        path.mkdir(parents=True, exist_ok=True)
+        if removable is not None:
+            (path / "partition").write_text("1\n")
+            (path.parent / "removable").write_text(removable + "\n")
+        (sys_block / device).symlink_to(path)
+        (nodes / name).touch()
+
+    for uuid, device in uuids.items():
+        (by_uuid / uuid).symlink_to(nodes / disks[device][1])
+
+    monkeypatch.setattr(MountTable, "SYS_BLOCK", str(sys_block))
+    monkeypatch.setattr(MountTable, "UUID_FOLDER", str(by_uuid))
+    return nodes
+
+
+def test_storage_devices(mount_table, tmp_path, monkeypatch):
+    table, _, uuids = mount_table
+    uuids.update({"EXTRA": "8:18", "FLAGGED": "8:33", "LOOP": "7:0"})
+    nodes = make_disks(tmp_path, monkeypatch, uuids)
+    table.refresh()
+
+    # The system disk and virtual disks are left out. Removable disks come
+    # first, including the USB card reader that doesn't set the flag.
+    assert table.storage_devices() == [
+        (str(nodes / "sda1"), "/media/pi/My Card", "CARD"),
+        (str(nodes / "sdc1"), "", "FLAGGED"),
+        (str(nodes / "sdb1"), "", "DATA"),
+        (str(nodes / "sdb2"), "", "EXTRA"),
+    ]
+
+
+def test_vanished_disk_is_skipped(mount_table, tmp_path, monkeypatch):
+    table, _, _ = mount_table
+    make_disks(tmp_path, monkeypatch, {"CARD": "8:1", "DATA": "8:17"})
+    (tmp_path / "sys/devices/pci/usb1/block/sda").rename(
+        tmp_path / "sys/devices/pci/usb1/block/removed"
+    )
+    assert [uuid for *_, uuid in table.storage_devices()] == ["DATA"]
@@ -0,0 +1,93 @@
+from source.pacing import FramePacer, MediaClock, pace
+
+import random
+
+
+FPS = 10
+START = 100.0
+
+
+def timestamps(*positions):
+    # Capture times of frames at the given positions on the slot grid
+    return [START + position / FPS for position in positions]
+
+
+def paced(positions, end):
+    frames, pacer = pace(
+        timestamps(*positions), FPS, MediaClock(START), START + end / FPS
+    )
+    return frames, pacer.dropped_frames, pacer.duplicated_frames
+
+
+def test_steady_frames_fill_one_slot_each():
+    assert paced(range(5), 5) == ([(i, 1) for i in range(5)], 0, 0)
+
+
+def test_jitter_keeps_every_frame():
+    random.seed(3)
+    positions = [i + random.uniform(-0.45, 0.45) for i in range(50)]
+    frames, dropped, duplicated = paced(positions, 50)
+    assert frames == [(i, 1) for i in range(50)]
+    assert (dropped, duplicated) == (0, 0)
+
+
+def test_frame_just_under_a_slot_late_takes_its_slot():
+    # The late frame is nearer slot 2, but slot 1 is still free
+    assert paced([0, 1.9, 2], 3) == ([(0, 1), (1, 1), (2, 1)], 0, 0)
+
+
+def test_gap_repeats_previous_frame():
+    frames, dropped, duplicated = paced([0, 1, 5, 6], 7)
+    assert frames == [(0, 1), (1, 4), (2, 1), (3, 1)]
+    assert (dropped, duplicated) == (0, 3)
+
+
+def test_frames_a_slot_behind_are_dropped():
+    # A burst of frames delivered together after a stall
+    frames, dropped, duplicated = paced([0, 0.1, 0.2, 0.3, 4], 5)
+    assert frames == [(0, 1), (1, 3), (4, 1)]
+    assert (dropped, duplicated) == (2, 2)
+
+
+def test_late_first_frame_fills_leading_slots():
+    frames, _, duplicated = paced([3, 4], 5)
+    assert frames == [(0, 4), (1, 1)]
+    assert duplicated == 3
+
+
+def test_last_frame_lasts_until_end():
+    assert paced([0, 1], 6) == ([(0, 1), (1, 5)], 0, 4)
+    # Never less than one slot, even if recording stopped early
+    assert paced([0, 1], 0) == ([(0, 1), (1, 1)], 0, 0)
+
+
+def test_no_frames():
+    assert paced([], 5) == ([], 0, 0)
+
+
+def test_streamed_pacing_matches_whole_recording():
+    random.seed(5)
+    positions = sorted(random.uniform(0, 40) for _ in range(60))
+    frames, _, _ = paced(positions, 40)
+
+    pacer = FramePacer(FPS, MediaClock(START))
+    slots = [pacer.place(timestamp) for timestamp in timestamps(*positions)]
+    kept = [i for i, slot in enumerate(slots) if slot is not None]
+    assert kept == [index for index, _ in frames]
+
+
+def test_clock_follows_audio():
+    clock = MediaClock(START)
+    assert clock(START + 2) == 2
+
+    # The first chunk places the timeline on the audio stream
+    clock.sync(START + 0.5, 0.25)
+    assert clock(START + 1.5) == 1.25
+    # Too soon to estimate the rate
+    clock.sync(START + 1, 0.75)
+    assert clock.rate == 1
+
+    # The audio clock runs 1% slow
+    clock.sync(START + 10.5, 0.25 + 9.9)
+    assert abs(clock.rate - 0.99) < 1e-9
+    assert abs(clock(START + 20.5) - (0.25 + 19.8)) < 1e-9
@@ -0,0 +1,79 @@
+from source import config, encoder
+from source.avi_writer import AviWriter
+from source.gif_writer import GifWriter
+from source.pacing import MediaClock
+
+from PIL import Image
+import pytest
+
+
+def frames(count=6):
+    """
+    Frames with smooth gradients, which need more than a few colours.
+    """
+    vertical = Image.linear_gradient("L").resize((96, 64))
+    horizontal = vertical.transpose(Image.ROTATE_90).resize((96, 64))
+    for i in range(count):
+        yield Image.merge(
+            "RGB", (vertical, horizontal, vertical.rotate(i * 15 + 45))
+        )
+
+
+def record(writer_class, tmp_path, video_format, preset, name):
+    path = str(tmp_path / f"{preset}.{name}")
+    writer = writer_class(
+        path, "RGB", (96, 64), 10, MediaClock(0),
+        preset=encoder.PRESETS[video_format][preset]
+    )
+    for i, frame in enumerate(frames()):
+        writer.write(frame, i / 10)
+    writer.close(0.6)
+    assert not writer.failed
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("writer_class, video_format, name", [
+    (GifWriter, "gif", "gif"),
+    (AviWriter, "avi", "avi"),
+])
+def test_stream_presets_differ(tmp_path, writer_class, video_format, name):
+    outputs = {
+        preset: record(writer_class, tmp_path, video_format, preset, name)
+        for preset in ("fast", "balanced", "small")
+    }
+    assert len(set(outputs.values())) == 3
+    assert len(outputs["small"]) < len(outputs["balanced"])
+    assert len(outputs["small"]) < len(outputs["fast"])
+
+
+def test_every_format_has_every_preset():
+    for video_format in config.VIDEO_FORMATS:
+        assert set(encoder.PRESETS[video_format]) == {
+            "fast", "balanced", "small"
+        }
+
+
+def check_video_config(**settings):
+    settings = dict(config.DEFAULT_CONFIG, **settings)
+    config.check_video_config(settings)
+    return (
+        settings["recording-mode"],
+        settings["video-format"],
+        settings["video-preset"],
+    )
+
+
+def test_preset_checked_against_format():
+    assert check_video_config(
+        **{"video-format": "avi", "video-preset": "tiny"}
+    ) == ("spool", "avi", "balanced")
+    assert check_video_config(
+        **{"video-format": "mkv", "video-preset": "small"}
+    ) == ("spool", "gif", "small")
+
+
+def test_spool_is_default_recording_mode():
+    assert config.DEFAULT_CONFIG["recording-mode"] == "spool"
+    assert check_video_config(**{"recording-mode": "stream"})[0] == "stream"
+    assert check_video_config(**{"recording-mode": "tape"})[0] == "spool"
@@ -0,0 +1,57 @@
+from source.ring_buffer import RingBuffer
+
+from threading import Thread
+import time
+
+
+def test_write_and_read():
+    buffer = RingBuffer(8)
+    assert buffer.read() == b""
+    assert buffer.write(b"abc")
+    assert buffer.write(b"de")
+    assert len(buffer) == 5
+    assert buffer.read() == b"abcde"
+    assert len(buffer) == 0
+
+
+def test_wraps_around():
+    buffer = RingBuffer(8)
+    buffer.write(b"abcdef")
+    buffer.read()
+    # Split across the end and the start of the storage
+    assert buffer.write(b"ghijk")
+    assert buffer.read() == b"ghijk"
+    assert buffer.write(b"lmnopqrs")
+    assert buffer.read() == b"lmnopqrs"
+
+
+def test_overflow_is_dropped_and_counted():
+    buffer = RingBuffer(8)
+    assert buffer.write(b"abcdef")
+    assert not buffer.write(b"ghi")
+    assert buffer.overflows == 1
+    # A write that fits exactly is kept
+    assert buffer.write(b"gh")
+    assert buffer.read() == b"abcdefgh"
+    assert buffer.overflows == 1
+
+
+def test_one_writer_one_reader():
+    buffer = RingBuffer(64)
+    chunks = [bytes([i % 256]) * (i % 7 + 1) for i in range(1000)]
+    received = bytearray()
+
+    def write():
+        for chunk in chunks:
+            while not buffer.write(chunk):
+                time.sleep(0)
+
+    writer = Thread(target=write)
+    writer.start()
+    expected = sum(len(chunk) for chunk in chunks)
+    while len(received) < expected:
+        received += buffer.read()
+        time.sleep(0)
+    writer.join()
+
+    assert bytes(received) == b"".join(chunks)
@@ -0,0 +1,35 @@
+import sys
+import time
+
+
+def report_modules(progress, path):
+    progress(0.5)
+    with open(path, "w") as f:
+        f.write(str("pyglet" in sys.modules))
+
+
+def test_workers_do_not_import_pyglet(tmp_path):
+    # Imported here so the worker, which imports this module to find the
+    # job function, doesn't load pyglet through it
+    from source.save_worker import SaveWorker
+
+    worker = SaveWorker()
+    completed = []
+    worker.push_handlers(
+        on_save_complete=lambda job_id, success: completed.append(success)
+    )
+    try:
+        path = str(tmp_path / "modules")
+        worker.submit(report_modules, path)
+
+        deadline = time.monotonic() + 30
+        while worker.busy and time.monotonic() < deadline:
+            worker.poll()
+            time.sleep(0.05)
+        worker.poll()
+
+        assert completed == [True]
+        with open(path) as f:
+            assert f.read() == "False"
+    finally:
+        worker.close()
@@ -0,0 +1,86 @@
+from source.avi_writer import AviWriter
+from source.pacing import MediaClock
+from source.stream_writer import StreamWriter
+
+from PIL import Image
+import time
+
+
+class FailingWriter(StreamWriter):
+    """
+    Fails on the second image written, like a card filling up mid-recording.
+    """
+
+    def __init__(self, fps, clock):
+        self.images = 0
+        self.finished = False
+        self.aborted = False
+        super().__init__("unused", fps, clock)
+
+    def write_image(self, image, slots):
+        self.images += 1
+        if self.images == 2:
+            raise OSError(28, "No space left on device")
+
+    def finish(self):
+        self.finished = True
+
+    def abort(self):
+        self.aborted = True
+
+
+def wait_for(condition, timeout=3):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_failed_write_is_kept_and_aborts():
+    writer = FailingWriter(10, MediaClock(0))
+    image = Image.new("RGB", (8, 8))
+    for i in range(4):
+        writer.write(image, i / 10)
+
+    assert wait_for(lambda: not writer.thread.is_alive())
+    assert writer.failed
+    assert isinstance(writer.error, OSError)
+    assert writer.aborted
+    assert not writer.finished
+
+    # Frames written after the failure are discarded, and closing doesn't
+    # wait for a thread that is gone
+    dropped = writer.dropped_frames
+    writer.write(image, 0.5)
+    assert writer.dropped_frames == dropped + 1
+    writer.close(1)
+    assert writer.failed
+
+
+def test_successful_writer_finishes():
+    writer = FailingWriter(10, MediaClock(0))
+    writer.write(Image.new("RGB", (8, 8)), 0)
+    writer.close(0.5)
+    assert writer.finished
+    assert not writer.failed
+    assert writer.pending_frames == 0
+    assert writer.frame_count == 1
+
+
+def test_avi_stops_queueing_audio_after_failure(tmp_path):
+    writer = AviWriter(
+        str(tmp_path / "video.avi"), "RGB", (8, 8), 10, MediaClock(0),
+        (1, 2, 8000)
+    )
+    # An image that can't be encoded as JPEG
+    writer.write(Image.new("RGBA", (8, 8)), 0)
+    writer.write(Image.new("RGBA", (8, 8)), 0.1)
+    assert wait_for(lambda: not writer.thread.is_alive())
+    assert writer.failed
+    assert writer.file.closed
+
+    writer.write_audio(bytes(160))
+    assert writer.queue.qsize() == 0
+    writer.close(1)
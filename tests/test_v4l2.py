@@ -0,0 +1,175 @@
+from source import v4l2
+
+from PIL import Image
+import io
+import mmap
+import types
+
+import pytest
+
+
+WIDTH, HEIGHT = 64, 48
+FRAME_SIZE = WIDTH * HEIGHT * 2
+PAGES = (FRAME_SIZE + mmap.PAGESIZE - 1) // mmap.PAGESIZE
+BUFFER_LENGTH = PAGES * mmap.PAGESIZE
+
+
+def yuyv_frame(color, size=(WIDTH, HEIGHT), padding=0):
+    """
+    Packs a solid colour into YUYV rows, each followed by `padding` bytes
+    as in frames whose lines are wider than the image.
+    """
+    y, cb, cr = Image.new("RGB", size, color).convert("YCbCr").getpixel((0, 0))
+    row = bytes([y, cb, y, cr]) * (size[0] // 2) + bytes(padding)
+    return row * size[1]
+
+
+class FakeDevice:
+    """
+    A regular file standing in for a V4L2 device node, with ioctl emulated
+    well enough for V4L2Camera to stream from it. `fail` names a request
+    that raises, to test failures part way through starting.
+    """
+
+    def __init__(self, path, formats=(v4l2.PIX_FMT_YUYV,), fail=None):
+        self.formats = list(formats)
+        self.fail = fail
+        self.queue = []
+        self.requests = []
+        with open(path, "wb") as f:
+            for _ in range(v4l2.V4L2Camera.BUFFER_COUNT):
+                f.write(yuyv_frame((10, 200, 30)))
+                f.write(bytes(BUFFER_LENGTH - FRAME_SIZE))
+
+    def ioctl(self, fd, request, arg):
+        self.requests.append(request)
+        if request == self.fail:
+            raise OSError(16, "Device or resource busy")
+
+        if request == v4l2.VIDIOC_QUERYCAP:
+            arg.capabilities = v4l2.CAP_VIDEO_CAPTURE | v4l2.CAP_STREAMING
+        elif request == v4l2.VIDIOC_ENUM_FMT:
+            if arg.index >= len(self.formats):
+                raise OSError(22, "Invalid argument")
+            arg.pixelformat = self.formats[arg.index]
+        elif request == v4l2.VIDIOC_S_FMT:
+            arg.fmt.pix.width = WIDTH
+            arg.fmt.pix.height = HEIGHT
+            arg.fmt.pix.bytesperline = WIDTH * 2
+        elif request == v4l2.VIDIOC_QUERYBUF:
+            arg.length = BUFFER_LENGTH
+            arg.m.offset = arg.index * BUFFER_LENGTH
+        elif request == v4l2.VIDIOC_QBUF:
+            self.queue.append(arg.index)
+        elif request == v4l2.VIDIOC_DQBUF:
+            arg.index = self.queue.pop(0)
+            arg.bytesused = FRAME_SIZE
+
+
+@pytest.fixture
+def fake_device(tmp_path, monkeypatch):
+    def create(**kwargs):
+        device = FakeDevice(str(tmp_path / "video0"), **kwargs)
+        monkeypatch.setattr(
+            v4l2, "fcntl", types.SimpleNamespace(ioctl=device.ioctl)
+        )
+        return str(tmp_path / "video0"), device
+    return create
+
+
+def assert_close(actual, expected, tolerance=3):
+    assert all(abs(a - b) <= tolerance for a, b in zip(actual, expected))
+
+
+def test_yuyv_to_image():
+    data = yuyv_frame((200, 40, 90), (8, 4))
+    image = v4l2.yuyv_to_image(data, (8, 4), 16, False)
+    assert image.mode == "RGB"
+    assert image.size == (8, 4)
+    assert_close(image.getpixel((5, 2)), (200, 40, 90))
+
+
+def test_yuyv_to_image_monochrome_is_luma():
+    data = yuyv_frame((200, 40, 90), (8, 4))
+    image = v4l2.yuyv_to_image(data, (8, 4), 16, True)
+    assert image.mode == "L"
+    assert image.getpixel((0, 0)) == data[0]
+
+
+def test_yuyv_to_image_drops_line_padding():
+    data = yuyv_frame((20, 90, 220), (6, 4), padding=4)
+    image = v4l2.yuyv_to_image(data, (6, 4), 16, False)
+    assert image.size == (6, 4)
+    assert_close(image.getpixel((5, 3)), (20, 90, 220))
+
+
+def test_mjpeg_to_image():
+    frame = Image.new("RGB", (32, 16), (30, 160, 220))
+    output = io.BytesIO()
+    frame.save(output, "JPEG")
+    data = output.getvalue()
+
+    image = v4l2.mjpeg_to_image(data, False)
+    assert image.mode == "RGB"
+    assert image.size == (32, 16)
+    assert_close(image.getpixel((8, 8)), (30, 160, 220))
+
+    luma = v4l2.mjpeg_to_image(data, True)
+    assert luma.mode == "L"
+    assert_close(
+        (luma.getpixel((8, 8)),), (frame.convert("L").getpixel((8, 8)),)
+    )
+
+
+def test_camera_streams_from_fake_device(fake_device):
+    path, device = fake_device()
+    camera = v4l2.V4L2Camera(path, (WIDTH, HEIGHT))
+    camera.start()
+    try:
+        image = camera.get_image()
+        assert image.size == (WIDTH, HEIGHT)
+        assert_close(image.getpixel((3, 3)), (10, 200, 30))
+        # The buffer went back to the driver
+        assert len(device.queue) == v4l2.V4L2Camera.BUFFER_COUNT
+
+        camera.monochrome = True
+        assert camera.get_image().mode == "L"
+    finally:
+        camera.stop()
+    assert camera.fd is None
+    assert camera.buffers == []
+
+
+@pytest.mark.parametrize("request_number", [
+    v4l2.VIDIOC_S_FMT,
+    v4l2.VIDIOC_REQBUFS,
+    v4l2.VIDIOC_QUERYBUF,
+    v4l2.VIDIOC_STREAMON,
+])
+def test_failed_start_releases_device(fake_device, request_number):
+    path, _ = fake_device(fail=request_number)
+    camera = v4l2.V4L2Camera(path, (WIDTH, HEIGHT))
+    with pytest.raises(SystemError):
+        camera.start()
+    assert camera.fd is None
+    assert camera.buffers == []
+
+
+def test_falls_back_to_pygame_when_streaming_fails(fake_device, monkeypatch):
+    path, _ = fake_device(fail=v4l2.VIDIOC_STREAMON)
+    monkeypatch.setattr(
+        v4l2, "PygameCamera", lambda device, resolution: ("pygame", device)
+    )
+    assert v4l2.open_camera(path, (WIDTH, HEIGHT)) == ("pygame", path)
+
+
+def test_open_camera_starts_v4l2_once(fake_device):
+    path, device = fake_device()
+    camera = v4l2.open_camera(path, (WIDTH, HEIGHT))
+    try:
+        assert isinstance(camera, v4l2.V4L2Camera)
+        assert camera.streaming
+        camera.start()
+        assert device.requests.count(v4l2.VIDIOC_STREAMON) == 1
+    finally:
+        camera.stop()